@@ -0,0 +1,40 @@
+"""
+Compares memory used by VM code kept as a list of bytes and as Code.
+
+$ python benchmarks/code_memory.py
+"""
+
+import random
+import tracemalloc
+
+from dso_tools.code import Code
+
+INSTRUCTIONS_COUNT = 1_000_000
+
+
+def measure(factory):
+    tracemalloc.start()
+    code = factory()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del code
+
+    return size
+
+
+def main():
+    random.seed(0)
+    instructions = [
+        bytes([random.randrange(0x5B)]) if random.random() < 0.7 else random.getrandbits(32).to_bytes(4, "little")
+        for _ in range(INSTRUCTIONS_COUNT)
+    ]
+
+    as_list = measure(lambda: [bytes(bytearray(instruction)) for instruction in instructions])
+    as_code = measure(lambda: Code(instructions))
+
+    print(f"list of bytes: {as_list / INSTRUCTIONS_COUNT:6.2f} B/instruction")
+    print(f"Code:          {as_code / INSTRUCTIONS_COUNT:6.2f} B/instruction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Shows how DSO.patch_global_strings scales with the size of the global string table.
+
+$ python benchmarks/patch_global_strings.py
+"""
+
+import time
+
+from dso_tools.dso import DSO
+from dso_tools.synthetic import generate_dso
+
+SIZES = (1_000, 2_000, 4_000, 8_000, 16_000, 32_000)
+
+
+def make_dso(strings_count):
+    return DSO.from_buffer(generate_dso(strings_count=strings_count, instruction_count=10 * strings_count).encode())
+
+
+def main():
+    print(f"{'strings':>10} {'seconds':>10} {'us/string':>10}")
+    for strings_count in SIZES:
+        dso = make_dso(strings_count)
+        patch = {i: f"patched string {i}" for i in range(1, strings_count, 10)}
+
+        start = time.perf_counter()
+        dso.patch_global_strings(patch)
+        elapsed = time.perf_counter() - start
+
+        print(f"{strings_count:>10} {elapsed:>10.4f} {elapsed / strings_count * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
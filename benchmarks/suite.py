@@ -0,0 +1,139 @@
+"""
+Times parsing, encoding, patching and dumping of synthetic dsos per phase and checks that fast paths stay byte-exact.
+
+$ python benchmarks/suite.py --output results.json
+$ python benchmarks/suite.py --compare results.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from dso_tools.dso import DSO
+from dso_tools.dump import dump_strings
+from dso_tools.synthetic import generate_dso
+
+SIZES = {
+    "small": dict(strings_count=200, instruction_count=2_000, floats_count=20),
+    "medium": dict(strings_count=2_000, instruction_count=50_000, floats_count=200),
+    "large": dict(strings_count=20_000, instruction_count=500_000, floats_count=2_000),
+}
+REGRESSION_THRESHOLD = 1.25
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="Best of REPEAT runs is recorded")
+    parser.add_argument("--output", help="Write results to a JSON file")
+    parser.add_argument("--compare", help="Compare results with a previous JSON file and fail on regressions")
+
+    return parser.parse_args(args)
+
+
+def best_of(repeat, function):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def dump_string_table(dso):
+    stream = io.StringIO()
+    dump_strings(dso, stream)
+
+    return stream.getvalue()
+
+
+def check_round_trip(encoded):
+    from_stream = DSO.from_stream(io.BytesIO(encoded))
+    from_buffer = DSO.from_buffer(encoded)
+
+    assert from_stream.encode() == encoded, "from_stream round trip"
+    assert from_buffer.encode() == encoded, "from_buffer round trip"
+    assert from_buffer.code.widths == from_stream.code.widths, "code widths"
+
+    patch = {i: f"patched {i}" for i in range(1, len(from_buffer.global_strings) - 1, 7)}
+    from_buffer.patch_global_strings(patch, validate=True)
+    assert DSO.from_buffer(from_buffer.encode()).encode() == from_buffer.encode(), "patched round trip"
+
+
+def run_size(parameters, repeat):
+    dso = generate_dso(**parameters)
+    encoded = dso.encode()
+    check_round_trip(encoded)
+
+    parsed = DSO.from_buffer(encoded)
+    patch = {i: f"patched {i}" for i in range(1, len(parsed.global_strings) - 1, 7)}
+
+    phases = {
+        "parse_stream": lambda: DSO.from_stream(io.BytesIO(encoded)),
+        "parse_buffer": lambda: DSO.from_buffer(encoded),
+        "encode": parsed.encode,
+        "patch": lambda: parsed.copy().patch_global_strings(patch),
+        "dump": lambda: dump_string_table(parsed),
+    }
+
+    return {"bytes": len(encoded), **{phase: best_of(repeat, function) for phase, function in phases.items()}}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    regressions = []
+    for size, phases in results["sizes"].items():
+        for phase, seconds in phases.items():
+            if phase == "bytes" or size not in baseline["sizes"] or phase not in baseline["sizes"][size]:
+                continue
+
+            previous = baseline["sizes"][size][phase]
+            ratio = seconds / previous if previous > 0 else 1.0
+            print(f"{size:>8} {phase:>14} {previous:>10.4f} -> {seconds:>10.4f} ({ratio:.2f}x)")
+            if ratio > REGRESSION_THRESHOLD:
+                regressions.append(f"{size}/{phase}")
+
+    return regressions
+
+
+def main(args):
+    parsed_args = parse_args(args)
+
+    results = {"revision": git_revision(), "python": platform.python_version(), "sizes": {}}
+    for size in parsed_args.sizes:
+        phases = run_size(SIZES[size], parsed_args.repeat)
+        results["sizes"][size] = phases
+        print(
+            f"{size} ({phases['bytes']} bytes): "
+            + ", ".join(f"{k} {v:.4f}s" for k, v in phases.items() if k != "bytes")
+        )
+
+    if parsed_args.output:
+        with open(parsed_args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if parsed_args.compare:
+        with open(parsed_args.compare) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -3,8 +3,7 @@ set -Eeuo pipefail
 
 MY_DIR="$(readlink -f "$(dirname "$0")")"
 
-dso --patch-string-table "$MY_DIR/playGui.gui.dso.json" scriptsAndAssets/client/ui/playGui.gui.dso
-dso --patch-string-table "$MY_DIR/defaultGameProfiles.cs.dso.json" scriptsAndAssets/client/ui/defaultGameProfiles.cs.dso
+dso batch --mapping "$MY_DIR/patches.json" scriptsAndAssets/client/ui
 
 find scriptsAndAssets/client/ui/special/images -name 'moto*.dds' -exec convert {} -filter cubic -resize 200% {} \;
 find scriptsAndAssets/client/ui/special/images -name '*AtMinimap.dds' -exec convert {} -filter cubic -resize 200% {} \;
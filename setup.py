@@ -11,6 +11,7 @@ setuptools.setup(
     setup_requires=["setuptools_scm"],
     extras_require={
         "dev": ["pytest", "black"],
+        "numpy": ["numpy"],
     },
     entry_points={"console_scripts": ["dso = dso_tools.main:main"]},
 )
@@ -0,0 +1,199 @@
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dso_tools.cache import DSOCache
+from dso_tools.dso import DSO, LazyDSO, save_over_source
+from dso_tools.main import add_cache_dir_argument, add_instrumentation_arguments
+from dso_tools.patchset import load_patch_set
+from dso_tools.timings import Timings, merged_profiles, worker_profiled
+
+DSO_GLOB = "*.dso"
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="dso batch", allow_abbrev=False)
+    parser.add_argument("paths", nargs="+", help="Dso files, directories to search for *.dso files or glob patterns")
+    parser.add_argument(
+        "--mapping",
+        required=True,
+        metavar="MAPPING_FILE",
+        help="JSON object mapping dso path patterns to patch files (relative to the mapping file)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)"
+    )
+    add_cache_dir_argument(parser)
+    add_instrumentation_arguments(parser)
+
+    return parser.parse_args(args)
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(p.as_posix() for p in Path(path).rglob(DSO_GLOB) if p.is_file()))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            files.extend(sorted(glob.glob(path, recursive=True)))
+
+    return list(dict.fromkeys(files))
+
+
+def map_in_pool(function, *iterables, workers=None):
+    """
+    Same as map(function, *iterables), run on a pool of workers processes and yielding results in order.
+    With workers=1 everything runs in this process.
+    """
+    iterables = [list(iterable) for iterable in iterables]
+    if not iterables or not iterables[0]:
+        return
+
+    if workers == 1:
+        yield from map(function, *iterables)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(function, *iterables, chunksize=max(1, len(iterables[0]) // 64))
+
+
+def load_mapping(mapping_file):
+    """
+    Returns a list of (pattern, compiled patch) pairs. The first pattern matching a dso path decides its patch.
+    Patch files can be manifests, see load_patch_set.
+    """
+    with open(mapping_file) as f:
+        try:
+            mapping = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{mapping_file} is not valid JSON: {e}") from None
+    if not isinstance(mapping, dict) or not all(isinstance(value, str) for value in mapping.values()):
+        raise ValueError(f"{mapping_file} is not an object mapping patterns to patch files")
+
+    base_dir = os.path.dirname(mapping_file)
+    patches = {}
+    for patch_file in set(mapping.values()):
+        patches[patch_file] = load_patch_set(os.path.join(base_dir, patch_file))
+
+    return [(pattern, patches[patch_file]) for pattern, patch_file in mapping.items()]
+
+
+def find_patch(path, mapping):
+    posix_path = Path(path).as_posix()
+    for pattern, patch in mapping:
+        if fnmatch.fnmatch(posix_path, pattern):
+            return patch
+
+    return None
+
+
+def patch_file(path, patch, cache_dir=None, verify_hash=False):
+    cache = DSOCache(cache_dir, verify_hash=verify_hash) if cache_dir else None
+    dso = cache.load(path) if cache else DSO.from_file(path, lazy=True)
+    try:
+        dso.patch_global_strings(patch)
+        save_over_source(dso, path)
+    finally:
+        if isinstance(dso, LazyDSO):
+            dso.close()
+
+    if cache:
+        cache.store(path, dso)
+
+
+def try_patch_file(path, patch, cache_dir=None, timings=False, verify_hash=False, profile_dir=None):
+    file_timings = Timings() if timings else None
+    try:
+        with worker_profiled(profile_dir):
+            if file_timings is not None:
+                with file_timings:
+                    patch_file(path, patch, cache_dir, verify_hash)
+            else:
+                patch_file(path, patch, cache_dir, verify_hash)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    else:
+        error = None
+
+    return (path, error, file_timings) if timings else (path, error)
+
+
+def patch_files(jobs, workers=None, cache_dir=None, timings=False, verify_hash=False, profile_dir=None):
+    """
+    Applies (path, patch) jobs on a process pool and returns (path, error) pairs in the order of jobs,
+    where error is None for files patched successfully. With timings=True the results are
+    (path, error, Timings) triples with phases measured in the workers. With a profile_dir the workers
+    write their cProfile stats there, see merged_profiles.
+    """
+    if not jobs:
+        return []
+
+    paths, patches = zip(*jobs)
+    results = map_in_pool(
+        try_patch_file,
+        paths,
+        patches,
+        [cache_dir] * len(jobs),
+        [timings] * len(jobs),
+        [verify_hash] * len(jobs),
+        [profile_dir] * len(jobs),
+        workers=workers,
+    )
+    return list(results)
+
+
+def main(args):
+    parsed_args = parse_args(args)
+
+    # phases and profiles are collected in the workers, see run
+    return run(parsed_args)
+
+
+def run(parsed_args):
+    try:
+        mapping = load_mapping(parsed_args.mapping)
+    except (OSError, ValueError) as e:  # unreadable or malformed mapping and patch files and conflicts between them
+        print(f"dso: {e}", file=sys.stderr)
+        return 1
+
+    jobs = []
+    for path in collect_files(parsed_args.paths):
+        patch = find_patch(path, mapping)
+        if patch is not None:
+            jobs.append((path, patch))
+
+    if not jobs:
+        print("dso: no files matched the paths and the mapping, nothing patched", file=sys.stderr)
+        return 1
+
+    with merged_profiles(parsed_args.profile) as profile_dir:
+        results = patch_files(
+            jobs, parsed_args.workers, parsed_args.cache_dir, parsed_args.timings, parsed_args.verify_hash, profile_dir
+        )
+
+    failed = 0
+    total_timings = Timings()
+    for path, error, *file_timings in results:
+        if error is None:
+            print(f"ok {path}")
+        else:
+            failed += 1
+            print(f"failed {path}: {error}", file=sys.stderr)
+
+        if file_timings:
+            print(f"{path}:\n{file_timings[0].format()}", file=sys.stderr)
+            total_timings.update(file_timings[0])
+
+    if parsed_args.timings and jobs:
+        print(f"all files:\n{total_timings.format()}", file=sys.stderr)
+
+    print(f"{len(jobs) - failed} patched, {failed} failed")
+
+    return 1 if failed else 0
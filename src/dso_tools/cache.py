@@ -0,0 +1,242 @@
+import hashlib
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+
+from dso_tools.code import Code
+from dso_tools.dso import (
+    DSO,
+    U32_BYTES,
+    BufferReader,
+    encode_float_table,
+    encode_string_references,
+    encode_string_table,
+    eu32,
+    parse_float_table,
+    parse_protocol_version,
+    parse_string_references_from_buffer,
+    parse_string_table,
+    u32,
+    u32_array,
+    u32_bytes,
+)
+
+CACHE_MAGIC = b"DSOC"
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = ".dsoc"
+# magic, cache format version, source file mtime in ns, source file size, source file digest
+CACHE_HEADER = struct.Struct("<4sIqQ32s")
+NO_DIGEST = bytes(32)
+
+
+def file_digest(buffer):
+    return hashlib.blake2b(buffer, digest_size=32).digest()
+
+
+def encode_cache_entry(dso, key):
+    """
+    Serializes parsed sections. It's the dso format, except for code, which is stored as raw values and widths
+    arrays, so loading it doesn't need to scan for escaped u32s.
+    """
+    code = dso.code if isinstance(dso.code, Code) else Code(dso.code)
+    mtime_ns, size, digest = key
+
+    return b"".join(
+        [
+            CACHE_HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, mtime_ns, size, digest),
+            eu32(getattr(dso, "protocol_version", dso.version)),
+            encode_string_table(dso.global_strings),
+            encode_string_table(dso.function_strings),
+            encode_float_table(dso.global_floats),
+            encode_float_table(dso.function_floats),
+            eu32(len(code)),
+            eu32(dso.line_break_count),
+            u32_bytes(code.values),
+            bytes(code.widths),
+            encode_string_references(dso.string_references),
+        ]
+    )
+
+
+def decode_cache_entry(buffer, key):
+    """
+    Returns a DSO from a cache entry, or None if the entry is not for a file with the given key.
+    """
+    if len(buffer) < CACHE_HEADER.size:
+        return None
+
+    magic, format_version, mtime_ns, size, digest = CACHE_HEADER.unpack_from(buffer)
+    if (magic, format_version) != (CACHE_MAGIC, CACHE_FORMAT_VERSION):
+        return None
+    if (mtime_ns, size) != key[:2] or (key[2] != NO_DIGEST and digest != key[2]):
+        return None
+
+    dso = DSO()
+    with BufferReader(buffer, CACHE_HEADER.size) as reader:
+        dso.protocol_version = parse_protocol_version(reader)
+        dso.global_strings = parse_string_table(reader)
+        dso.function_strings = parse_string_table(reader)
+        dso.global_floats = parse_float_table(reader)
+        dso.function_floats = parse_float_table(reader)
+        instruction_count = u32(reader)
+        dso.line_break_count = u32(reader)
+        values = u32_array(reader.read(instruction_count * U32_BYTES))
+        widths = bytearray(reader.read(instruction_count))
+        dso.code = Code.from_arrays(values, widths)
+        dso.string_references = parse_string_references_from_buffer(reader)
+
+    return dso
+
+
+class DSOCache:
+    """
+    Cache of parsed dso files with two tiers: an in-process LRU of parsed DSOs and, optionally, a directory
+    of serialized sections. Entries are valid as long as the file's mtime and size don't change. With
+    verify_hash=True the file's content digest is compared too, at the cost of reading the whole file.
+
+    load() returns a fresh copy, so patching it doesn't affect the cache, unless copy=False is passed
+    for read-only use.
+    """
+
+    def __init__(self, directory=None, max_entries=64, max_disk_bytes=256 * 1024 * 1024, verify_hash=False):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.verify_hash = verify_hash
+        self.memory = OrderedDict()
+
+    def entry_path(self, path):
+        name = hashlib.sha1(os.path.realpath(path).encode(errors="surrogateescape")).hexdigest()
+        return os.path.join(self.directory, name + CACHE_SUFFIX)
+
+    def file_key(self, path, buffer=None):
+        stat = os.stat(path)
+        digest = file_digest(buffer) if buffer is not None else NO_DIGEST
+
+        return stat.st_mtime_ns, stat.st_size, digest
+
+    def load(self, path, copy=True):
+        buffer = None
+        if self.verify_hash:
+            with open(path, "rb") as f:
+                buffer = f.read()
+        key = self.file_key(path, buffer)
+
+        dso = self.load_from_memory(path, key)
+        if dso is None:
+            dso = self.load_from_disk(path, key)
+        if dso is None:
+            dso = DSO.from_buffer(buffer) if buffer is not None else DSO.from_file(path)
+            self.store(path, dso, key)
+        else:
+            self.store_in_memory(path, key, dso)
+
+        return dso.copy() if copy else dso
+
+    def store(self, path, dso, key=None):
+        """
+        Caches a dso for path in its current state, e.g. right after writing it.
+        """
+        if key is None:
+            buffer = None
+            if self.verify_hash:
+                with open(path, "rb") as f:
+                    buffer = f.read()
+            key = self.file_key(path, buffer)
+
+        dso = dso.copy()
+        self.store_in_memory(path, key, dso)
+        if self.directory is not None:
+            self.store_on_disk(path, key, dso)
+
+    def load_from_memory(self, path, key):
+        real_path = os.path.realpath(path)
+        if real_path not in self.memory:
+            return None
+
+        cached_key, dso = self.memory[real_path]
+        if not keys_match(cached_key, key):
+            del self.memory[real_path]
+            return None
+
+        self.memory.move_to_end(real_path)
+        return dso
+
+    def store_in_memory(self, path, key, dso):
+        real_path = os.path.realpath(path)
+        self.memory[real_path] = (key, dso)
+        self.memory.move_to_end(real_path)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def load_from_disk(self, path, key):
+        if self.directory is None:
+            return None
+
+        entry_path = self.entry_path(path)
+        try:
+            with open(entry_path, "rb") as f:
+                dso = decode_cache_entry(f.read(), key)
+        except FileNotFoundError:
+            return None
+        except (ValueError, struct.error):  # corrupted entry
+            dso = None
+
+        if dso is None:
+            remove_quietly(entry_path)
+        else:
+            os.utime(entry_path)  # entries are evicted in order of their last use
+
+        return dso
+
+    def store_on_disk(self, path, key, dso):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_cache_entry(dso, key))
+            os.replace(temp_path, self.entry_path(path))
+        except BaseException:
+            remove_quietly(temp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_disk_bytes:
+                break
+            remove_quietly(entry_path)
+            total_size -= size
+
+    def clear(self):
+        self.memory.clear()
+        if self.directory is not None and os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(CACHE_SUFFIX):
+                    remove_quietly(entry.path)
+
+
+def keys_match(cached_key, key):
+    if cached_key[:2] != key[:2]:
+        return False
+
+    return key[2] == NO_DIGEST or cached_key[2] == key[2]
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
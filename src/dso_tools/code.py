@@ -0,0 +1,112 @@
+import struct
+from array import array
+from collections.abc import MutableSequence
+
+from dso_tools.opcodes import OPCODES
+
+U8_WIDTH = 1
+U32_WIDTH = 4
+
+
+class Code(MutableSequence):
+    """
+    VM code kept as an array of u32 values and a parallel bytearray with the width (1 or 4) of each instruction.
+
+    It still behaves like a list of one or four byte instructions, so indexing returns bytes and assigning bytes
+    changes both the value and the width. Hot paths should use values and widths directly.
+    """
+
+    __slots__ = ("values", "widths")
+
+    def __init__(self, instructions=()):
+        if isinstance(instructions, Code):
+            self.values = array(instructions.values.typecode, instructions.values)
+            self.widths = bytearray(instructions.widths)
+            return
+
+        self.values = array("I")
+        self.widths = bytearray()
+        for instruction in instructions:
+            self.append(instruction)
+
+    @classmethod
+    def from_arrays(cls, values, widths):
+        if len(values) != len(widths):
+            raise ValueError("values and widths must have the same length")
+
+        code = cls.__new__(cls)
+        code.values = values
+        code.widths = widths
+
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Code.from_arrays(self.values[index], self.widths[index])
+
+        return encode_instruction(self.values[index], self.widths[index])
+
+    def __setitem__(self, index, instruction):
+        if isinstance(index, slice):
+            instructions = Code(instruction)
+            self.values[index] = instructions.values
+            self.widths[index] = instructions.widths
+            return
+
+        self.values[index], self.widths[index] = decode_instruction(instruction)
+
+    def __delitem__(self, index):
+        del self.values[index]
+        del self.widths[index]
+
+    def __iter__(self):
+        for value, width in zip(self.values, self.widths):
+            yield encode_instruction(value, width)
+
+    def __eq__(self, other):
+        if isinstance(other, Code):
+            return self.values == other.values and self.widths == other.widths
+
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"Code({list(self)!r})"
+
+    def insert(self, index, instruction):
+        value, width = decode_instruction(instruction)
+        self.values.insert(index, value)
+        self.widths.insert(index, width)
+
+    def append(self, instruction):
+        value, width = decode_instruction(instruction)
+        self.values.append(value)
+        self.widths.append(width)
+
+    def copy(self):
+        return Code(self)
+
+    def is_opcode(self, ip):
+        return self.widths[ip] == U8_WIDTH and self.values[ip] < len(OPCODES)
+
+
+def encode_instruction(value, width):
+    if width == U8_WIDTH:
+        return bytes((value,))
+
+    return struct.pack("<I", value)
+
+
+def decode_instruction(instruction):
+    if len(instruction) == U8_WIDTH:
+        return instruction[0], U8_WIDTH
+
+    if len(instruction) == U32_WIDTH:
+        return struct.unpack("<I", instruction)[0], U32_WIDTH
+
+    raise ValueError("provide one or four bytes")
@@ -0,0 +1,182 @@
+from array import array
+
+from dso_tools.batch import collect_files, map_in_pool
+from dso_tools.code import Code
+from dso_tools.dso import DSO, STRING_TABLES
+from dso_tools.floats import FloatTable
+from dso_tools.strings import StringTable
+
+
+class StringPool:
+    """
+    Strings shared by all files of a corpus. Every distinct string is stored once and files refer to it by its id,
+    its position in the pool.
+    """
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __contains__(self, string):
+        return string in self.ids
+
+    def intern(self, string):
+        """
+        Returns the id of string, adding it to the pool if it's new.
+        """
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+
+        return string_id
+
+    def id_of(self, string):
+        return self.ids.get(string)
+
+
+class CorpusFile:
+    """
+    One dso of a corpus. String tables are arrays of ids into the corpus pool, everything else is kept as parsed.
+    Unlike DSO, every instance has its own attributes and no per-instance __dict__.
+    """
+
+    __slots__ = (
+        "path",
+        "pool",
+        "protocol_version",
+        "global_strings",
+        "function_strings",
+        "global_floats",
+        "function_floats",
+        "code",
+        "line_break_count",
+        "string_references",
+    )
+
+    def __init__(self, path, pool, dso):
+        self.path = path
+        self.pool = pool
+        self.protocol_version = getattr(dso, "protocol_version", dso.version)
+        self.global_strings = array("I", map(pool.intern, dso.global_strings))
+        self.function_strings = array("I", map(pool.intern, dso.function_strings))
+        self.global_floats = FloatTable(dso.global_floats)
+        self.function_floats = FloatTable(dso.function_floats)
+        self.code = Code(dso.code)
+        self.line_break_count = dso.line_break_count
+        self.string_references = tuple((offset, array("I", ips)) for offset, ips in dso.string_references)
+
+    def __repr__(self):
+        return f"<CorpusFile {self.path!r}>"
+
+    def strings(self, section="global_strings"):
+        """
+        Returns the strings of a table as bytes.
+        """
+        return [self.pool[string_id] for string_id in getattr(self, section)]
+
+    def to_dso(self):
+        """
+        Returns an independent DSO with the contents of the file, e.g. for patching or encoding it.
+        """
+        dso = DSO()
+        dso.protocol_version = self.protocol_version
+        dso.global_strings = StringTable(self.strings("global_strings"))
+        dso.function_strings = StringTable(self.strings("function_strings"))
+        dso.global_floats = FloatTable(self.global_floats)
+        dso.function_floats = FloatTable(self.function_floats)
+        dso.code = Code(self.code)
+        dso.line_break_count = self.line_break_count
+        dso.string_references = [(offset, list(ips)) for offset, ips in self.string_references]
+
+        return dso
+
+
+class DSOCorpus:
+    """
+    Many dso files loaded for cross-file analysis. Identical strings of all files share one StringPool, so
+    an identifier used by thousands of scripts is stored once.
+    """
+
+    def __init__(self):
+        self.pool = StringPool()
+        self.files = {}
+        self.errors = {}
+
+    @classmethod
+    def load(cls, paths, workers=None):
+        """
+        Loads dso files in paths (files, directories or glob patterns, see batch.collect_files). Files are parsed
+        on a process pool and interned in this process. Files that fail to load end up in errors instead.
+        """
+        corpus = cls()
+        corpus.load_files(collect_files(paths), workers)
+
+        return corpus
+
+    def load_files(self, paths, workers=None):
+        for path, dso, error in map_in_pool(parse_file, paths, workers=workers):
+            if error is None:
+                self.add(path, dso)
+            else:
+                self.errors[path] = error
+
+    def add(self, path, dso):
+        self.files[path] = CorpusFile(path, self.pool, dso)
+        self.errors.pop(path, None)
+
+        return self.files[path]
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        return iter(self.files.values())
+
+    def __getitem__(self, path):
+        return self.files[path]
+
+    def __contains__(self, path):
+        return path in self.files
+
+    def find(self, string, section=None):
+        """
+        Returns (path, section, index) of every occurrence of string.
+        """
+        string_id = self.pool.id_of(string.encode() if isinstance(string, str) else string)
+        if string_id is None:
+            return []
+
+        occurrences = []
+        for corpus_file in self:
+            for table in (section,) if section else STRING_TABLES:
+                ids = getattr(corpus_file, table)
+                occurrences.extend((corpus_file.path, table, index) for index, i in enumerate(ids) if i == string_id)
+
+        return occurrences
+
+    def string_counts(self, section="global_strings"):
+        """
+        Returns {string: number of files whose table contains it}.
+        """
+        counts = [0] * len(self.pool)
+        for corpus_file in self:
+            for string_id in set(getattr(corpus_file, section)):
+                counts[string_id] += 1
+
+        return {self.pool[string_id]: count for string_id, count in enumerate(counts) if count}
+
+
+def parse_file(path):
+    try:
+        return path, DSO.from_file(path), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
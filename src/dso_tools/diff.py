@@ -0,0 +1,166 @@
+import argparse
+import hashlib
+import json
+from collections import namedtuple
+
+from dso_tools.code import Code
+from dso_tools.dso import DSO, SECTIONS, LazyDSO
+
+CODE_CHUNK = 1024
+MAX_SHOWN_INSTRUCTIONS = 8
+
+# kind is one of "added", "removed" or "modified". key is an index, except for code, where it's
+# a (start, end) range of ips, and version, where it's None.
+Change = namedtuple("Change", ["section", "kind", "key", "old", "new"])
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="dso diff", allow_abbrev=False)
+    parser.add_argument("dso_file_a", help="Path to the first dso file")
+    parser.add_argument("dso_file_b", help="Path to the second dso file")
+
+    return parser.parse_args(args)
+
+
+def section_digests(dso):
+    """
+    Returns {section: digest} of raw sections of a LazyDSO, without decoding them.
+    """
+    digests = {}
+    with memoryview(dso.buffer) as view:
+        for section, (start, end, _) in dso.locate_all().items():
+            digests[section] = hashlib.blake2b(view[start:end]).digest()
+
+    return digests
+
+
+def diff_files(path_a, path_b):
+    with DSO.from_file(path_a, lazy=True) as a, DSO.from_file(path_b, lazy=True) as b:
+        return diff_dsos(a, b)
+
+
+def diff_dsos(a, b):
+    """
+    Compares two dsos section by section and returns a list of Changes. For LazyDSOs sections are hashed first
+    and only the ones that differ get decoded and compared in detail. Sections decoded by either dso may have
+    changed in memory, so they're always compared in detail.
+    """
+    if isinstance(a, LazyDSO) and isinstance(b, LazyDSO):
+        digests_a = section_digests(a)
+        digests_b = section_digests(b)
+        changed_sections = [
+            section
+            for section in SECTIONS
+            if a.is_decoded(section) or b.is_decoded(section) or digests_a[section] != digests_b[section]
+        ]
+    else:
+        changed_sections = SECTIONS
+
+    changes = []
+    for section in changed_sections:
+        if section == "version":
+            version_a = getattr(a, "protocol_version", a.version)
+            version_b = getattr(b, "protocol_version", b.version)
+            if version_a != version_b:
+                changes.append(Change(section, "modified", None, version_a, version_b))
+        elif section == "code":
+            changes.extend(diff_code(as_code(a.code), as_code(b.code)))
+        else:
+            changes.extend(diff_sequences(section, getattr(a, section), getattr(b, section)))
+
+    return changes
+
+
+def diff_sequences(section, a, b):
+    changes = []
+    for i in range(max(len(a), len(b))):
+        if i >= len(b):
+            changes.append(Change(section, "removed", i, a[i], None))
+        elif i >= len(a):
+            changes.append(Change(section, "added", i, None, b[i]))
+        elif a[i] != b[i]:
+            changes.append(Change(section, "modified", i, a[i], b[i]))
+
+    return changes
+
+
+def diff_code(a, b):
+    common = min(len(a), len(b))
+    changes = []
+    start = None
+    for chunk_start in range(0, common, CODE_CHUNK):
+        chunk_end = min(chunk_start + CODE_CHUNK, common)
+        if start is None and same_instructions(a, b, chunk_start, chunk_end):
+            continue
+
+        for ip in range(chunk_start, chunk_end):
+            same = a.values[ip] == b.values[ip] and a.widths[ip] == b.widths[ip]
+            if not same and start is None:
+                start = ip
+            elif same and start is not None:
+                changes.append(Change("code", "modified", (start, ip), a[start:ip], b[start:ip]))
+                start = None
+
+    if start is not None:
+        changes.append(Change("code", "modified", (start, common), a[start:common], b[start:common]))
+    if len(a) > common:
+        changes.append(Change("code", "removed", (common, len(a)), a[common:], None))
+    if len(b) > common:
+        changes.append(Change("code", "added", (common, len(b)), None, b[common:]))
+
+    return changes
+
+
+def as_code(code):
+    return code if isinstance(code, Code) else Code(code)
+
+
+def same_instructions(a, b, start, end):
+    return a.values[start:end] == b.values[start:end] and a.widths[start:end] == b.widths[start:end]
+
+
+def format_value(section, value):
+    if value is None:
+        return ""
+    if section in ("global_strings", "function_strings"):
+        return json.dumps(value.decode(errors="backslashreplace"))
+    if section == "code":
+        if len(value) > MAX_SHOWN_INSTRUCTIONS:
+            return f"({len(value)} instructions)"
+        return "[" + ", ".join(f"{v:#x}" for v in value.values) + "]"
+
+    return repr(value)
+
+
+def format_change(change):
+    if change.section == "code":
+        location = f"code[{change.key[0]}:{change.key[1]}]"
+    elif change.key is None:
+        location = change.section
+    else:
+        location = f"{change.section}[{change.key}]"
+
+    old = format_value(change.section, change.old)
+    new = format_value(change.section, change.new)
+    if change.kind == "added":
+        return f"{location}: added {new}"
+    if change.kind == "removed":
+        return f"{location}: removed {old}"
+
+    line = f"{location}: modified {old} -> {new}"
+    if change.section in ("global_floats", "function_floats"):
+        line += f" ({change.new - change.old:+g})"
+    elif change.section == "code" and change.old.values == change.new.values:
+        line += " (encoding only)"
+
+    return line
+
+
+def main(args):
+    parsed_args = parse_args(args)
+
+    changes = diff_files(parsed_args.dso_file_a, parsed_args.dso_file_b)
+    for change in changes:
+        print(format_change(change))
+
+    return 1 if changes else 0
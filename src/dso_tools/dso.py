@@ -1,82 +1,756 @@
+import bisect
+import mmap
+import os
+import re
 import struct
+import sys
+from array import array
 
-from dso_tools.opcodes import OPCODES
+from dso_tools.code import Code, U32_WIDTH
+from dso_tools.floats import FLOAT_WIDTH, FloatTable
+from dso_tools.instructions import DecodeError, find_operands, iter_instructions
+from dso_tools.opcodes import FUNC_DECL_ARGUMENT_COUNT_OPERAND, FUNC_DECL_END_OPERAND, OPCODES
+from dso_tools.strings import StringTable
+from dso_tools.timings import Phase
 
 SUPPORTED_DSO_VERSIONS = (43,)
-U32_BYTES = 4
-FLOAT_BYTES = 8
+U32_BYTES = U32_WIDTH
+FLOAT_BYTES = FLOAT_WIDTH
+ESCAPED_U32 = re.compile(rb"\xff([\x00-\xff]{4})")
+SECTIONS = (
+    "version",
+    "global_strings",
+    "function_strings",
+    "global_floats",
+    "function_floats",
+    "code",
+    "string_references",
+)
+STRING_TABLES = ("global_strings", "function_strings")
+# attributes of DSO that are decoded from each section
+SECTION_ATTRIBUTES = {
+    "version": ("version",),
+    "global_strings": ("global_strings",),
+    "function_strings": ("function_strings",),
+    "global_floats": ("global_floats",),
+    "function_floats": ("function_floats",),
+    "code": ("code", "line_break_count"),
+    "string_references": ("string_references",),
+}
+STRING_OPCODES = frozenset(
+    OPCODES.index(op) for op in ("OP_TAG_TO_STR", "OP_LOADIMMED_STR", "OP_DOCBLOCK_STR", "OP_ASSERT")
+)
+FUNC_DECL_OPCODE = OPCODES.index("OP_FUNC_DECL")
+TAG_TO_STR_OPCODE = OPCODES.index("OP_TAG_TO_STR")
+STRING_OPCODES_PATTERN = re.compile(b"[" + bytes(sorted(STRING_OPCODES)) + b"]")
+INSTRUCTION_WIDTHS = bytes([U32_BYTES if byte == 0xFF else 1 for byte in range(256)])
 
 
 class DSO:
     version = SUPPORTED_DSO_VERSIONS[0]
-    global_strings = []
-    function_strings = []
-    global_floats = []
-    function_floats = []
-    code = []
     line_break_count = 0
-    string_references = []
+    _string_operands = None
+
+    def __init__(self):
+        # every dso gets its own empty sections, filling one in place never leaks into another
+        self.global_strings = []
+        self.function_strings = []
+        self.global_floats = []
+        self.function_floats = []
+        self.code = []
+        self.string_references = []
 
     @staticmethod
     def from_stream(stream):
         dso = DSO()
 
-        dso.protocol_version = parse_protocol_version(stream)
-        dso.global_strings = parse_string_table(stream)
-        dso.function_strings = parse_string_table(stream)
-        dso.global_floats = parse_float_table(stream)
-        dso.function_floats = parse_float_table(stream)
-        dso.code, dso.line_break_count = parse_code(stream)
-        dso.string_references = parse_string_references(stream)
+        dso.protocol_version = parse_section(stream, "version", parse_protocol_version)
+        dso.global_strings = parse_section(stream, "global_strings", parse_string_table)
+        dso.function_strings = parse_section(stream, "function_strings", parse_string_table)
+        dso.global_floats = parse_section(stream, "global_floats", parse_float_table)
+        dso.function_floats = parse_section(stream, "function_floats", parse_float_table)
+        dso.code, dso.line_break_count = parse_section(stream, "code", parse_code)
+        dso.string_references = parse_section(stream, "string_references", parse_string_references)
 
         return dso
 
-    def encode(self):
-        buffer = eu32(self.version)
-        buffer += encode_string_table(self.global_strings)
-        buffer += encode_string_table(self.function_strings)
-        buffer += encode_float_table(self.global_floats)
-        buffer += encode_float_table(self.function_floats)
-        buffer += encode_code(self.code, self.line_break_count)
-        buffer += encode_string_references(self.string_references)
-
-        return buffer
+    @staticmethod
+    def from_buffer(buffer):
+        """
+        Parses a whole dso held in memory (bytes, bytearray or mmap) without going through many tiny reads.
+        """
+        dso = DSO()
 
-    def patch_global_strings(self, patches):
-        new_global_strings = self.global_strings.copy()
-        new_code = self.code.copy()
-        new_string_references = []
+        with BufferReader(buffer) as reader:
+            dso.protocol_version = parse_section(reader, "version", parse_protocol_version)
+            dso.global_strings = parse_section(reader, "global_strings", parse_string_table)
+            dso.function_strings = parse_section(reader, "function_strings", parse_string_table)
+            dso.global_floats = parse_section(reader, "global_floats", parse_float_table)
+            dso.function_floats = parse_section(reader, "function_floats", parse_float_table)
+            dso.code, dso.line_break_count = parse_section(reader, "code", parse_code_from_buffer)
+            dso.string_references = parse_section(reader, "string_references", parse_string_references_from_buffer)
 
-        for i, new_value in patches.items():
-            new_global_strings[int(i)] = new_value.encode()
+        return dso
 
-        for ip, instruction in enumerate(self.code):
-            if is_opcode(instruction):
-                op = OPCODES[u8(instruction)]
-                if op in ("OP_TAG_TO_STR", "OP_LOADIMMED_STR", "OP_DOCBLOCK_STR", "OP_ASSERT"):
-                    offset = bytes_to_int(new_code[ip + 1])
-                    new_offset = get_new_string_offset(offset, self.global_strings, new_global_strings)
+    @staticmethod
+    def from_file(path, lazy=False):
+        """
+        With lazy=True a LazyDSO is returned. It keeps the file mapped, so don't modify the file while using it.
+        """
+        buffer = map_file(path)
+        if lazy:
+            return LazyDSO(buffer)
+
+        if isinstance(buffer, bytes):
+            return DSO.from_buffer(buffer)
+
+        with buffer:
+            return DSO.from_buffer(buffer)
+
+    def encode_section(self, section):
+        if section == "version":
+            return eu32(self.version)
+        if section in ("global_strings", "function_strings"):
+            return encode_string_table(getattr(self, section))
+        if section in ("global_floats", "function_floats"):
+            return encode_float_table(getattr(self, section))
+        if section == "code":
+            return encode_code(self.code, self.line_break_count)
+        if section == "string_references":
+            return encode_string_references(self.string_references)
+
+        raise ValueError(f"unknown section {section!r}")
+
+    def encode_sections(self):
+        """
+        Yields encoded sections one at a time, so a section can be written or hashed and dropped before the next
+        one is encoded.
+        """
+        for section in SECTIONS:
+            with Phase(f"encode {section}") as phase:
+                encoded = self.encode_section(section)
+                phase.bytes = len(encoded)
+
+            yield encoded
+
+    def encode(self, compact=False):
+        """
+        With compact=True the string tables are compacted first, see compacted().
+        """
+        if compact:
+            return self.compacted().encode()
+
+        return b"".join(self.encode_sections())
+
+    def encode_to(self, stream, compact=False):
+        if compact:
+            return self.compacted().encode_to(stream)
+
+        written = 0
+        for section in self.encode_sections():
+            stream.write(section)
+            written += len(section)
+
+        return written
+
+    def save(self, path, compact=False):
+        """
+        Writes the dso to a temporary file next to path and renames it over path, so a failure never leaves
+        path truncated. The temporary file takes over path's permissions.
+        """
+        write_atomically(path, (self.compacted() if compact else self).encode_to)
 
-                    new_code[ip + 1] = eu32(new_offset)
+    @staticmethod
+    async def aload(path, executor=None):
+        """
+        Loads a dso without blocking the event loop. The file is read in the loop's default thread pool and parsed
+        in executor, e.g. a ProcessPoolExecutor for CPU-heavy trees, or in the thread pool if it's None.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        buffer = await loop.run_in_executor(None, read_file, path)
+        return await loop.run_in_executor(executor, DSO.from_buffer, buffer)
+
+    async def asave(self, path, executor=None):
+        """
+        Same as save() without blocking the event loop. The dso is encoded in executor, if given (a LazyDSO can't
+        be sent to a process executor), and written in the loop's default thread pool.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(executor, self.encode)
+        await loop.run_in_executor(None, write_atomically, path, lambda f: f.write(encoded))
+
+    def copy(self):
+        """
+        Returns an independent DSO with the same contents. Copying a LazyDSO decodes all of its sections.
+        """
+        dso = DSO()
+        if hasattr(self, "protocol_version"):
+            dso.protocol_version = self.protocol_version
+        dso.version = self.version
+        dso.global_strings = StringTable(self.global_strings)
+        dso.function_strings = StringTable(self.function_strings)
+        dso.global_floats = FloatTable(self.global_floats)
+        dso.function_floats = FloatTable(self.function_floats)
+        dso.code = Code(self.code)
+        dso.line_break_count = self.line_break_count
+        dso.string_references = [(offset, list(occurrences)) for offset, occurrences in self.string_references]
 
-        for offset, occurrences in self.string_references:
-            new_offset = get_new_string_offset(offset, self.global_strings, new_global_strings)
-            new_string_references.append((new_offset, occurrences))
+        return dso
 
-        self.global_strings = new_global_strings
+    def get_string_operands(self, use_numpy=False):
+        """
+        Returns {global string offset: [ips]} for operands of opcodes that consume global string offsets, similar to
+        string_references. The index is built with a full code scan once and then kept up to date by
+        patch_strings. Assigning a new code object rebuilds it, modifying code in place doesn't.
+        """
+        return self.get_string_operand_indexes(use_numpy)[0]
+
+    def get_function_string_operands(self, use_numpy=False):
+        """
+        Same as get_string_operands, for operands inside function bodies, which point into function_strings.
+        """
+        return self.get_string_operand_indexes(use_numpy)[1]
+
+    def get_string_operand_indexes(self, use_numpy=False):
+        if self._string_operands is None or self._string_operands[0] is not self.code:
+            with Phase("patch index") as phase:
+                bodies = find_function_bodies(self.code, self.string_references, len(self.code) - self.line_break_count)
+                string_operands = find_string_operands(self.code, use_numpy, len(self.code) - self.line_break_count)
+                self._string_operands = (self.code, *split_string_operands(string_operands, bodies), bodies)
+                phase.count = len(self.code)
+
+        return self._string_operands[1:3]
+
+    def patch_global_strings(self, patches, validate=False, use_numpy=False):
+        self.patch_strings(global_patches=patches, validate=validate, use_numpy=use_numpy)
+
+    def patch_function_strings(self, patches, validate=False, use_numpy=False):
+        self.patch_strings(function_patches=patches, validate=validate, use_numpy=use_numpy)
+
+    def patch_strings(self, global_patches=None, function_patches=None, validate=False, use_numpy=False):
+        """
+        Patches global and function string tables at once. Only operands and string references pointing at offsets
+        that change are rewritten, in a single pass over the code for both tables.
+        With validate=True the result is cross-checked against a full code scan.
+        use_numpy=True uses the NumPy versions of the scan and remap, see vectorized_module.
+        """
+        global_operands, function_operands = self.get_string_operand_indexes(use_numpy)
+        bodies = self._string_operands[3]
+        changed_ips = []
+        changed_values = []
+
+        with Phase("patch remap") as phase:
+            new_code = Code(self.code)
+            global_map = function_map = None
+            if global_patches:
+                new_global_strings = patch_string_table(self.global_strings, global_patches)
+                global_map = StringOffsetMap(self.global_strings, new_global_strings)
+                global_operands = remap_operands(global_operands, global_map, changed_ips, changed_values, use_numpy)
+            if function_patches:
+                new_function_strings = patch_string_table(self.function_strings, function_patches)
+                function_map = StringOffsetMap(self.function_strings, new_function_strings)
+                function_operands = remap_operands(
+                    function_operands, function_map, changed_ips, changed_values, use_numpy
+                )
+
+            write_operands(new_code, changed_ips, changed_values, use_numpy)
+            phase.count = len(changed_ips)
+
+        if validate:
+            expected_code = remap_string_operands_by_scan(
+                self.code, global_map, function_map, bodies, len(self.code) - self.line_break_count
+            )
+            if new_code.values != expected_code.values:
+                raise ValueError("patched code doesn't match the full code scan")
+
+        if global_map is not None:
+            self.global_strings = new_global_strings
+            self.string_references = [
+                (global_map[offset], occurrences) for offset, occurrences in self.string_references
+            ]
+        if function_map is not None:
+            self.function_strings = new_function_strings
         self.code = new_code
-        self.string_references = new_string_references
+        self._string_operands = (new_code, global_operands, function_operands, bodies)
+
+    def compacted(self, use_numpy=False):
+        """
+        Returns a copy with smaller string tables: global strings that no operand or string reference points to are
+        dropped, identical strings are stored once and a string that is a suffix of another one points into its
+        tail. Operands and string references are rewritten to match, so every one of them still reads the same
+        string. Indices of strings change, so dumps of the result don't apply as patches to the original.
+        """
+        global_operands, function_operands = self.get_string_operand_indexes(use_numpy)
+        bodies = self._string_operands[3]
+        global_offsets = set(global_operands).union(offset for offset, _ in self.string_references)
+
+        dso = self.copy()
+        with Phase("compact") as phase:
+            dso.global_strings, global_map = compact_string_table(
+                self.global_strings, global_offsets, tagged_offsets=find_tagged_offsets(dso.code, global_operands)
+            )
+            dso.function_strings, function_map = compact_string_table(
+                self.function_strings,
+                function_operands,
+                keep_unreferenced=True,
+                tagged_offsets=find_tagged_offsets(dso.code, function_operands),
+            )
+
+            changed_ips = []
+            changed_values = []
+            new_global_operands = remap_operands_through(global_operands, global_map, changed_ips, changed_values)
+            new_function_operands = remap_operands_through(function_operands, function_map, changed_ips, changed_values)
+            write_operands(dso.code, changed_ips, changed_values, use_numpy)
+
+            string_references = {}
+            for offset, occurrences in self.string_references:
+                string_references.setdefault(global_map.get(offset, offset), []).extend(occurrences)
+            dso.string_references = list(string_references.items())
+            phase.count = len(changed_ips)
+
+        dso._string_operands = (dso.code, new_global_operands, new_function_operands, bodies)
+
+        return dso
+
+
+async def aload_files(paths, concurrency=8, executor=None, return_exceptions=False):
+    """
+    Loads files with DSO.aload, at most concurrency of them at a time, and returns the DSOs in the order of paths.
+    With return_exceptions=True a failed file gives its exception instead of failing the whole call.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def load(path):
+        async with semaphore:
+            return await DSO.aload(path, executor)
+
+    return await asyncio.gather(*(load(path) for path in paths), return_exceptions=return_exceptions)
+
+
+def map_file(path):
+    """
+    Returns a read-only mmap of a file, or its contents as bytes if it's empty, since empty files can't be mapped.
+    """
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return f.read()
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_atomically(path, write):
+    """
+    Calls write with a temporary file next to path and renames the file over path. The file keeps the permissions
+    of the one it replaces, a new file gets the usual ones for the umask instead of mkstemp's 0600.
+    """
+    import tempfile  # only needed for writing
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        else:
+            os.chmod(temp_path, 0o666 & ~current_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+
+    return umask
+
+
+def save_over_source(dso, path, source=None):
+    """
+    Encodes dso and writes it over path, closing source, the LazyDSO that maps path (dso itself by default),
+    in between. A mapped file can't be replaced on Windows, so the whole file is encoded into memory first.
+    """
+    if source is None:
+        source = dso
+
+    try:
+        encoded = dso.encode()
+    finally:
+        if isinstance(source, LazyDSO):
+            source.close()
+
+    write_atomically(path, lambda f: f.write(encoded))
+
+
+def parse_section(stream, section, parser):
+    with Phase(f"parse {section}", stream) as phase:
+        value = parser(stream)
+        if section == "version":
+            phase.count = 1
+        elif isinstance(value, tuple):  # code and line break count
+            phase.count = len(value[0])
+        elif not isinstance(value, int):
+            phase.count = len(value)
+
+    return value
+
+
+def vectorized_module(use_numpy=False):
+    """
+    Returns dso_tools.vectorized if NumPy should be used, None for the pure-Python paths. NumPy is only used when
+    asked for: on typical files its scan and remap are slower than the regex scan and dict lookups.
+    """
+    if not use_numpy:
+        return None
+
+    from dso_tools import vectorized
+
+    if not vectorized.available():
+        raise RuntimeError("NumPy is not installed")
+
+    return vectorized
+
+
+def find_string_operands(code, use_numpy=False, instruction_count=None):
+    """
+    Returns {offset: [operand ips]} of opcodes consuming string offsets, found by decoding instructions from ip 0.
+    Pass the instruction count (len(code) - line_break_count) to leave out line breaks. Code that doesn't decode
+    falls back to scan_string_operands.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+
+    try:
+        return find_operands(code, STRING_OPCODES, instruction_count)
+    except DecodeError:
+        return scan_string_operands(code, use_numpy)
+
+
+def scan_string_operands(code, use_numpy=False):
+    """
+    Uses the same is_opcode heuristic as the full code scan, but candidates are found by the regex engine in the
+    lowest bytes of all instructions, so only the actual string opcodes (and rare false candidates) are visited.
+    Immediates that happen to look like string opcodes are taken for them, so it's only a fallback for code
+    that doesn't decode.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+
+    vectorized = vectorized_module(use_numpy)
+    if vectorized is not None:
+        return vectorized.find_string_operands(code, STRING_OPCODES)
+
+    lowest_bytes = u32_bytes(code.values)[::U32_BYTES]
+    string_operands = {}
+    for candidate in STRING_OPCODES_PATTERN.finditer(lowest_bytes, 0, len(code) - 1):
+        ip = candidate.start()
+        if code.widths[ip] == 1:
+            string_operands.setdefault(code.values[ip + 1], []).append(ip + 1)
+
+    return string_operands
+
+
+def find_function_bodies(code, string_references, instruction_count=None):
+    """
+    Returns sorted (start, end) ip ranges of function bodies, in which the VM resolves string operands against
+    function_strings. A declaration is laid out as OP_FUNC_DECL, name, namespace, package, has body flag, end ip,
+    argument count and argument names, and declarations are found by decoding instructions from ip 0. Pass
+    the instruction count (len(code) - line_break_count) to leave out line breaks. Code that doesn't decode
+    falls back to guess_function_bodies.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+
+    try:
+        declarations = find_operands(code, (FUNC_DECL_OPCODE,), instruction_count)
+    except DecodeError:
+        return guess_function_bodies(code, string_references)
+
+    bodies = []
+    for name_ip in sorted(ip for ips in declarations.values() for ip in ips):
+        arguments_ip = name_ip + FUNC_DECL_ARGUMENT_COUNT_OPERAND
+        bodies.append((arguments_ip + 1 + code.values[arguments_ip], code.values[name_ip + FUNC_DECL_END_OPERAND]))
+
+    return bodies
+
+
+def guess_function_bodies(code, string_references):
+    """
+    Same as find_function_bodies for code that doesn't decode. OP_FUNC_DECL is 0, so rather than scanning for it,
+    candidates are taken from identifier fixups of function names and checked against fixups of argument names.
+    Immediate zeros followed by fixed up operands can still pass for a declaration.
+    """
+    fixups = {ip for _, occurrences in string_references for ip in occurrences}
+    bodies = []
+    for name_ip in sorted(fixups):
+        ip = name_ip - 1
+        if ip < 0 or ip + 7 > len(code) or code.widths[ip] != 1 or code.values[ip] != FUNC_DECL_OPCODE:
+            continue
+        if bodies and ip < bodies[-1][1]:  # functions don't nest
+            continue
+
+        end = code.values[ip + 5]
+        arguments_count = code.values[ip + 6]
+        start = ip + 7 + arguments_count
+        if start <= end <= len(code) and all(ip + 7 + i in fixups for i in range(arguments_count)):
+            bodies.append((start, end))
+
+    return bodies
+
+
+def split_string_operands(string_operands, bodies):
+    """
+    Splits a string operand index into operands of global code and of function bodies.
+    """
+    if not bodies:
+        return string_operands, {}
+
+    starts = [start for start, _ in bodies]
+    global_operands = {}
+    function_operands = {}
+    for offset, ips in string_operands.items():
+        for ip in ips:
+            body = bisect.bisect_right(starts, ip) - 1
+            operands = function_operands if body >= 0 and ip < bodies[body][1] else global_operands
+            operands.setdefault(offset, []).append(ip)
+
+    return global_operands, function_operands
+
+
+def patch_string_table(string_table, patches):
+    patches = {
+        int(i): new_value if isinstance(new_value, bytes) else new_value.encode() for i, new_value in patches.items()
+    }
+    if isinstance(string_table, StringTable):
+        return string_table.patched(patches)
+
+    new_string_table = list(string_table)
+    for i, new_value in patches.items():
+        new_string_table[i] = new_value
+
+    return new_string_table
+
+
+def compact_string_table(string_table, offsets, keep_unreferenced=False, tagged_offsets=()):
+    """
+    Returns a new table holding the strings read at offsets, each stored once and merged into the tail of a longer
+    string where possible, and a {old offset: new offset} map. Offsets past the end of the table aren't strings
+    and are left out of the map. The new table always ends with an empty string, so the offset of the last string
+    (see string_index_to_offset) keeps pointing at a null byte.
+    OP_TAG_TO_STR overwrites its string in place with a tag prefix byte and the tag id, running into the padding
+    the compiler reserves after short strings. Strings at tagged_offsets are therefore never shared or merged and
+    keep their bytes up to the next referenced offset.
+    """
+    if not isinstance(string_table, StringTable):
+        string_table = StringTable(string_table)
+    blob = string_table.blob
+
+    tagged = {}
+    referenced = sorted({offset for offset in (*offsets, *tagged_offsets) if offset < len(blob)})
+    for offset in tagged_offsets:
+        if offset < len(blob):
+            end = blob.find(b"\x00", offset) + 1 or len(blob)
+            next_index = bisect.bisect_right(referenced, offset)
+            next_offset = referenced[next_index] if next_index < len(referenced) else len(blob)
+            tagged[offset] = blob[offset : max(end, blob.rfind(b"\x00", offset, next_offset) + 1)]
+
+    values = {}
+    for offset in offsets:
+        if offset < len(blob) and offset not in tagged:
+            values[offset] = string_at_offset(string_table, offset)
+
+    if keep_unreferenced:
+        # strings inside the bytes kept for a tag are in the new table already
+        in_tag = bytearray(len(blob) + 1)
+        for offset, part in tagged.items():
+            in_tag[offset : offset + len(part)] = b"\x01" * len(part)
+        unreferenced = [string for offset, string in zip(string_table.offsets, string_table) if not in_tag[offset]]
+        strings = list(dict.fromkeys([*unreferenced, *values.values()]))
+    else:
+        # in table order, so the compacted table reads like the original one
+        strings = list(dict.fromkeys(values[offset] for offset in sorted(values)))
+    strings = [string for string in strings if string]
+    if not strings and not values and not tagged:
+        return StringTable.from_raw(b""), {}
+
+    # reversed, a suffix sorts right after the strings ending with it, so each string only has to be checked
+    # against the nearest longer one that was kept
+    owners = {}
+    owner = None
+    for reversed_string in sorted((string[::-1] for string in strings), reverse=True):
+        if owner is not None and owner.startswith(reversed_string):
+            owners[reversed_string[::-1]] = owner[::-1]
+        else:
+            owner = reversed_string
+
+    parts = [string + b"\x00" for string in strings if string not in owners]
+    kept_offsets = {}
+    new_offset = 0
+    for part in parts:
+        kept_offsets[part[:-1]] = new_offset
+        new_offset += len(part)
+
+    offset_map = {}
+    for offset, part in sorted(tagged.items()):
+        offset_map[offset] = new_offset
+        parts.append(part)
+        new_offset += len(part)
+
+    if tagged or not parts:  # the last string can't be a lone one or read the null byte of a tag
+        parts.append(b"\x00")
+    new_blob = b"".join(parts)
+    kept_offsets[b""] = len(new_blob) - 1
+
+    for offset, value in values.items():
+        if value in owners:
+            owner = owners[value]
+            offset_map[offset] = kept_offsets[owner] + len(owner) - len(value)
+        else:
+            offset_map[offset] = kept_offsets[value]
+
+    return StringTable.from_raw(new_blob), offset_map
+
+
+def find_tagged_offsets(code, string_operands):
+    """
+    Offsets of string_operands read by OP_TAG_TO_STR.
+    """
+    return [
+        offset for offset, ips in string_operands.items() if any(code.values[ip - 1] == TAG_TO_STR_OPCODE for ip in ips)
+    ]
+
+
+def string_at_offset(string_table, offset):
+    """
+    String an operand with offset reads, up to the next null byte. Offsets inside a string read its tail.
+    """
+    if offset == string_index_to_offset(len(string_table) - 1, string_table):
+        return string_table[-1]
+
+    blob = get_raw_string_table(string_table)
+    end = blob.find(b"\x00", offset)
+
+    return blob[offset:] if end == -1 else blob[offset:end]
+
+
+def remap_operands_through(string_operands, offset_map, changed_ips, changed_values):
+    """
+    Same as remap_operands, for a plain {old offset: new offset} map. Offsets missing from it stay as they are.
+    """
+    new_string_operands = {}
+    for offset, ips in string_operands.items():
+        new_offset = offset_map.get(offset, offset)
+        if new_offset != offset:
+            changed_ips.extend(ips)
+            changed_values.extend([new_offset] * len(ips))
+
+        new_string_operands.setdefault(new_offset, []).extend(ips)
+
+    return new_string_operands
+
+
+def remap_operands(string_operands, offset_map, changed_ips, changed_values, use_numpy=False):
+    """
+    Returns a string operand index with offsets remapped through offset_map. Operands that have to be rewritten are
+    appended to changed_ips and changed_values.
+    """
+    new_string_operands = {}
+    offsets = list(string_operands)
+    for offset, new_offset in zip(offsets, offset_map.remap(offsets, use_numpy)):
+        ips = string_operands[offset]
+        if new_offset != offset:
+            changed_ips.extend(ips)
+            changed_values.extend([new_offset] * len(ips))
+
+        new_string_operands.setdefault(new_offset, []).extend(ips)
+
+    return new_string_operands
+
+
+def write_operands(code, ips, values, use_numpy=False):
+    """
+    Sets instructions at ips to u32 values.
+    """
+    vectorized = vectorized_module(use_numpy)
+    if vectorized is not None:
+        vectorized.write_operands(code, ips, values, U32_BYTES)
+        return
+
+    for ip, value in zip(ips, values):
+        code.values[ip] = value
+        code.widths[ip] = U32_BYTES
+
+
+def remap_string_operands_by_scan(
+    code, offset_map, function_offset_map=None, function_bodies=(), instruction_count=None
+):
+    """
+    Rewrites every operand of opcodes consuming string offsets, the way patching worked before
+    string operands were indexed. Operands in function bodies are remapped with function_offset_map.
+    Opcodes are found by decoding every instruction, or with the is_opcode heuristic if code doesn't decode.
+    """
+    code = Code(code)
+    new_code = code.copy()
+    in_function = bytearray(len(code))
+    for start, end in function_bodies:
+        in_function[start:end] = b"\x01" * (end - start)
+
+    try:
+        opcode_ips = [ip for ip, _, _ in iter_instructions(code, instruction_count)]
+    except DecodeError:
+        opcode_ips = [ip for ip in range(len(code)) if code.is_opcode(ip)]
+
+    for ip in opcode_ips:
+        if code.values[ip] in STRING_OPCODES:
+            offset = new_code.values[ip + 1]
+            operand_offset_map = function_offset_map if in_function[ip + 1] else offset_map
+            if operand_offset_map is not None:
+                new_code[ip + 1] = eu32(operand_offset_map[offset])
+
+    return new_code
 
 
 def encode_string_references(string_references):
-    buffer = eu32(len(string_references))
-    for offset, occurrences in string_references:
-        buffer += eu32(offset)
-        buffer += eu32(len(occurrences))
-        for occurrence in occurrences:
-            buffer += eu32(occurrence)
+    values = array("I", [len(string_references)])
+    try:
+        for offset, occurrences in string_references:
+            values.append(offset)
+            values.append(len(occurrences))
+            values.extend(occurrences)
+    except (OverflowError, TypeError) as e:
+        raise ValueError("can't encode string references as u32") from e
+
+    return u32_bytes(values)
+
 
-    return buffer
+def parse_string_references_from_buffer(reader):
+    string_references_count = u32(reader)
+    string_references = []
+    for _ in range(string_references_count):
+        offset, occurrences_count = struct.unpack_from("<II", reader.buffer, reader.offset)
+        reader.offset += 2 * U32_BYTES
+        occurrences = list(struct.unpack_from(f"<{occurrences_count}I", reader.buffer, reader.offset))
+        reader.offset += occurrences_count * U32_BYTES
+        string_references.append((offset, occurrences))
+
+    return string_references
 
 
 def parse_string_references(stream):
@@ -98,7 +772,7 @@ def parse_code(stream):
     line_break_pair_count = u32(stream)
     line_break_count = 2 * line_break_pair_count
 
-    code = []
+    code = Code()
     for i in range(instruction_count):
         peek = stream.read(1)
         if peek == b"\xff":
@@ -112,15 +786,93 @@ def parse_code(stream):
     return code, line_break_count
 
 
+def parse_code_from_buffer(reader):
+    r"""
+    Same as parse_code, but the code is decoded in bulk. Only the \xff escapes are visited one by one,
+    runs of single byte instructions between them are handled by the regex engine and bytes methods.
+    """
+    instruction_count = u32(reader)
+    line_break_pair_count = u32(reader)
+    line_break_count = 2 * line_break_pair_count
+
+    buffer = reader.buffer
+    end, escape_indices, escaped_values = scan_code(buffer, reader.offset, instruction_count)
+    line_breaks_end = end + line_break_count * U32_BYTES
+    if line_breaks_end > len(buffer):
+        raise ValueError("unexpected end of code")
+
+    instructions = ESCAPED_U32.sub(b"\xff", buffer[reader.offset : end])  # exactly one byte per instruction
+    values = array("I")
+    values.extend(instructions)
+    widths = bytearray(instructions.translate(INSTRUCTION_WIDTHS))
+    for index, value in zip(escape_indices, u32_array(b"".join(escaped_values))):
+        values[index] = value
+
+    values += u32_array(buffer[end:line_breaks_end])
+    widths += bytes([U32_BYTES]) * line_break_count
+    reader.offset = line_breaks_end
+
+    return Code.from_arrays(values, widths), line_break_count
+
+
+def scan_code(buffer, offset, instruction_count):
+    """
+    Finds where instruction_count instructions starting at offset end, without decoding them.
+    Returns the end offset, indices of escaped u32 instructions and their raw (undecoded) values.
+    """
+    remaining = instruction_count
+    escape_indices = []
+    escaped_values = []
+    for escape in ESCAPED_U32.finditer(buffer, offset):
+        singles_count = escape.start() - offset
+        if singles_count >= remaining:
+            break
+
+        remaining -= singles_count + 1
+        escape_indices.append(instruction_count - remaining - 1)
+        escaped_values.append(escape.group(1))
+        offset = escape.end()
+        if not remaining:
+            break
+
+    end = offset + remaining
+    if end > len(buffer) or buffer.find(b"\xff", offset, end) != -1:
+        raise ValueError("unexpected end of code")
+
+    return end, escape_indices, escaped_values
+
+
+def u32_array(raw):
+    values = array("I")
+    values.frombytes(raw)
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values
+
+
+def u32_bytes(values):
+    if sys.byteorder == "big":
+        values = array("I", values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
 def parse_float_table(stream):
     floats_count = u32(stream)
-    format_string = "<" + "d" * floats_count
-    return list(struct.unpack(format_string, stream.read(floats_count * FLOAT_BYTES)))
+    raw = stream.read(floats_count * FLOAT_BYTES)
+    if len(raw) != floats_count * FLOAT_BYTES:
+        raise ValueError("unexpected end of float table")
+
+    return FloatTable.from_bytes(raw)
 
 
 def encode_float_table(float_table):
-    format_string = "<" + "d" * len(float_table)
-    return eu32(len(float_table)) + struct.pack(format_string, *float_table)
+    if not isinstance(float_table, FloatTable):
+        float_table = FloatTable(float_table)
+
+    return eu32(len(float_table)) + float_table.to_bytes()
 
 
 def is_opcode(instruction):
@@ -134,7 +886,73 @@ def get_new_string_offset(offset, string_table, new_string_table):
     return new_offset
 
 
+def get_string_offsets(string_table):
+    if isinstance(string_table, StringTable):
+        return string_table.offsets
+
+    offsets = []
+    offset = 0
+    for string in string_table:
+        offsets.append(offset)
+        offset += len(string) + 1
+
+    return offsets
+
+
+class StringOffsetMap(dict):
+    """
+    Maps offsets in string_table to offsets of the same string indices in new_string_table.
+
+    It gives the same results as get_new_string_offset, but the offsets of both tables are computed once,
+    so each lookup is a bisect over the old offsets instead of joining the whole table again.
+    """
+
+    def __init__(self, string_table, new_string_table):
+        super().__init__()
+        self.old_offsets = get_string_offsets(string_table)
+        self.new_offsets = get_string_offsets(new_string_table)
+        self.old_last_offset = get_last_string_offset(string_table, self.old_offsets)
+        self.new_last_offset = get_last_string_offset(new_string_table, self.new_offsets)
+
+    def __missing__(self, offset):
+        if offset == self.old_last_offset:
+            index = len(self.old_offsets) - 1
+        else:
+            index = bisect.bisect_right(self.old_offsets, offset) - 1
+
+        if index == len(self.new_offsets) - 1:
+            new_offset = self.new_last_offset
+        else:
+            new_offset = self.new_offsets[index]
+
+        self[offset] = new_offset
+        return new_offset
+
+    def remap(self, offsets, use_numpy=False):
+        """
+        Returns new offsets for a list of old offsets, with a single vectorized lookup for use_numpy=True.
+        """
+        vectorized = vectorized_module(use_numpy)
+        if vectorized is not None and offsets:
+            return vectorized.remap_offsets(offsets, self)
+
+        return [self[offset] for offset in offsets]
+
+
+def get_last_string_offset(string_table, offsets):
+    """
+    The last string of a table always gets the offset of its terminating null byte, see string_index_to_offset.
+    """
+    if not string_table:
+        return -1
+
+    return offsets[-1] + len(string_table[-1]) - 1
+
+
 def get_raw_string_table(string_table):
+    if isinstance(string_table, StringTable):
+        return string_table.blob
+
     return b"\x00".join(string_table)
 
 
@@ -144,17 +962,26 @@ def encode_string_table(string_table):
 
 
 def encode_code(code, line_break_count):
-    buff = b""
-    for instruction in code[0 : len(code) - line_break_count]:
-        if len(instruction) == 4:
-            buff += b"\xff"
+    if not isinstance(code, Code):
+        code = Code(code)
+
+    instruction_count = len(code) - line_break_count
+    parts = [eu32(instruction_count), eu32(line_break_count // 2)]
+    start = 0
+    while start < instruction_count:
+        escape = code.widths.find(U32_BYTES, start, instruction_count)
+        if escape == -1:
+            escape = instruction_count
 
-        buff += instruction
+        parts.append(bytes(code.values[start:escape].tolist()))
+        if escape < instruction_count:
+            parts.append(b"\xff" + eu32(code.values[escape]))
 
-    for instruction in code[len(code) - line_break_count :]:
-        buff += instruction
+        start = escape + 1
 
-    return eu32(len(code) - line_break_count) + eu32(line_break_count // 2) + buff
+    parts.append(u32_bytes(code.values[instruction_count:]))
+
+    return b"".join(parts)
 
 
 def eu32(v):
@@ -175,6 +1002,9 @@ def bytes_to_int(one_or_four_bytes):
 
 
 def string_index_to_offset(index, string_table):
+    if isinstance(string_table, StringTable):
+        return string_table.index_to_offset(index)
+
     if index == len(string_table) - 1:
         return len(b"\x00".join(string_table)) - 1
 
@@ -182,6 +1012,9 @@ def string_index_to_offset(index, string_table):
 
 
 def offset_to_string_index(offset, string_table):
+    if isinstance(string_table, StringTable):
+        return string_table.offset_to_index(offset)
+
     raw_strings = get_raw_string_table(string_table)
 
     if offset == len(raw_strings) - 1:
@@ -220,9 +1053,8 @@ def parse_protocol_version(stream):
 
 def parse_string_table(stream):
     strings_length = u32(stream)
-    string_table = stream.read(strings_length).split(b"\x00")
 
-    return string_table
+    return StringTable.from_raw(stream.read(strings_length))
 
 
 def normalize_code(code):
@@ -231,3 +1063,180 @@ def normalize_code(code):
     yet more verbose form of \xXX\x00\x00\x00, which is later represented by \xff\xXX\x00\x00\x00 in encoded form.
     """
     return [eu32(bytes_to_int(instruction)) for instruction in code]
+
+
+def u32_at(buffer, offset):
+    try:
+        return struct.unpack_from("<I", buffer, offset)[0]
+    except struct.error as e:
+        raise ValueError("unexpected end of dso") from e
+
+
+def check_section_end(buffer, end):
+    if end > len(buffer):
+        raise ValueError("unexpected end of dso")
+
+    return end
+
+
+def iter_sections(buffer):
+    """
+    Yields (name, start, end, count) for consecutive sections of a dso held in buffer. Only section headers are
+    read, apart from the code section, whose end can only be found by scanning it for escaped u32s.
+    Counts are numbers of elements that the section decodes to (e.g. len(dso.code) for the code section).
+    """
+    with BufferReader(buffer) as reader:
+        parse_protocol_version(reader)
+    yield "version", 0, U32_BYTES, 1
+    offset = U32_BYTES
+
+    for name in ("global_strings", "function_strings"):
+        end = check_section_end(buffer, offset + U32_BYTES + u32_at(buffer, offset))
+        yield name, offset, end, buffer[offset + U32_BYTES : end].count(b"\x00") + 1
+        offset = end
+
+    for name in ("global_floats", "function_floats"):
+        floats_count = u32_at(buffer, offset)
+        end = check_section_end(buffer, offset + U32_BYTES + floats_count * FLOAT_BYTES)
+        yield name, offset, end, floats_count
+        offset = end
+
+    instruction_count = u32_at(buffer, offset)
+    line_break_count = 2 * u32_at(buffer, offset + U32_BYTES)
+    code_end, _, _ = scan_code(buffer, offset + 2 * U32_BYTES, instruction_count)
+    end = check_section_end(buffer, code_end + line_break_count * U32_BYTES)
+    yield "code", offset, end, instruction_count + line_break_count
+    offset = end
+
+    string_references_count = u32_at(buffer, offset)
+    end = offset + U32_BYTES
+    for _ in range(string_references_count):
+        end += (2 + u32_at(buffer, end + U32_BYTES)) * U32_BYTES
+    yield "string_references", offset, check_section_end(buffer, end), string_references_count
+
+
+class LazySection:
+    """
+    Attribute of LazyDSO that parses its section on the first access and then stores the result on the instance,
+    so later accesses and assignments work the same as for a regular DSO.
+    """
+
+    def __init__(self, parser, section=None):
+        self.parser = parser
+        self.section = section
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.section = self.section or name
+
+    def __get__(self, dso, owner=None):
+        if dso is None:
+            return self
+
+        with dso.reader(self.section) as reader:
+            if self.name == self.section:
+                value = parse_section(reader, self.section, self.parser)
+            else:  # a header field of another section, e.g. line_break_count, isn't a parse of that section
+                value = self.parser(reader)
+
+        dso.__dict__[self.name] = value
+        return value
+
+
+def parse_line_break_count(reader):
+    u32(reader)  # instruction count
+    return 2 * u32(reader)
+
+
+class LazyDSO(DSO):
+    """
+    Dso that decodes a section only when it's accessed. Sections are located from their headers as they are
+    needed, so e.g. reading global_strings doesn't touch the rest of the file. The buffer has to stay unchanged
+    (and open, in case of mmap) for as long as sections are accessed.
+    """
+
+    global_strings = LazySection(parse_string_table)
+    function_strings = LazySection(parse_string_table)
+    global_floats = LazySection(parse_float_table)
+    function_floats = LazySection(parse_float_table)
+    code = LazySection(lambda reader: parse_code_from_buffer(reader)[0])
+    line_break_count = LazySection(parse_line_break_count, section="code")
+    string_references = LazySection(parse_string_references_from_buffer)
+
+    def __init__(self, buffer):
+        # DSO.__init__ isn't called, its empty sections would hide the lazy ones
+        self.buffer = buffer
+        self.sections = {}
+        self._sections_iterator = iter_sections(buffer)
+        self.protocol_version = u32_at(buffer, self.locate("version")[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if hasattr(self.buffer, "close"):
+            self.buffer.close()
+
+    def locate(self, section):
+        """
+        Returns (start, end, count) of a section.
+        """
+        while section not in self.sections:
+            name, start, end, count = next(self._sections_iterator)
+            self.sections[name] = (start, end, count)
+
+        return self.sections[section]
+
+    def locate_all(self):
+        return {section: self.locate(section) for section in SECTIONS}
+
+    def encode_section(self, section):
+        """
+        Sections that were never accessed are copied from the buffer as they are, so e.g. saving a dso after
+        patching global strings re-encodes only global strings, code and string references.
+        """
+        if self.is_decoded(section):
+            return super().encode_section(section)
+
+        start, end, _ = self.locate(section)
+        return bytes(self.buffer[start:end])
+
+    def is_decoded(self, section):
+        """
+        Whether any attribute of section was accessed or assigned, so the raw section may be out of date.
+        """
+        return any(attribute in self.__dict__ for attribute in SECTION_ATTRIBUTES[section])
+
+    def reader(self, section):
+        start, _, _ = self.locate(section)
+        return BufferReader(self.buffer, start)
+
+
+class BufferReader:
+    """
+    Stream-like reader over an in-memory dso. read() returns memoryview slices, so nothing is copied until
+    a parser needs it. Parsers that can work on the whole buffer at once use buffer and offset directly.
+    """
+
+    def __init__(self, buffer, offset=0):
+        if isinstance(buffer, memoryview):
+            buffer = buffer.tobytes()
+
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.offset = offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.view.release()
+
+    def read(self, size):
+        data = self.view[self.offset : self.offset + size]
+        self.offset += len(data)
+
+        return data
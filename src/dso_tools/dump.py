@@ -0,0 +1,151 @@
+import json
+import re
+import struct
+
+from dso_tools.dso import U32_BYTES, LazyDSO
+
+FORMATS = ("json", "ndjson", "binary")
+ERROR_POLICIES = ("strict", "replace", "backslashreplace", "skip")
+BINARY_RECORD_HEADER = struct.Struct("<II")  # index, length
+
+
+class DumpError(ValueError):
+    pass
+
+
+def parse_range(text):
+    """
+    Parses START:END (both optional, END exclusive) into a (start, stop) pair.
+    """
+    start, separator, stop = text.partition(":")
+    try:
+        start = int(start) if start else 0
+        stop = int(stop) if stop else None
+        if not separator:
+            stop = start + 1
+    except ValueError:
+        raise ValueError(f"invalid range {text!r}, expected START:END") from None
+
+    if start < 0 or (stop is not None and stop < start):
+        raise ValueError(f"invalid range {text!r}, expected START:END")
+
+    return start, stop
+
+
+def iter_raw_strings(dso, section="global_strings", start=0, stop=None):
+    """
+    Yields (index, raw string) pairs. For a LazyDSO with the table not decoded yet the raw table is walked
+    in the underlying buffer, so no list of strings is built.
+    """
+    if not isinstance(dso, LazyDSO) or section in dso.__dict__:
+        strings = getattr(dso, section)
+        stop = len(strings) if stop is None else min(stop, len(strings))
+        for index in range(start, stop):
+            yield index, strings[index]
+        return
+
+    buffer = dso.buffer
+    section_start, section_end, _ = dso.locate(section)
+    offset = section_start + U32_BYTES
+    index = 0
+    while stop is None or index < stop:
+        end = buffer.find(b"\x00", offset, section_end)
+        if end == -1:
+            end = section_end
+        if index >= start:
+            yield index, buffer[offset:end]
+        if end == section_end:
+            return
+
+        offset = end + 1
+        index += 1
+
+
+def decode_strings(raw_strings, errors="strict"):
+    for index, raw_string in raw_strings:
+        try:
+            yield index, raw_string.decode("utf-8", "strict" if errors == "skip" else errors)
+        except UnicodeDecodeError as e:
+            if errors == "skip":
+                continue
+            raise DumpError(f"string {index} is not valid UTF-8 ({e.reason} at byte {e.start})") from e
+
+
+def filter_strings(strings, pattern):
+    pattern = re.compile(pattern)
+    for index, string in strings:
+        if pattern.search(string):
+            yield index, string
+
+
+def write_json(strings, stream):
+    """
+    Writes the same document as json.dumps({index: string}, indent=4), one entry at a time.
+    """
+    separator = "{\n"
+    for index, string in strings:
+        stream.write(f"{separator}    {json.dumps(str(index))}: {json.dumps(string)}")
+        separator = ",\n"
+
+    stream.write("{}\n" if separator == "{\n" else "\n}\n")
+
+
+def write_ndjson(strings, stream):
+    for index, string in strings:
+        stream.write(json.dumps({"index": index, "string": string}) + "\n")
+
+
+def write_binary(raw_strings, stream):
+    """
+    Writes a record of u32 index, u32 length and raw bytes for every string.
+    """
+    for index, raw_string in raw_strings:
+        stream.write(BINARY_RECORD_HEADER.pack(index, len(raw_string)))
+        stream.write(raw_string)
+
+
+def read_binary(stream):
+    while True:
+        header = stream.read(BINARY_RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) != BINARY_RECORD_HEADER.size:
+            raise ValueError("unexpected end of binary dump")
+
+        index, length = BINARY_RECORD_HEADER.unpack(header)
+        yield index, stream.read(length)
+
+
+def dump_strings(
+    dso, stream, section="global_strings", format="json", string_range=None, pattern=None, errors="strict"
+):
+    """
+    Streams a string table to a text stream (or a binary stream for the binary format).
+    string_range is a (start, stop) pair of indices, pattern a regex that decoded strings have to match.
+    """
+    start, stop = string_range or (0, None)
+    raw_strings = iter_raw_strings(dso, section, start, stop)
+
+    if format == "binary":
+        if pattern is not None:
+            pattern = re.compile(pattern.encode())
+            raw_strings = ((index, string) for index, string in raw_strings if pattern.search(string))
+        write_binary(raw_strings, stream)
+        return
+
+    if errors == "strict":
+        # fail before anything is written instead of leaving half a document in the stream
+        for _ in decode_strings(raw_strings, errors):
+            pass
+        raw_strings = iter_raw_strings(dso, section, start, stop)
+
+    strings = decode_strings(raw_strings, errors)
+    if pattern is not None:
+        strings = filter_strings(strings, pattern)
+
+    if format == "json":
+        write_json(strings, stream)
+    elif format == "ndjson":
+        write_ndjson(strings, stream)
+    else:
+        raise ValueError(f"unknown format {format!r}")
@@ -0,0 +1,147 @@
+from array import array
+from itertools import accumulate
+
+from dso_tools.code import Code, U32_WIDTH
+from dso_tools.instructions import JUMP_OPERAND_TABLE, iter_instructions
+from dso_tools.timings import Phase
+
+
+class CodeEditor:
+    """
+    Batches insertions and deletions of whole instructions in a dso's code and applies them in one pass.
+
+    Positions are ips of the code as it was before any edit. Jump targets, function ends, fail jumps, string
+    reference ips and line break ips are relocated through a prefix sum of the size changes, so applying
+    any number of edits is linear in the size of the code. A jump to an ip where code was inserted lands on
+    the inserted code, a jump into deleted instructions lands on whatever follows them.
+    """
+
+    def __init__(self, dso):
+        self.dso = dso
+        self.insertions = {}
+        self.deletions = {}
+
+    def insert(self, ip, instructions, string_references=()):
+        """
+        Inserts instructions (Code, a list of one or four byte instructions or the result of instructions.assemble)
+        before the instruction at ip. Their jump operands are ips of the original code and get relocated too.
+        string_references are (global string offset, [indices into instructions]) fixups of identifier operands.
+        """
+        if not isinstance(instructions, Code):
+            instructions = Code(instructions)
+        list(iter_instructions(instructions))  # only complete instructions can be inserted
+
+        self.insertions.setdefault(ip, []).append((instructions, string_references))
+
+    def delete(self, start, end):
+        """
+        Deletes instructions from start up to end (exclusive).
+        """
+        if end < start:
+            raise ValueError(f"invalid range of ips {start}:{end}")
+
+        self.deletions[start] = max(end, self.deletions.get(start, end))
+
+    def apply(self):
+        """
+        Applies all edits to the dso and returns the number of code words it has now.
+        """
+        dso = self.dso
+        code = Code(dso.code)
+        instruction_count = len(code) - dso.line_break_count
+
+        with Phase("edit") as phase:
+            starts = bytearray(instruction_count + 1)
+            jump_operands = []
+            for ip, opcode, _ in iter_instructions(code, instruction_count):
+                starts[ip] = 1
+                jump_operands.extend(ip + 1 + operand for operand in JUMP_OPERAND_TABLE[opcode])
+            starts[instruction_count] = 1
+
+            deleted, increments = self.size_changes(starts, instruction_count)
+            shifts = array("q", accumulate(increments, initial=0))
+
+            def relocate(ip):
+                return ip + shifts[min(ip, instruction_count)]
+
+            for ip in jump_operands:
+                if not deleted[ip]:
+                    write_ip(code, ip, relocate(code.values[ip]))
+
+            new_code = Code()
+            string_references = {}
+            for offset, ips in dso.string_references:
+                string_references.setdefault(offset, []).extend(
+                    relocate(ip) for ip in ips if ip >= instruction_count or not deleted[ip]
+                )
+
+            cursor = 0
+            for ip in sorted(self.insertions.keys() | self.deletions.keys()):
+                append_code(new_code, code, cursor, ip)
+                for instructions, references in self.insertions.get(ip, ()):
+                    block_start = len(new_code)
+                    block = Code(instructions)
+                    for block_ip, opcode, _ in iter_instructions(block):
+                        for operand in JUMP_OPERAND_TABLE[opcode]:
+                            write_ip(block, block_ip + 1 + operand, relocate(block.values[block_ip + 1 + operand]))
+                    append_code(new_code, block, 0, len(block))
+                    for offset, indices in references:
+                        string_references.setdefault(offset, []).extend(block_start + i for i in indices)
+                cursor = self.deletions.get(ip, ip)
+            append_code(new_code, code, cursor, instruction_count)
+
+            line_breaks = code.values[instruction_count:]
+            for i in range(1, len(line_breaks), 2):  # pairs of line and ip
+                line_breaks[i] = relocate(line_breaks[i])
+            new_code.values.extend(line_breaks)
+            new_code.widths.extend(code.widths[instruction_count:])
+            phase.count = len(new_code)
+
+        dso.code = new_code
+        dso.string_references = list(string_references.items())
+        self.insertions = {}
+        self.deletions = {}
+
+        return len(new_code)
+
+    def size_changes(self, starts, instruction_count):
+        """
+        Returns a bytearray marking deleted ips and the change of size at each ip, whose prefix sums give
+        the relocation of every ip.
+        """
+        deleted = bytearray(instruction_count + 1)
+        increments = array("q", bytes(8 * (instruction_count + 1)))
+        previous_end = 0
+        for start in sorted(self.deletions):
+            end = self.deletions[start]
+            if start < previous_end:
+                raise ValueError(f"deleted ranges overlap at ip {start}")
+            for ip in (start, end):
+                if not 0 <= ip <= instruction_count or not starts[ip]:
+                    raise ValueError(f"ip {ip} is not at the start of an instruction")
+
+            deleted[start:end] = b"\x01" * (end - start)
+            for ip in range(start, end):
+                increments[ip] = -1
+            previous_end = end
+
+        for ip, blocks in self.insertions.items():
+            if not 0 <= ip <= instruction_count or not starts[ip]:
+                raise ValueError(f"ip {ip} is not at the start of an instruction")
+            if deleted[ip] and ip not in self.deletions:
+                raise ValueError(f"can't insert at ip {ip}, it's deleted")
+
+            increments[ip] += sum(len(instructions) for instructions, _ in blocks)
+
+        return deleted, increments
+
+
+def write_ip(code, ip, value):
+    code.values[ip] = value
+    if value >= 0xFF:
+        code.widths[ip] = U32_WIDTH
+
+
+def append_code(new_code, code, start, end):
+    new_code.values.extend(code.values[start:end])
+    new_code.widths.extend(code.widths[start:end])
@@ -0,0 +1,92 @@
+import sys
+from array import array
+
+FLOAT_WIDTH = 8
+
+
+class FloatTable(array):
+    """
+    Float table kept as array('d'), so it's decoded and encoded with a single copy and numeric transforms can
+    work on the whole table. It compares equal to lists and arrays of the same floats, concatenates with them and
+    slices to a FloatTable, so it can be used like the lists float tables used to be.
+    """
+
+    def __new__(cls, values=()):
+        return super().__new__(cls, "d", values)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        """
+        Decodes little-endian f64s.
+        """
+        table = cls()
+        table.frombytes(raw)
+        if sys.byteorder == "big":
+            table.byteswap()
+
+        return table
+
+    def to_bytes(self):
+        if sys.byteorder == "big":
+            table = array("d", self)
+            table.byteswap()
+            return table.tobytes()
+
+        return self.tobytes()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FloatTable(super().__getitem__(index))
+
+        return super().__getitem__(index)
+
+    def __eq__(self, other):
+        if isinstance(other, array):
+            return super().__eq__(other)
+        if isinstance(other, list):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __add__(self, other):
+        if not isinstance(other, (array, list)):
+            return NotImplemented
+
+        table = FloatTable(self)
+        table.extend(other)
+        return table
+
+    def __radd__(self, other):
+        if not isinstance(other, (array, list)):
+            return NotImplemented
+
+        table = FloatTable(other)
+        table.extend(self)
+        return table
+
+    def __iadd__(self, other):
+        if not isinstance(other, (array, list)):
+            return NotImplemented
+
+        self.extend(other)
+        return self
+
+    def __mul__(self, count):
+        return FloatTable(super().__mul__(count))
+
+    __rmul__ = __mul__
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"FloatTable({self.tolist()!r})"
+
+    def __reduce__(self):
+        return FloatTable, (self.tolist(),)
+
+    def copy(self):
+        return FloatTable(self)
@@ -0,0 +1,55 @@
+import argparse
+import os
+import re
+import sys
+
+from dso_tools.dso import STRING_TABLES
+from dso_tools.index import StringIndex, add_index_argument
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog="dso grep",
+        allow_abbrev=False,
+        description="Finds strings in dso files indexed with `dso index`, without parsing the files again.",
+    )
+    parser.add_argument("pattern", help="Substring to look for")
+    parser.add_argument("--regex", action="store_true", help="Treats the pattern as a Python regular expression")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="Ignores case of letters")
+    parser.add_argument("--section", choices=STRING_TABLES, help="Searches only one of the string tables")
+    parser.add_argument(
+        "-l", "--files-with-matches", action="store_true", help="Prints only paths of files with matching strings"
+    )
+    add_index_argument(parser)
+
+    return parser.parse_args(args)
+
+
+def display_path(path):
+    relative_path = os.path.relpath(path)
+    return path if relative_path.startswith("..") else relative_path
+
+
+def main(args):
+    parsed_args = parse_args(args)
+    if not os.path.exists(parsed_args.index):
+        print(f"dso: no string index at {parsed_args.index}, create it with `dso index`", file=sys.stderr)
+        return 2
+
+    with StringIndex(parsed_args.index) as index:
+        try:
+            matches = index.search(parsed_args.pattern, parsed_args.regex, parsed_args.ignore_case, parsed_args.section)
+            found = False
+            last_path = None
+            for path, section, string_index, string in matches:
+                found = True
+                if not parsed_args.files_with_matches:
+                    print(f"{display_path(path)}:{section}:{string_index}:{string}")
+                elif path != last_path:
+                    print(display_path(path))
+                last_path = path
+        except re.error as e:
+            print(f"dso: invalid regular expression: {e}", file=sys.stderr)
+            return 2
+
+    return 0 if found else 1
@@ -0,0 +1,224 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+from dso_tools.batch import collect_files, map_in_pool
+from dso_tools.dso import DSO, STRING_TABLES
+
+INDEX_FORMAT_VERSION = 1
+# trigrams are the shortest patterns the full-text index can answer, shorter ones are looked up with a table scan
+TRIGRAM_LENGTH = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS strings (
+    id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, section INTEGER NOT NULL, idx INTEGER NOT NULL, string TEXT
+);
+CREATE INDEX IF NOT EXISTS strings_file_id ON strings (file_id);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS strings_fts USING fts5(
+    string, content='strings', content_rowid='id', tokenize='trigram case_sensitive 1'
+);
+CREATE TRIGGER IF NOT EXISTS strings_insert AFTER INSERT ON strings BEGIN
+    INSERT INTO strings_fts (rowid, string) VALUES (new.id, new.string);
+END;
+CREATE TRIGGER IF NOT EXISTS strings_delete AFTER DELETE ON strings BEGIN
+    INSERT INTO strings_fts (strings_fts, rowid, string) VALUES ('delete', old.id, old.string);
+END;
+"""
+
+
+def default_index_path():
+    return os.environ.get("DSO_TOOLS_INDEX", "dso-index.sqlite")
+
+
+def add_index_argument(parser):
+    parser.add_argument(
+        "--index",
+        default=default_index_path(),
+        metavar="INDEX_FILE",
+        help="SQLite file with the string index (default: $DSO_TOOLS_INDEX or dso-index.sqlite)",
+    )
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog="dso index",
+        allow_abbrev=False,
+        description="Adds strings of dso files to a string index searched by `dso grep`. Files that didn't change "
+        "since they were indexed (same mtime and size) are skipped and files that no longer exist are removed.",
+    )
+    parser.add_argument("paths", nargs="+", help="Dso files, directories to search for *.dso files or glob patterns")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)"
+    )
+    add_index_argument(parser)
+
+    return parser.parse_args(args)
+
+
+class StringIndex:
+    """
+    Persistent index of global and function strings of many dso files, kept in SQLite. Substring searches use an
+    FTS5 trigram index if SQLite supports it and a scan of the strings table otherwise; either way no dso
+    is parsed to answer a query.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, INDEX_FORMAT_VERSION):
+            self.connection.close()
+            raise ValueError(f"{path} is not a string index or it was created by another version of dso-tools")
+
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:  # SQLite without FTS5 or the trigram tokenizer
+            self.full_text = False
+        else:
+            self.full_text = True
+        self.connection.execute(f"PRAGMA user_version = {INDEX_FORMAT_VERSION}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def files(self):
+        """
+        Returns {path: (mtime_ns, size)} of indexed files.
+        """
+        rows = self.connection.execute("SELECT path, mtime_ns, size FROM files")
+        return {path: (mtime_ns, size) for path, mtime_ns, size in rows}
+
+    def update(self, paths, workers=None):
+        """
+        Indexes dso files in paths (files, directories or glob patterns, see batch.collect_files) on a process pool.
+        Returns (indexed paths, up to date paths, removed paths, [(path, error)]).
+        """
+        indexed_files = self.files()
+        stale = []
+        up_to_date = []
+        for path in collect_files(paths):
+            path = os.path.abspath(path)
+            if indexed_files.get(path) == file_key(path):
+                up_to_date.append(path)
+            else:
+                stale.append(path)
+
+        removed = [path for path in indexed_files if not os.path.isfile(path)]
+        indexed = []
+        errors = []
+        with self.connection:
+            for path in removed:
+                self.remove(path)
+
+            for path, key, strings, error in map_in_pool(extract_strings, stale, workers=workers):
+                if error is not None:
+                    errors.append((path, error))
+                    continue
+
+                self.add(path, key, strings)
+                indexed.append(path)
+
+        return indexed, up_to_date, removed, errors
+
+    def add(self, path, key, strings):
+        """
+        Replaces indexed strings of path with (section, index, string) triples.
+        """
+        self.remove(path)
+        mtime_ns, size = key
+        file_id = self.connection.execute(
+            "INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)", (path, mtime_ns, size)
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT INTO strings (file_id, section, idx, string) VALUES (?, ?, ?, ?)",
+            ((file_id, STRING_TABLES.index(section), index, string) for section, index, string in strings),
+        )
+
+    def remove(self, path):
+        row = self.connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM strings WHERE file_id = ?", row)
+            self.connection.execute("DELETE FROM files WHERE id = ?", row)
+
+    def search(self, pattern, regex=False, ignore_case=False, section=None):
+        """
+        Yields (path, section, index, string) of indexed strings containing pattern, or matching it as a regular
+        expression with regex=True, ordered by path, section and index.
+        """
+        query = "SELECT files.path, strings.section, strings.idx, strings.string FROM strings"
+        query += " JOIN files ON files.id = strings.file_id"
+        conditions = []
+        parameters = []
+        if regex:
+            expression = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            self.connection.create_function(
+                "matches", 1, lambda string: expression.search(string) is not None, deterministic=True
+            )
+            conditions.append("matches(strings.string)")
+        elif self.full_text and len(pattern) >= TRIGRAM_LENGTH and not ignore_case:
+            query += " JOIN strings_fts ON strings_fts.rowid = strings.id"
+            conditions.append("strings_fts MATCH ? AND instr(strings.string, ?) > 0")
+            parameters += ['"' + pattern.replace('"', '""') + '"', pattern]
+        elif ignore_case:
+            conditions.append("instr(lower(strings.string), lower(?)) > 0")
+            parameters.append(pattern)
+        else:
+            conditions.append("instr(strings.string, ?) > 0")
+            parameters.append(pattern)
+
+        if section is not None:
+            conditions.append("strings.section = ?")
+            parameters.append(STRING_TABLES.index(section))
+
+        query += " WHERE " + " AND ".join(conditions) + " ORDER BY files.path, strings.section, strings.idx"
+        for path, section_number, index, string in self.connection.execute(query, parameters):
+            yield path, STRING_TABLES[section_number], index, string
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def extract_strings(path):
+    """
+    Returns (path, (mtime_ns, size), [(section, index, string)], error). Strings that aren't valid UTF-8 are
+    stored with invalid bytes escaped as \\xNN.
+    """
+    try:
+        key = file_key(path)
+        with DSO.from_file(path, lazy=True) as dso:
+            strings = [
+                (section, index, string.decode("utf-8", "backslashreplace"))
+                for section in STRING_TABLES
+                for index, string in enumerate(getattr(dso, section))
+            ]
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+    return path, key, strings, None
+
+
+def main(args):
+    parsed_args = parse_args(args)
+
+    with StringIndex(parsed_args.index) as index:
+        indexed, up_to_date, removed, errors = index.update(parsed_args.paths, parsed_args.workers)
+
+    for path, error in errors:
+        print(f"failed {path}: {error}", file=sys.stderr)
+    print(f"{len(indexed)} indexed, {len(up_to_date)} up to date, {len(removed)} removed, {len(errors)} failed")
+
+    return 1 if errors else 0
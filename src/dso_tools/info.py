@@ -0,0 +1,36 @@
+import argparse
+import sys
+
+from dso_tools.dso import DSO, SECTIONS
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="dso info", allow_abbrev=False)
+    parser.add_argument("dso_files", nargs="+", metavar="dso_file", help="Path to dso file")
+
+    return parser.parse_args(args)
+
+
+def format_info(path, dso):
+    sections = dso.locate_all()
+    lines = [f"{path}: version {dso.protocol_version}", f"  {'section':<20}{'offset':>10}{'size':>10}{'count':>10}"]
+    for section in SECTIONS:
+        start, end, count = sections[section]
+        lines.append(f"  {section:<20}{start:>10}{end - start:>10}{count:>10}")
+
+    return "\n".join(lines)
+
+
+def main(args):
+    parsed_args = parse_args(args)
+
+    failed = False
+    for path in parsed_args.dso_files:
+        try:
+            with DSO.from_file(path, lazy=True) as dso:
+                print(format_info(path, dso))
+        except (OSError, ValueError) as e:
+            failed = True
+            print(f"{path}: {e}", file=sys.stderr)
+
+    return 1 if failed else 0
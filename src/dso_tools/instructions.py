@@ -0,0 +1,148 @@
+"""
+Instruction decoder driven by the operand tables in dso_tools.opcodes. Code is walked from its first instruction,
+every opcode is followed by its operands, so unlike the string operand scan it doesn't need any heuristics.
+"""
+
+from dso_tools.code import Code, U8_WIDTH, U32_WIDTH
+from dso_tools.opcodes import FUNC_DECL_ARGUMENT_COUNT_OPERAND, JUMP_OPERANDS, OPCODES, OPERAND_COUNTS
+
+# per opcode number, so decoding an instruction is a couple of list lookups
+OPERAND_COUNT_TABLE = [OPERAND_COUNTS.get(name, 0) for name in OPCODES]
+JUMP_OPERAND_TABLE = [JUMP_OPERANDS.get(name, ()) for name in OPCODES]
+INSTRUCTION_SIZE_TABLE = [1 + count for count in OPERAND_COUNT_TABLE]
+FUNC_DECL_OPCODE = OPCODES.index("OP_FUNC_DECL")
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def instruction_size(code, ip):
+    """
+    Returns the number of code words of the instruction at ip, the opcode included.
+    """
+    opcode = code.values[ip]
+    if code.widths[ip] != U8_WIDTH or opcode >= len(OPCODES):
+        raise DecodeError(f"invalid opcode {opcode} at ip {ip}")
+
+    size = 1 + OPERAND_COUNT_TABLE[opcode]
+    if opcode == FUNC_DECL_OPCODE:
+        argument_count_ip = ip + 1 + FUNC_DECL_ARGUMENT_COUNT_OPERAND
+        if argument_count_ip >= len(code):
+            raise DecodeError(f"truncated instruction at ip {ip}")
+        size += code.values[argument_count_ip]
+
+    return size
+
+
+def iter_instructions(code, end=None):
+    """
+    Yields (ip, opcode, size) of instructions up to end, by default the whole code. Pass the instruction count
+    (len(code) - line_break_count) to leave out line breaks.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+    if end is None:
+        end = len(code)
+
+    ip = 0
+    while ip < end:
+        size = instruction_size(code, ip)
+        if ip + size > end:
+            raise DecodeError(f"truncated instruction at ip {ip}")
+
+        yield ip, code.values[ip], size
+        ip += size
+
+
+def find_operands(code, opcodes, end=None):
+    """
+    Returns {value: [ips]} of the first operand of instructions with one of opcodes, e.g. string offsets of
+    opcodes consuming strings, keyed in order of their first occurrence. Same walk as iter_instructions, inlined
+    since it runs on every patch.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+    if end is None:
+        end = len(code)
+
+    values = code.values
+    widths = code.widths
+    sizes = INSTRUCTION_SIZE_TABLE
+    wanted = bytearray(len(sizes))
+    for opcode in opcodes:
+        wanted[opcode] = 1
+
+    operand_ips = []
+    ip = size = 0
+    while ip < end:
+        opcode = values[ip]
+        if widths[ip] != U8_WIDTH or opcode >= len(sizes):
+            raise DecodeError(f"invalid opcode {opcode} at ip {ip}")
+
+        size = sizes[opcode]
+        if wanted[opcode]:
+            operand_ips.append(ip + 1)
+        if opcode == FUNC_DECL_OPCODE:
+            if ip + size > end:
+                raise DecodeError(f"truncated instruction at ip {ip}")
+            size += values[ip + 1 + FUNC_DECL_ARGUMENT_COUNT_OPERAND]
+        ip += size
+
+    if ip > end:
+        raise DecodeError(f"truncated instruction at ip {ip - size}")
+
+    operands = {}
+    for ip in operand_ips:
+        operands.setdefault(values[ip], []).append(ip)
+
+    return operands
+
+
+def decode(code, end=None):
+    """
+    Returns (ip, opcode name, operand values) of instructions, mostly for inspection and tests.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+
+    return [
+        (ip, OPCODES[opcode], code.values[ip + 1 : ip + size].tolist())
+        for ip, opcode, size in iter_instructions(code, end)
+    ]
+
+
+def jump_operand_ips(code, end=None):
+    """
+    Returns ips of operands holding ips of other instructions: jump targets, function ends and fail jumps of object
+    creation and iteration.
+    """
+    if not isinstance(code, Code):
+        code = Code(code)
+
+    ips = []
+    for ip, opcode, _ in iter_instructions(code, end):
+        ips.extend(ip + 1 + operand for operand in JUMP_OPERAND_TABLE[opcode])
+
+    return ips
+
+
+def assemble(instructions):
+    """
+    Returns Code for (opcode name, operand, ...) tuples, e.g. [("OP_LOADIMMED_FLT", 0), ("OP_MUL",)].
+    Values below 0xff are written as single bytes, like the engine does.
+    """
+    code = Code()
+    for name, *operands in instructions:
+        opcode = OPCODES.index(name)
+        expected = OPERAND_COUNT_TABLE[opcode]
+        if opcode == FUNC_DECL_OPCODE and len(operands) > FUNC_DECL_ARGUMENT_COUNT_OPERAND:
+            expected += operands[FUNC_DECL_ARGUMENT_COUNT_OPERAND]
+        if len(operands) != expected:
+            raise ValueError(f"{name} takes {expected} operands, got {len(operands)}")
+
+        for value in (opcode, *operands):
+            code.values.append(value)
+            code.widths.append(U8_WIDTH if value < 0xFF else U32_WIDTH)
+
+    return code
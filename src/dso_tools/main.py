@@ -1,12 +1,31 @@
-import argparse
-import json
+import importlib
+import os
 import sys
 
-from dso_tools.dso import DSO
+# Every run, including subcommands, imports this module, so anything heavier than the standard modules above is
+# imported only by the functions that need it.
+
+COMMANDS = {
+    "batch": ("dso_tools.batch", "Patches many dso files in parallel"),
+    "diff": ("dso_tools.diff", "Compares two dso files section by section"),
+    "grep": ("dso_tools.grep", "Finds strings in dso files indexed with `dso index`"),
+    "index": ("dso_tools.index", "Adds strings of dso files to a persistent index searched by `dso grep`"),
+    "info": ("dso_tools.info", "Prints version, section sizes and counts without decoding sections"),
+    "serve": ("dso_tools.serve", "Handles JSON-lines requests from stdin, keeping parsed files in memory"),
+    "verify": ("dso_tools.verify", "Checks that dso files round-trip and are structurally consistent"),
+}
 
 
 def parse_args(args):
-    parser = argparse.ArgumentParser(allow_abbrev=False)
+    import argparse
+
+    from dso_tools.dump import ERROR_POLICIES, FORMATS, parse_range
+
+    epilog = "commands:\n" + "\n".join(f"  {name:<10}{description}" for name, (_, description) in COMMANDS.items())
+    epilog += "\n\nuse `dso COMMAND --help` for the help of a particular command"
+    parser = argparse.ArgumentParser(
+        allow_abbrev=False, epilog=epilog, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
     parser.add_argument("dso_file", help="Path to dso file")
     options = parser.add_mutually_exclusive_group()
     options.add_argument(
@@ -14,34 +33,174 @@ def parse_args(args):
         action="store_true",
         help="Dumps global string table to a form that can be later used as a patch",
     )
+    options.add_argument(
+        "--dump-function-string-table",
+        action="store_true",
+        help="Dumps function string table to a form that can be later used as a patch",
+    )
     options.add_argument(
         "--patch-string-table",
         action="store",
         metavar="PATCH_FILE",
-        help="Patches global string table in dso using a patch file",
+        help="Patches global string table in dso using a patch file or a manifest (a JSON list of patch files)",
+    )
+    parser.add_argument(
+        "--patch-function-string-table",
+        action="store",
+        metavar="PATCH_FILE",
+        help="Patches function string table in dso, can be combined with --patch-string-table",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Compacts string tables of the patched dso: drops unreferenced global strings, stores identical strings "
+        "once and lets strings share tails of longer ones. String indices change, so dump the table again before "
+        "making further patches",
+    )
+    dump_options = parser.add_argument_group("string table dump options")
+    dump_options.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="json",
+        help="json (default, usable as a patch), ndjson (an object per line) "
+        "or binary (u32 index, u32 length and raw bytes per string)",
+    )
+    dump_options.add_argument(
+        "--range",
+        type=parse_range,
+        metavar="START:END",
+        dest="string_range",
+        help="Dumps only strings with indices from START up to END (exclusive)",
+    )
+    dump_options.add_argument(
+        "--filter", metavar="REGEX", dest="pattern", help="Dumps only strings matching a regular expression"
+    )
+    dump_options.add_argument(
+        "--errors",
+        choices=ERROR_POLICIES,
+        default="strict",
+        help="What to do with strings that are not valid UTF-8: fail (strict, default), "
+        "replace invalid bytes with U+FFFD, escape them as \\xNN or skip such strings",
+    )
+    add_cache_dir_argument(parser)
+    add_instrumentation_arguments(parser)
+
+    parsed_args = parser.parse_args(args)
+    # dumps are printed before the file is patched or compacted and wouldn't apply to the written file
+    for argument in ("patch_function_string_table", "compact"):
+        if not getattr(parsed_args, argument):
+            continue
+        for option in ("dump_string_table", "dump_function_string_table"):
+            if getattr(parsed_args, option):
+                parser.error(
+                    f"argument --{argument.replace('_', '-')}: not allowed with argument --{option.replace('_', '-')}"
+                )
+
+    return parsed_args
+
+
+def add_cache_dir_argument(parser):
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("DSO_TOOLS_CACHE_DIR"),
+        help="Directory for caching parsed dso files between runs (default: $DSO_TOOLS_CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--verify-hash",
+        action="store_true",
+        help="Compares the content digest of files with cached entries too, not just size and modification time. "
+        "Reads every file completely, for trees where files are replaced keeping their size and mtime",
     )
 
-    return parser.parse_args(args)
 
+def add_instrumentation_arguments(parser):
+    parser.add_argument(
+        "--timings", action="store_true", help="Prints wall time, bytes and counts of every phase to stderr"
+    )
+    parser.add_argument("--profile", metavar="PROFILE_FILE", help="Writes cProfile stats of the run to a file")
+
+
+def run_instrumented(parsed_args, function, *args):
+    """
+    Runs function with --timings and --profile of parsed_args applied.
+    """
+    from dso_tools.timings import Timings, instrumented
+
+    timings = Timings() if parsed_args.timings else None
+    with instrumented(timings, parsed_args.profile):
+        result = function(*args)
 
-def dump_string_table(dso):
-    print(json.dumps({i: s.decode() for i, s in enumerate(dso.global_strings)}, indent=4))
+    if timings is not None:
+        print(timings.format(), file=sys.stderr)
+
+    return result
+
+
+def dump_string_table(dso, format="json", string_range=None, pattern=None, errors="strict", section="global_strings"):
+    from dso_tools.dump import dump_strings
+    from dso_tools.timings import Phase
+
+    stream = sys.stdout.buffer if format == "binary" else sys.stdout
+    with Phase(f"dump {section}"):
+        dump_strings(dso, stream, section, format, string_range, pattern, errors)
+        stream.flush()
 
 
 def main():
-    parsed_args = parse_args(sys.argv[1:])
+    args = sys.argv[1:]
+    if args and args[0] in COMMANDS:
+        module_name, _ = COMMANDS[args[0]]
+        return importlib.import_module(module_name).main(args[1:])
+
+    parsed_args = parse_args(args)
+
+    return run_instrumented(parsed_args, run, parsed_args)
+
+
+def run(parsed_args):
+    from dso_tools.dso import DSO, LazyDSO, save_over_source
+    from dso_tools.dump import DumpError
+    from dso_tools.patchset import load_patch_set
+
+    try:
+        global_patch = function_patch = None
+        if parsed_args.patch_string_table:
+            global_patch = load_patch_set(parsed_args.patch_string_table)
+        if parsed_args.patch_function_string_table:
+            function_patch = load_patch_set(parsed_args.patch_function_string_table)
+    except (OSError, ValueError) as e:  # unreadable or malformed patch files and conflicts between them
+        print(f"dso: {e}", file=sys.stderr)
+        return 1
 
-    with open(parsed_args.dso_file, "rb") as f:
-        dso = DSO.from_stream(f)
+    cache = None
+    if parsed_args.cache_dir:
+        from dso_tools.cache import DSOCache
 
-    if parsed_args.dump_string_table:
-        dump_string_table(dso)
+        cache = DSOCache(parsed_args.cache_dir, verify_hash=parsed_args.verify_hash)
+        dso = source = cache.load(parsed_args.dso_file)
+    else:
+        dso = source = DSO.from_file(parsed_args.dso_file, lazy=True)
 
-    if parsed_args.patch_string_table:
-        with open(parsed_args.patch_string_table) as f:
-            patch = json.load(f)
+    try:
+        if parsed_args.dump_string_table or parsed_args.dump_function_string_table:
+            section = "global_strings" if parsed_args.dump_string_table else "function_strings"
+            try:
+                dump_string_table(
+                    dso, parsed_args.format, parsed_args.string_range, parsed_args.pattern, parsed_args.errors, section
+                )
+            except DumpError as e:
+                print(f"dso: {e}, see --errors", file=sys.stderr)
+                return 1
 
-        dso.patch_global_strings(patch)
+        if global_patch is not None or function_patch is not None or parsed_args.compact:
+            if global_patch is not None or function_patch is not None:
+                dso.patch_strings(global_patch, function_patch)
+            if parsed_args.compact:
+                dso = dso.compacted()
+            save_over_source(dso, parsed_args.dso_file, source)
 
-        with open(parsed_args.dso_file, "wb") as f:
-            f.write(dso.encode())
+            if cache is not None:
+                cache.store(parsed_args.dso_file, dso)
+    finally:
+        if isinstance(source, LazyDSO):
+            source.close()
@@ -91,3 +91,61 @@ OPCODES = [
     "OP_ITER_END",
     "OP_INVALID",
 ]
+
+# Number of operands following each opcode, as read by CodeBlock::exec in Engine/source/console/compiledEval.cpp
+# (see docs/dso_layout.txt). Opcodes missing here take no operands.
+OPERAND_COUNTS = {
+    # name, namespace, package, has body flag, end ip, argument count, followed by argument count argument names
+    "OP_FUNC_DECL": 6,
+    # parent, is datablock, is internal, is singleton, line number, fail jump
+    "OP_CREATE_OBJECT": 6,
+    "OP_ADD_OBJECT": 1,
+    "OP_END_OBJECT": 1,
+    "OP_JMPIFFNOT": 1,
+    "OP_JMPIFNOT": 1,
+    "OP_JMPIFF": 1,
+    "OP_JMPIF": 1,
+    "OP_JMPIFNOT_NP": 1,
+    "OP_JMPIF_NP": 1,
+    "OP_JMP": 1,
+    "OP_SETCURVAR": 1,
+    "OP_SETCURVAR_CREATE": 1,
+    "OP_SETCUROBJECT_INTERNAL": 1,
+    "OP_SETCURFIELD": 1,
+    "OP_SETCURFIELD_TYPE": 1,
+    "OP_LOADIMMED_UINT": 1,
+    "OP_LOADIMMED_FLT": 1,
+    "OP_TAG_TO_STR": 1,
+    "OP_LOADIMMED_STR": 1,
+    "OP_DOCBLOCK_STR": 1,
+    "OP_LOADIMMED_IDENT": 1,
+    "OP_CALLFUNC_RESOLVE": 3,
+    "OP_CALLFUNC": 3,
+    "OP_ADVANCE_STR_APPENDCHAR": 1,
+    "OP_ASSERT": 1,
+    "OP_ITER_BEGIN": 2,
+    "OP_ITER_BEGIN_STR": 2,
+    "OP_ITER": 1,
+}
+
+# Operands holding ips of other instructions, by their position after the opcode
+JUMP_OPERANDS = {
+    "OP_FUNC_DECL": (4,),
+    "OP_CREATE_OBJECT": (5,),
+    "OP_JMPIFFNOT": (0,),
+    "OP_JMPIFNOT": (0,),
+    "OP_JMPIFF": (0,),
+    "OP_JMPIF": (0,),
+    "OP_JMPIFNOT_NP": (0,),
+    "OP_JMPIF_NP": (0,),
+    "OP_JMP": (0,),
+    "OP_ITER_BEGIN": (1,),
+    "OP_ITER_BEGIN_STR": (1,),
+    "OP_ITER": (0,),
+}
+
+# OP_FUNC_DECL is followed by as many more operands as the operand at this position says
+FUNC_DECL_ARGUMENT_COUNT_OPERAND = 5
+
+# OP_FUNC_DECL holds the ip following the function's body at this position
+FUNC_DECL_END_OPERAND = 4
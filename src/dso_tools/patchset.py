@@ -0,0 +1,109 @@
+import json
+import os
+
+
+class PatchConflictError(ValueError):
+    pass
+
+
+def compile_patch(patch):
+    """
+    Returns a patch with int indices and encoded strings, the form patch_global_strings applies without
+    any conversions.
+    """
+    compiled = {}
+    for index, value in patch.items():
+        try:
+            index = int(index)
+        except ValueError:
+            raise ValueError(f"invalid string index {index!r}") from None
+        if index < 0:
+            raise ValueError(f"invalid string index {index}")
+
+        if not isinstance(value, (str, bytes)):
+            raise ValueError(f"string {index} is set to {value!r}, which is not a string")
+
+        compiled[index] = value if isinstance(value, bytes) else value.encode()
+
+    return compiled
+
+
+def merge_patches(patches, sources=None):
+    """
+    Merges patches into one compiled patch. Patches may set the same string to the same value, but setting it
+    to different values is a conflict. sources name the patches in error messages.
+    """
+    if sources is None:
+        sources = [f"patch {i}" for i in range(len(patches))]
+
+    merged = {}
+    origins = {}
+    for patch, source in zip(patches, sources):
+        for index, value in compile_patch(patch).items():
+            if index in merged and merged[index] != value:
+                raise PatchConflictError(
+                    f"string {index} is set to {merged[index]!r} by {origins[index]} and to {value!r} by {source}"
+                )
+            merged[index] = value
+            origins.setdefault(index, source)
+
+    return merged
+
+
+def read_patch_files(path, seen=()):
+    """
+    Returns (path, patch) pairs for a patch file, which is either a JSON object mapping indices to strings or
+    a manifest - a JSON list of patch files (relative to the manifest), applied together.
+    """
+    real_path = os.path.realpath(path)
+    if real_path in seen:
+        raise ValueError(f"manifest {path} includes itself")
+
+    with open(path) as f:
+        try:
+            content = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from None
+
+    if isinstance(content, dict):
+        return [(path, content)]
+    if not isinstance(content, list):
+        raise ValueError(f"{path} is neither a patch nor a list of patch files")
+
+    base_dir = os.path.dirname(path)
+    patch_files = []
+    for member in content:
+        patch_files.extend(read_patch_files(os.path.join(base_dir, member), (*seen, real_path)))
+
+    return patch_files
+
+
+# real path: (stamps of all files involved, compiled patch)
+compiled_patch_sets = {}
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_mtime_ns, stat.st_size
+
+
+def load_patch_set(path):
+    """
+    Loads, merges and compiles a patch or a manifest. Compiled patch sets are cached until any of their files
+    changes, so applying the same set to many files reads and checks it once.
+    """
+    real_path = os.path.realpath(path)
+    if real_path in compiled_patch_sets:
+        stamps, compiled = compiled_patch_sets[real_path]
+        try:
+            if all(file_stamp(stamp[0]) == stamp for stamp in stamps):
+                return compiled
+        except FileNotFoundError:
+            pass
+
+    patch_files = read_patch_files(path)
+    paths = [patch_path for patch_path, _ in patch_files]
+    compiled = merge_patches([patch for _, patch in patch_files], paths)
+    compiled_patch_sets[real_path] = (tuple(file_stamp(p) for p in dict.fromkeys([path, *paths])), compiled)
+
+    return compiled
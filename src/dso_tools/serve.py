@@ -0,0 +1,153 @@
+import argparse
+import json
+import sys
+
+from dso_tools.cache import DSOCache
+from dso_tools.dso import DSO, STRING_TABLES
+from dso_tools.dump import decode_strings, filter_strings, iter_raw_strings
+from dso_tools.patchset import compile_patch, load_patch_set
+from dso_tools.verify import check_invariants, check_round_trip, path_digest
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog="dso serve",
+        allow_abbrev=False,
+        description="Reads JSON requests, one per line, from stdin and writes a JSON response line for each. "
+        'A request is an object like {"id": 1, "command": "dump", "path": "file.dso"}, '
+        "where command is one of: " + ", ".join(sorted(COMMANDS)) + ".",
+    )
+    parser.add_argument(
+        "--max-entries", type=int, default=64, help="Number of parsed dso files kept in memory (default: 64)"
+    )
+
+    return parser.parse_args(args)
+
+
+class RequestError(ValueError):
+    pass
+
+
+class Server:
+    """
+    Handles requests with parsed files kept in a DSOCache between requests. Patch files are compiled once,
+    see load_patch_set.
+    """
+
+    def __init__(self, max_entries=64):
+        self.cache = DSOCache(max_entries=max_entries)
+
+    def handle(self, request):
+        """
+        Returns a response for a decoded request. Errors are reported in the response rather than raised.
+        """
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            command = COMMANDS.get(request.get("command"))
+            if command is None:
+                raise RequestError(f"unknown command {request.get('command')!r}")
+            result = command(self, request)
+        except Exception as e:
+            return {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+        return {"id": request_id, "ok": True, "result": result}
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"invalid JSON: {e}"}
+
+        return self.handle(request)
+
+    def serve(self, input_stream, output_stream):
+        for line in input_stream:
+            if not line.strip():
+                continue
+
+            output_stream.write(json.dumps(self.handle_line(line)) + "\n")
+            output_stream.flush()
+
+    def dump(self, request):
+        section = request.get("section", "global_strings")
+        if section not in STRING_TABLES:
+            raise RequestError(f"section must be one of {', '.join(STRING_TABLES)}")
+
+        dso = self.cache.load(required(request, "path"), copy=False)
+        start, stop = request.get("range") or (0, None)
+        if not isinstance(start, int) or not isinstance(stop, (int, type(None))):
+            raise RequestError("range must be a [start, stop] pair of indices")
+        strings = decode_strings(iter_raw_strings(dso, section, start, stop), request.get("errors", "strict"))
+        if request.get("filter") is not None:
+            strings = filter_strings(strings, request["filter"])
+
+        return {str(index): string for index, string in strings}
+
+    def patch(self, request):
+        path = required(request, "path")
+        global_patch = self.load_patch(request.get("patch"))
+        function_patch = self.load_patch(request.get("function_patch"))
+        if global_patch is None and function_patch is None:
+            raise RequestError("patch or function_patch is required")
+
+        dso = self.cache.load(path)
+        dso.patch_strings(global_patch, function_patch)
+        dso.save(path)
+        self.cache.store(path, dso)
+
+        return {"global_strings": len(global_patch or ()), "function_strings": len(function_patch or ())}
+
+    def load_patch(self, patch):
+        """
+        A patch is either a path of a patch file (or a manifest) or an inline object.
+        """
+        if patch is None:
+            return None
+        if isinstance(patch, dict):
+            return compile_patch(patch)
+        if isinstance(patch, str):
+            return load_patch_set(patch)
+
+        raise RequestError("patch must be a path or an object")
+
+    def info(self, request):
+        with DSO.from_file(required(request, "path"), lazy=True) as dso:
+            sections = {}
+            for section, (start, end, count) in dso.locate_all().items():
+                sections[section] = {"offset": start, "size": end - start, "count": count}
+
+            return {"version": dso.protocol_version, "sections": sections}
+
+    def verify(self, request):
+        """
+        Checks that a file parses and encodes back to the same bytes and lists its structural problems,
+        see dso verify.
+        """
+        path = required(request, "path")
+        dso = self.cache.load(path, copy=False)
+
+        return {"round_trip": not check_round_trip(dso, path_digest(path)), "problems": check_invariants(dso)}
+
+
+COMMANDS = {
+    "dump": Server.dump,
+    "patch": Server.patch,
+    "info": Server.info,
+    "verify": Server.verify,
+}
+
+
+def required(request, name):
+    if name not in request:
+        raise RequestError(f"{name} is required")
+
+    return request[name]
+
+
+def main(args):
+    parsed_args = parse_args(args)
+    Server(parsed_args.max_entries).serve(sys.stdin, sys.stdout)
+
+    return 0
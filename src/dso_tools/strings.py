@@ -0,0 +1,194 @@
+import bisect
+import re
+from array import array
+from collections.abc import MutableSequence
+from itertools import accumulate
+
+NULL = re.compile(b"\x00")
+
+
+class StringTable(MutableSequence):
+    """
+    String table kept as its raw null-separated blob and an array with the start offset of every string.
+
+    It still behaves like a list of bytes, but strings are sliced out of the blob only when they're accessed
+    and conversions between indices and offsets don't have to join or scan the table. A table read from a file
+    finds its offsets only when they're first needed, so e.g. encoding it again never looks at its strings.
+    """
+
+    __slots__ = ("blob", "_offsets")
+
+    def __init__(self, strings=()):
+        if isinstance(strings, StringTable):
+            self.blob = strings.blob
+            self._offsets = None if strings._offsets is None else array(strings._offsets.typecode, strings._offsets)
+            return
+
+        strings = list(strings)
+        self.blob = b"\x00".join(strings)
+        self.offsets = get_offsets(strings)
+
+    @classmethod
+    def from_raw(cls, blob):
+        """
+        Same strings as blob.split(b"\\x00").
+        """
+        table = cls.__new__(cls)
+        table.blob = bytes(blob)
+        table._offsets = None
+
+        return table
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._offsets = find_offsets(self.blob)
+
+        return self._offsets
+
+    @offsets.setter
+    def offsets(self, offsets):
+        self._offsets = offsets
+
+    def __len__(self):
+        if self._offsets is None:
+            return self.blob.count(b"\x00") + 1
+
+        return len(self._offsets)
+
+    def end(self, index):
+        """
+        Returns the offset right after the string at index, where its null byte is.
+        """
+        if index == len(self.offsets) - 1:
+            return len(self.blob)
+
+        return self.offsets[index + 1] - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StringTable([self[i] for i in range(*index.indices(len(self)))])
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string table index out of range")
+
+        return self.blob[self.offsets[index] : self.end(index)]
+
+    def __setitem__(self, index, string):
+        if isinstance(index, slice):
+            strings = list(self)
+            strings[index] = string
+            self.__init__(strings)
+            return
+
+        if index < 0:
+            index += len(self)
+        self.blob, self.offsets = self.patched({index: string}).as_parts()
+
+    def __delitem__(self, index):
+        strings = list(self)
+        del strings[index]
+        self.__init__(strings)
+
+    def insert(self, index, string):
+        strings = list(self)
+        strings.insert(index, string)
+        self.__init__(strings)
+
+    def __iter__(self):
+        return iter(self.blob.split(b"\x00")) if len(self) else iter(())
+
+    def __eq__(self, other):
+        if isinstance(other, StringTable):
+            return self.blob == other.blob and len(self) == len(other)
+
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"StringTable({list(self)!r})"
+
+    def as_parts(self):
+        return self.blob, self.offsets
+
+    def copy(self):
+        return StringTable(self)
+
+    def decode(self, index, errors="strict"):
+        return self[index].decode("utf-8", errors)
+
+    def index_to_offset(self, index):
+        """
+        Same as dso.string_index_to_offset: the last string gets the offset of its terminating null byte.
+        """
+        if index == len(self.offsets) - 1:
+            return len(self.blob) - 1
+
+        return self.offsets[index]
+
+    def offset_to_index(self, offset):
+        """
+        Same as dso.offset_to_string_index: offsets inside a string map to its index.
+        """
+        if offset == len(self.blob) - 1:
+            return len(self.offsets) - 1
+
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def patched(self, patches):
+        """
+        Returns a new table with {index: bytes} patches applied. Runs of unchanged strings are copied as slices
+        of the blob, so the cost depends on the table size in bytes, not on the number of strings.
+        """
+        blob_parts = []
+        offsets = array(self.offsets.typecode)
+        previous = 0
+        shift = 0
+        for index in sorted(patches):
+            if not 0 <= index < len(self):
+                raise IndexError("string table index out of range")
+
+            start = self.offsets[index]
+            blob_parts.append(self.blob[self.offsets[previous] : start] if index > previous else b"")
+            offsets.extend(shift_offsets(self.offsets[previous:index], shift))
+
+            string = patches[index]
+            blob_parts.append(string + b"\x00" if index < len(self) - 1 else string)
+            offsets.append(start + shift)
+            shift += len(string) - (self.end(index) - start)
+            previous = index + 1
+
+        if previous < len(self):
+            blob_parts.append(self.blob[self.offsets[previous] :])
+            offsets.extend(shift_offsets(self.offsets[previous:], shift))
+
+        table = StringTable.__new__(StringTable)
+        table.blob = b"".join(blob_parts)
+        table.offsets = offsets
+
+        return table
+
+
+def get_offsets(strings):
+    return array("I", accumulate((len(string) + 1 for string in strings[:-1]), initial=0) if strings else ())
+
+
+def find_offsets(blob):
+    """
+    Same as get_offsets(blob.split(b"\\x00")), without slicing out the strings.
+    """
+    offsets = array("I", (0,))
+    offsets.extend(match.end() for match in NULL.finditer(blob))
+
+    return offsets
+
+
+def shift_offsets(offsets, shift):
+    if not shift:
+        return offsets
+
+    return array(offsets.typecode, (offset + shift for offset in offsets))
@@ -0,0 +1,128 @@
+import random
+
+from dso_tools.code import Code
+from dso_tools.dso import DSO, SUPPORTED_DSO_VERSIONS, get_string_offsets
+from dso_tools.opcodes import OPCODES
+
+STRING_OPS = [OPCODES.index(op) for op in ("OP_TAG_TO_STR", "OP_LOADIMMED_STR", "OP_DOCBLOCK_STR", "OP_ASSERT")]
+IDENT_OPS = [OPCODES.index(op) for op in ("OP_LOADIMMED_IDENT", "OP_SETCURFIELD", "OP_SETCURVAR")]
+UINT_OPS = [OPCODES.index(op) for op in ("OP_LOADIMMED_UINT", "OP_LOADIMMED_FLT")]
+JUMP_OPS = [OPCODES.index(op) for op in ("OP_JMP", "OP_JMPIF", "OP_JMPIFNOT", "OP_JMPIFF")]
+PLAIN_OPS = [
+    OPCODES.index(op)
+    for op in ("OP_ADD", "OP_SUB", "OP_CMPEQ", "OP_STR_TO_UINT", "OP_PUSH", "OP_PUSH_FRAME", "OP_RETURN_VOID")
+]
+FUNC_DECL = OPCODES.index("OP_FUNC_DECL")
+RETURN_VOID = OPCODES.index("OP_RETURN_VOID")
+FUNCTION_DENSITY = 0.005
+MAX_BODY_SIZE = 200
+WORDS = [b"gui", b"profile", b"position", b"extent", b"1024 768", b"GuiControl", b"visible", b"text", b"$pref"]
+
+
+def generate_strings(rng, count):
+    strings = [b""]
+    for i in range(1, count - 1):
+        strings.append(b" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + b"_%d" % i)
+    strings.append(b"")
+
+    return strings[:count]
+
+
+def append_function_declaration(rng, code, offsets, fixups):
+    """
+    Appends OP_FUNC_DECL with its name and argument names fixed up through string_references and returns the ip
+    of its end ip operand, which is set once the body is generated.
+    """
+    start = len(code)
+    argument_count = rng.randrange(4)
+    for ip in (start + 1, *range(start + 7, start + 7 + argument_count)):
+        fixups.setdefault(rng.choice(offsets), []).append(ip)
+
+    # name, namespace, package, has body flag, end ip, argument count and argument names
+    code.values.extend((FUNC_DECL, 0, 0, 0, 1, 0, argument_count, *[0] * argument_count))
+    code.widths.extend(b"\x01" * (7 + argument_count))
+
+    return start + 5
+
+
+def generate_dso(
+    strings_count=1000,
+    function_strings_count=None,
+    instruction_count=10000,
+    reference_density=0.1,
+    floats_count=100,
+    line_break_pair_count=None,
+    seed=0,
+):
+    """
+    Generates a valid dso of a given size. Code is a mix of opcodes that consume global string offsets,
+    identifiers fixed up through string_references (roughly reference_density of all instructions),
+    jumps, immediates (some of which need escaped u32s) and operand-less opcodes. Some of it is wrapped in
+    function declarations, whose string operands point into function_strings.
+    """
+    rng = random.Random(seed)
+    if function_strings_count is None:
+        function_strings_count = max(2, strings_count // 4)
+    if line_break_pair_count is None:
+        line_break_pair_count = instruction_count // 20
+
+    dso = DSO()
+    dso.protocol_version = SUPPORTED_DSO_VERSIONS[0]
+    dso.global_strings = generate_strings(rng, max(2, strings_count))
+    dso.function_strings = generate_strings(rng, function_strings_count)
+    dso.global_floats = [rng.uniform(-1e6, 1e6) for _ in range(floats_count)]
+    dso.function_floats = [rng.uniform(-1e3, 1e3) for _ in range(floats_count // 2)]
+
+    offsets = get_string_offsets(dso.global_strings)[:-1]
+    function_offsets = get_string_offsets(dso.function_strings)[:-1]
+    code = Code()
+    fixups = {}
+    end_ip_operand = body_end = None
+    while len(code) < instruction_count - 1:
+        if end_ip_operand is not None and len(code) >= body_end:
+            code.values.append(RETURN_VOID)
+            code.widths.append(1)
+            code.values[end_ip_operand] = len(code)
+            code.widths[end_ip_operand] = 1 if len(code) < 0xFF else 4
+            end_ip_operand = None
+            continue
+        if end_ip_operand is None and len(code) + 2 * MAX_BODY_SIZE < instruction_count:
+            if rng.random() < FUNCTION_DENSITY:
+                end_ip_operand = append_function_declaration(rng, code, offsets, fixups)
+                body_end = len(code) + rng.randint(4, MAX_BODY_SIZE)
+                continue
+
+        kind = rng.random()
+        if kind < reference_density:
+            op = rng.choice(IDENT_OPS)
+            fixups.setdefault(rng.choice(offsets), []).append(len(code) + 1)
+            operand = 0  # fixed up when loaded by the engine
+        elif kind < reference_density + 0.2:
+            op, operand = rng.choice(STRING_OPS), rng.choice(offsets if end_ip_operand is None else function_offsets)
+        elif kind < reference_density + 0.35:
+            op, operand = rng.choice(UINT_OPS), rng.choice((rng.randrange(0xFF), rng.getrandbits(32)))
+        elif kind < reference_density + 0.45:
+            op, operand = rng.choice(JUMP_OPS), rng.randrange(instruction_count)
+        else:
+            code.values.append(rng.choice(PLAIN_OPS))
+            code.widths.append(1)
+            continue
+
+        code.values.append(op)
+        code.widths.append(1)
+        code.values.append(operand)
+        code.widths.append(1 if operand < 0xFF else 4)
+
+    while len(code) < instruction_count:
+        code.values.append(OPCODES.index("OP_RETURN_VOID"))
+        code.widths.append(1)
+
+    for _ in range(line_break_pair_count):
+        code.values.extend((rng.randrange(1, 10000), rng.randrange(instruction_count)))
+        code.widths.extend((4, 4))
+
+    dso.code = code
+    dso.line_break_count = 2 * line_break_pair_count
+    dso.string_references = sorted(fixups.items())
+
+    return dso
@@ -0,0 +1,184 @@
+import os
+import time
+from contextlib import contextmanager
+
+# callables taking (phase, seconds, bytes, count) called after every phase, see add_hook
+hooks = []
+
+# profiler of a pool worker process, kept for all the jobs it runs, see worker_profiled
+worker_profiler = None
+
+
+def add_hook(hook):
+    """
+    Registers a callable that gets (phase, seconds, bytes, count) of every finished phase of parsing, patching
+    and encoding. bytes and count are None when a phase doesn't know them.
+    """
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+
+class Phase:
+    """
+    Times a block of library code and reports it to hooks. bytes can be set explicitly or are measured as
+    the distance a stream (anything with offset or tell()) has been read.
+    """
+
+    __slots__ = ("name", "stream", "bytes", "count", "start", "start_position")
+
+    def __init__(self, name, stream=None):
+        self.name = name
+        self.stream = stream
+        self.bytes = None
+        self.count = None
+        self.start = None  # stays None for phases entered without hooks, which aren't timed
+
+    def __enter__(self):
+        if hooks:
+            self.start_position = stream_position(self.stream)
+            self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not hooks or self.start is None or exc_type is not None:
+            return
+
+        seconds = time.perf_counter() - self.start
+        if self.bytes is None and self.start_position is not None:
+            self.bytes = stream_position(self.stream) - self.start_position
+
+        for hook in list(hooks):
+            hook(self.name, seconds, self.bytes, self.count)
+
+
+def stream_position(stream):
+    if stream is None:
+        return None
+    if hasattr(stream, "offset"):
+        return stream.offset
+
+    try:
+        return stream.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+class Timings:
+    """
+    Hook that sums up calls, wall time, bytes and counts per phase. Used as a context manager it's registered
+    for the duration of the block.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    def __call__(self, phase, seconds, bytes, count):
+        self.add(phase, 1, seconds, bytes, count)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_hook(self)
+
+    def add(self, phase, calls, seconds, bytes, count):
+        total_calls, total_seconds, total_bytes, total_count = self.phases.get(phase, (0, 0.0, None, None))
+        self.phases[phase] = (
+            total_calls + calls,
+            total_seconds + seconds,
+            add_known(total_bytes, bytes),
+            add_known(total_count, count),
+        )
+
+    def update(self, other):
+        for phase, totals in other.phases.items():
+            self.add(phase, *totals)
+
+    def format(self):
+        lines = [f"{'phase':<28}{'calls':>7}{'seconds':>11}{'bytes':>12}{'count':>10}"]
+        for phase, (calls, seconds, bytes, count) in self.phases.items():
+            bytes = "-" if bytes is None else bytes
+            count = "-" if count is None else count
+            lines.append(f"{phase:<28}{calls:>7}{seconds:>11.6f}{bytes:>12}{count:>10}")
+
+        return "\n".join(lines)
+
+
+def add_known(total, value):
+    if value is None:
+        return total
+
+    return (total or 0) + value
+
+
+@contextmanager
+def instrumented(timings=None, profile=None):
+    """
+    Collects phases into timings (a Timings) and cProfile stats into a profile file, if given.
+    """
+    profiler = None
+    if profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    if timings is not None:
+        add_hook(timings)
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        if timings is not None:
+            remove_hook(timings)
+
+
+@contextmanager
+def worker_profiled(profile_dir):
+    """
+    Profiles a job run in a pool worker, if profile_dir is given. Every worker process collects all of its jobs
+    into one stats file of its own in profile_dir, see merged_profiles.
+    """
+    global worker_profiler
+    if profile_dir is None:
+        yield
+        return
+
+    if worker_profiler is None:
+        import cProfile
+
+        worker_profiler = cProfile.Profile()
+    worker_profiler.enable()
+    try:
+        yield
+    finally:
+        worker_profiler.disable()
+        worker_profiler.dump_stats(os.path.join(profile_dir, f"{os.getpid()}.prof"))
+
+
+@contextmanager
+def merged_profiles(profile):
+    """
+    Yields a temporary directory for the stats files of worker_profiled and merges them into the profile file
+    at the end of the block. Yields None if profile isn't given.
+    """
+    if not profile:
+        yield None
+        return
+
+    import pstats
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as profile_dir:
+        yield profile_dir
+        paths = [os.path.join(profile_dir, name) for name in sorted(os.listdir(profile_dir))]
+        if paths:
+            pstats.Stats(*paths).dump_stats(profile)
@@ -0,0 +1,70 @@
+"""
+NumPy versions of the hot loops of patching. NumPy is optional (pip install dso-tools[numpy]) and only used with
+use_numpy=True; both versions give identical results.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def available():
+    return numpy is not None
+
+
+def find_string_operands(code, string_opcodes):
+    """
+    Same as dso.find_string_operands: ips following single byte string opcodes, grouped by their values.
+    """
+    values = numpy.frombuffer(code.values, dtype=numpy.uint32)
+    widths = numpy.frombuffer(code.widths, dtype=numpy.uint8)
+
+    opcodes = numpy.fromiter(sorted(string_opcodes), dtype=numpy.uint32)
+    is_string_opcode = (widths[:-1] == 1) & numpy.isin(values[:-1], opcodes)
+    ips = numpy.flatnonzero(is_string_opcode) + 1
+    operands = values[ips]
+
+    order = numpy.argsort(operands, kind="stable")
+    offsets, starts = numpy.unique(operands[order], return_index=True)
+    ends = numpy.append(starts[1:], len(ips))
+    grouped_ips = ips[order]
+
+    # keys in order of their first occurrence, like the pure-Python scan
+    by_first_ip = numpy.argsort(grouped_ips[starts])
+    grouped_ips = grouped_ips.tolist()
+
+    return {
+        offset: grouped_ips[start:end]
+        for offset, start, end in zip(
+            offsets[by_first_ip].tolist(), starts[by_first_ip].tolist(), ends[by_first_ip].tolist()
+        )
+    }
+
+
+def remap_offsets(offsets, offset_map):
+    """
+    Same as [offset_map[offset] for offset in offsets], with one searchsorted over the old offsets.
+    """
+    if not offset_map.old_offsets or not offset_map.new_offsets:  # empty tables, nothing to search
+        return [offset_map[offset] for offset in offsets]
+
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    old_offsets = numpy.asarray(offset_map.old_offsets, dtype=numpy.int64)
+    new_offsets = numpy.asarray(offset_map.new_offsets, dtype=numpy.int64)
+
+    indices = numpy.searchsorted(old_offsets, offsets, side="right") - 1
+    indices[offsets == offset_map.old_last_offset] = len(old_offsets) - 1
+    new = new_offsets[indices]
+    new[indices == len(new_offsets) - 1] = offset_map.new_last_offset
+
+    return new.tolist()
+
+
+def write_operands(code, ips, new_values, width):
+    values = numpy.frombuffer(code.values, dtype=numpy.uint32)
+    widths = numpy.frombuffer(code.widths, dtype=numpy.uint8)
+    ips = numpy.asarray(ips, dtype=numpy.intp)
+
+    values[ips] = new_values
+    widths[ips] = width
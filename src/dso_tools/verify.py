@@ -0,0 +1,169 @@
+import argparse
+import hashlib
+import mmap
+import sys
+
+from dso_tools.batch import collect_files, map_in_pool
+from dso_tools.dso import DSO, get_raw_string_table, get_string_offsets, map_file, string_index_to_offset
+
+# operands and ips listed per problem, the rest is only counted
+MAX_LISTED = 5
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog="dso verify",
+        allow_abbrev=False,
+        description="Checks that dso files encode back to the same bytes and that string operands, string "
+        "references and line breaks are consistent.",
+    )
+    parser.add_argument("paths", nargs="+", help="Dso files, directories to search for *.dso files or glob patterns")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)"
+    )
+
+    return parser.parse_args(args)
+
+
+class HashWriter:
+    """
+    Write-only stream that keeps just a digest and the size of what was written, for DSO.encode_to.
+    """
+
+    def __init__(self):
+        self.hash = hashlib.blake2b(digest_size=32)
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+
+        return len(data)
+
+    def digest(self):
+        return self.size, self.hash.digest()
+
+
+def buffer_digest(buffer):
+    return len(buffer), hashlib.blake2b(buffer, digest_size=32).digest()
+
+
+def path_digest(path, chunk_size=1024 * 1024):
+    writer = HashWriter()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            writer.write(chunk)
+
+    return writer.digest()
+
+
+def encoded_digest(dso):
+    writer = HashWriter()
+    dso.encode_to(writer)
+
+    return writer.digest()
+
+
+def check_round_trip(dso, original):
+    """
+    Compares size and digest of the encoded dso with (size, digest) of the original file, without holding
+    the encoded dso in memory.
+    """
+    size, digest = encoded_digest(dso)
+    original_size, original_digest = original
+    if size != original_size:
+        return [f"encodes to {size} bytes instead of {original_size}"]
+    if digest != original_digest:
+        return ["encodes to different bytes of the same size"]
+
+    return []
+
+
+def check_invariants(dso):
+    """
+    Returns descriptions of structural problems: string references that don't point at the start of a global
+    string or refer to ips outside of code, string operands past the end of their string table and line breaks
+    that don't fit the code.
+    """
+    problems = []
+    instruction_count = len(dso.code) - dso.line_break_count
+    if dso.line_break_count % 2 or not 0 <= dso.line_break_count <= len(dso.code):
+        problems.append(f"{dso.line_break_count} line break words don't fit {len(dso.code)} code words in pairs")
+
+    starts = set(get_string_offsets(dso.global_strings)[:-1])
+    if dso.global_strings:
+        starts.add(string_index_to_offset(len(dso.global_strings) - 1, dso.global_strings))
+    for offset, ips in dso.string_references:
+        if offset not in starts:
+            problems.append(f"string reference offset {offset} is not at the start of a global string")
+        outside = [ip for ip in ips if ip >= instruction_count]
+        if outside:
+            problems.append(f"string reference offset {offset} refers to ips past the end of code: {listed(outside)}")
+
+    global_operands, function_operands = dso.get_string_operand_indexes()
+    for section, operands in (("global_strings", global_operands), ("function_strings", function_operands)):
+        size = len(get_raw_string_table(getattr(dso, section)))
+        for offset in sorted(operands):
+            if offset >= size:
+                problems.append(
+                    f"string operands at ips {listed(operands[offset])} point past the end of {section} "
+                    f"(offset {offset}, size {size})"
+                )
+
+    return problems
+
+
+def listed(values):
+    text = ", ".join(map(str, values[:MAX_LISTED]))
+    if len(values) > MAX_LISTED:
+        text += f" and {len(values) - MAX_LISTED} more"
+
+    return text
+
+
+def verify_buffer(buffer):
+    dso = DSO.from_buffer(buffer)
+    return check_round_trip(dso, buffer_digest(buffer)) + check_invariants(dso)
+
+
+def verify_file(path):
+    """
+    Returns (path, problems). Files that can't be read or parsed have the error as their only problem.
+    """
+    try:
+        buffer = map_file(path)
+        try:
+            problems = verify_buffer(buffer)
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+    except Exception as e:
+        problems = [f"{type(e).__name__}: {e}"]
+
+    return path, problems
+
+
+def verify_files(paths, workers=None):
+    """
+    Verifies files on a process pool and returns (path, problems) pairs in the order of paths.
+    """
+    return list(map_in_pool(verify_file, paths, workers=workers))
+
+
+def main(args):
+    parsed_args = parse_args(args)
+
+    failed = 0
+    results = verify_files(collect_files(parsed_args.paths), parsed_args.workers)
+    for path, problems in results:
+        if not problems:
+            print(f"ok {path}")
+            continue
+
+        failed += 1
+        for problem in problems:
+            print(f"failed {path}: {problem}", file=sys.stderr)
+
+    print(f"{len(results) - failed} ok, {failed} failed")
+
+    return 1 if failed else 0
@@ -0,0 +1,39 @@
+import copy
+
+import pytest
+
+from dso_tools.dso import DSO
+
+
+@pytest.fixture
+def make_dso():
+    """
+    Factory of dsos with the given sections, e.g. make_dso(global_strings=[b"", b"foo", b""]). Sections that aren't
+    given stay empty. Values are copied, so every dso can be changed on its own.
+    """
+
+    def make(**sections):
+        dso = DSO()
+        for name, value in sections.items():
+            setattr(dso, name, copy.deepcopy(value))
+
+        return dso
+
+    return make
+
+
+@pytest.fixture
+def write_dso(make_dso):
+    """
+    Writes dso, or one made from the given sections, to path, creating its directory, and returns path.
+    """
+
+    def write(path, dso=None, **sections):
+        if dso is None:
+            dso = make_dso(**sections)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(dso.encode())
+
+        return path
+
+    return write
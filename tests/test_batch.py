@@ -0,0 +1,204 @@
+import functools
+import json
+import pstats
+import subprocess
+
+import pytest
+
+from dso_tools import dso as dso_module
+from dso_tools.batch import collect_files, find_patch, load_mapping, patch_file, patch_files, parse_args
+from dso_tools.dso import DSO, LazyDSO
+
+
+@pytest.fixture
+def write_dso(write_dso):
+    return functools.partial(
+        write_dso,
+        code=[
+            b"\x46",  # OP_LOADIMMED_STR
+            b"\x01",  # offset for the second string
+        ],
+        string_references=[(1, [1])],
+    )
+
+
+def read_global_strings(path):
+    return DSO.from_file(path).global_strings
+
+
+def test_argument_parser():
+    parsed = parse_args(["--mapping", "mapping.json", "a.dso", "ui"])
+    assert parsed.mapping == "mapping.json"
+    assert parsed.paths == ["a.dso", "ui"]
+    assert parsed.workers is None
+
+    parsed = parse_args(["--mapping", "mapping.json", "--workers", "3", "a.dso"])
+    assert parsed.workers == 3
+
+
+def test_collect_files(tmp_path):
+    for name in ("ui/a.gui.dso", "ui/nested/b.cs.dso", "ui/readme.txt", "c.dso"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+
+    files = collect_files(
+        [(tmp_path / "ui").as_posix(), (tmp_path / "*.dso").as_posix(), (tmp_path / "c.dso").as_posix()]
+    )
+
+    assert files == [
+        (tmp_path / "ui/a.gui.dso").as_posix(),
+        (tmp_path / "ui/nested/b.cs.dso").as_posix(),
+        (tmp_path / "c.dso").as_posix(),
+    ]
+
+
+def test_load_mapping_and_find_patch(tmp_path):
+    (tmp_path / "patches").mkdir()
+    (tmp_path / "patches/gui.json").write_text(json.dumps({"1": "gui"}))
+    (tmp_path / "patches/other.json").write_text(json.dumps({"1": "other"}))
+    mapping_file = tmp_path / "mapping.json"
+    mapping_file.write_text(json.dumps({"*.gui.dso": "patches/gui.json", "*/b.cs.dso": "patches/other.json"}))
+
+    mapping = load_mapping(mapping_file.as_posix())
+
+    assert find_patch("ui/a.gui.dso", mapping) == {1: b"gui"}
+    assert find_patch("ui/b.cs.dso", mapping) == {1: b"other"}
+    assert find_patch("ui/c.cs.dso", mapping) is None
+
+
+def test_patch_files(tmp_path, write_dso):
+    write_dso(tmp_path / "a.dso", global_strings=[b"", b"first", b""])
+    write_dso(tmp_path / "b.dso", global_strings=[b"", b"second", b""])
+    (tmp_path / "broken.dso").write_bytes(b"\x2b\x00\x00\x00")
+    jobs = [
+        ((tmp_path / "a.dso").as_posix(), {"1": "foo"}),
+        ((tmp_path / "b.dso").as_posix(), {"1": "bar"}),
+        ((tmp_path / "broken.dso").as_posix(), {"1": "baz"}),
+    ]
+
+    results = patch_files(jobs, workers=2)
+
+    assert [path for path, _ in results] == [path for path, _ in jobs]
+    assert results[0][1] is None
+    assert results[1][1] is None
+    assert results[2][1] is not None
+    assert read_global_strings(tmp_path / "a.dso") == [b"", b"foo", b""]
+    assert read_global_strings(tmp_path / "b.dso") == [b"", b"bar", b""]
+
+
+def test_batch_command(tmp_path, write_dso):
+    write_dso(tmp_path / "ui/a.gui.dso", global_strings=[b"", b"first", b""])
+    write_dso(tmp_path / "ui/b.cs.dso", global_strings=[b"", b"second", b""])
+    write_dso(tmp_path / "ui/c.cs.dso", global_strings=[b"", b"third", b""])
+    (tmp_path / "gui.json").write_text(json.dumps({"1": "foo"}))
+    (tmp_path / "cs.json").write_text(json.dumps({"1": "bar"}))
+    mapping_file = tmp_path / "mapping.json"
+    mapping_file.write_text(json.dumps({"*/a.gui.dso": "gui.json", "*/b.cs.dso": "cs.json"}))
+
+    result = subprocess.run(
+        ["dso", "batch", "--mapping", mapping_file.as_posix(), "--workers", "2", (tmp_path / "ui").as_posix()],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0
+    assert result.stdout.splitlines()[-1] == "2 patched, 0 failed"
+    assert read_global_strings(tmp_path / "ui/a.gui.dso") == [b"", b"foo", b""]
+    assert read_global_strings(tmp_path / "ui/b.cs.dso") == [b"", b"bar", b""]
+    assert read_global_strings(tmp_path / "ui/c.cs.dso") == [b"", b"third", b""]
+
+
+def test_batch_timings(tmp_path, write_dso):
+    write_dso(tmp_path / "a.dso", global_strings=[b"", b"first", b""])
+    patch_file = tmp_path / "patch.json"
+    patch_file.write_text(json.dumps({"1": "patched"}))
+    mapping_file = tmp_path / "mapping.json"
+    mapping_file.write_text(json.dumps({"*.dso": "patch.json"}))
+
+    result = subprocess.run(
+        ["dso", "batch", "--timings", "--mapping", mapping_file.as_posix(), (tmp_path / "a.dso").as_posix()],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0
+    assert f"{(tmp_path / 'a.dso').as_posix()}:\nphase " in result.stderr
+    assert "all files:\nphase " in result.stderr
+    assert "patch remap" in result.stderr
+
+
+def test_batch_profiles_the_workers(tmp_path, write_dso):
+    for name in ("a.dso", "b.dso"):
+        write_dso(tmp_path / name, global_strings=[b"", b"first", b""])
+    (tmp_path / "patch.json").write_text(json.dumps({"1": "patched"}))
+    mapping_file = tmp_path / "mapping.json"
+    mapping_file.write_text(json.dumps({"*.dso": "patch.json"}))
+    profile = tmp_path / "profile"
+
+    result = subprocess.run(
+        ["dso", "batch", "--workers", "2", "--profile", profile.as_posix(), "--mapping", mapping_file.as_posix()]
+        + [(tmp_path / name).as_posix() for name in ("a.dso", "b.dso")],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0
+    calls = {function: stats[1] for (_, _, function), stats in pstats.Stats(profile.as_posix()).stats.items()}
+    assert calls["patch_file"] == 2
+
+
+def test_batch_without_matching_files(tmp_path, write_dso):
+    write_dso(tmp_path / "a.dso", global_strings=[b"", b"first", b""])
+    (tmp_path / "patch.json").write_text(json.dumps({"1": "patched"}))
+    mapping_file = tmp_path / "mapping.json"
+    mapping_file.write_text(json.dumps({"*.gui.dso": "patch.json"}))
+
+    result = subprocess.run(
+        ["dso", "batch", "--mapping", mapping_file.as_posix(), tmp_path.as_posix()], capture_output=True, text=True
+    )
+
+    assert result.returncode == 1
+    assert "no files matched" in result.stderr
+    assert read_global_strings(tmp_path / "a.dso") == [b"", b"first", b""]
+
+
+def test_patch_file_closes_mapping_before_writing(tmp_path, monkeypatch, write_dso):
+    write_dso(tmp_path / "a.dso", global_strings=[b"", b"first", b""])
+    events = []
+    close = LazyDSO.close
+    write_atomically = dso_module.write_atomically
+    monkeypatch.setattr(LazyDSO, "close", lambda dso: events.append("close") or close(dso))
+    monkeypatch.setattr(
+        dso_module, "write_atomically", lambda path, write: events.append("write") or write_atomically(path, write)
+    )
+
+    patch_file(tmp_path / "a.dso", {1: b"patched"})
+
+    assert events == ["close", "write", "close"]  # closing again after writing is harmless
+    assert read_global_strings(tmp_path / "a.dso") == [b"", b"patched", b""]
+
+
+def test_batch_with_malformed_mapping(tmp_path, write_dso):
+    write_dso(tmp_path / "a.dso", global_strings=[b"", b"first", b""])
+    (tmp_path / "a.json").write_text(json.dumps({"1": "foo"}))
+    (tmp_path / "b.json").write_text(json.dumps({"1": "bar"}))
+    (tmp_path / "conflict.json").write_text(json.dumps(["a.json", "b.json"]))
+    (tmp_path / "invalid.json").write_text("{")
+
+    for mapping, message in (
+        ({"*.dso": "missing.json"}, "No such file or directory"),
+        ({"*.dso": "invalid.json"}, "invalid.json is not valid JSON"),
+        ({"*.dso": "conflict.json"}, "string 1 is set to"),
+        (["*.dso"], "is not an object mapping patterns to patch files"),
+    ):
+        mapping_file = tmp_path / "mapping.json"
+        mapping_file.write_text(json.dumps(mapping))
+
+        result = subprocess.run(
+            ["dso", "batch", "--mapping", mapping_file.as_posix(), tmp_path.as_posix()], capture_output=True, text=True
+        )
+
+        assert result.returncode == 1
+        assert result.stderr.startswith("dso: ") and message in result.stderr
+        assert "Traceback" not in result.stderr
+    assert read_global_strings(tmp_path / "a.dso") == [b"", b"first", b""]
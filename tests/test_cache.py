@@ -0,0 +1,175 @@
+import os
+import subprocess
+
+import pytest
+
+from dso_tools.cache import DSOCache, decode_cache_entry, encode_cache_entry, NO_DIGEST
+from dso_tools.dso import DSO
+
+
+@pytest.fixture
+def make_dso(make_dso):
+    def make():
+        dso = make_dso(
+            global_strings=[b"", b"second", b"third", b""],
+            function_strings=[b"", b"foo", b""],
+            global_floats=[1.5],
+            function_floats=[42.1],
+            code=[b"\x46", b"\x01", b"\x01\x23\x45\x67", b"\x89\xab\xcd\xef"],
+            line_break_count=2,
+            string_references=[(1, [3, 4])],
+        )
+
+        return DSO.from_buffer(dso.encode())
+
+    return make
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("dso was parsed")
+
+
+def assert_same_dso(a, b):
+    assert a.encode() == b.encode()
+    assert a.code.widths == b.code.widths
+
+
+def test_cache_entry_round_trip(make_dso):
+    dso = make_dso()
+    key = (123, 456, NO_DIGEST)
+
+    decoded = decode_cache_entry(encode_cache_entry(dso, key), key)
+
+    assert_same_dso(decoded, dso)
+    assert decoded.protocol_version == 43
+    assert decode_cache_entry(encode_cache_entry(dso, key), (124, 456, NO_DIGEST)) is None
+    assert decode_cache_entry(encode_cache_entry(dso, key), (123, 457, NO_DIGEST)) is None
+    assert decode_cache_entry(b"junk", key) is None
+
+
+def test_memory_cache(tmp_path, monkeypatch, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    cache = DSOCache()
+
+    expected = make_dso()
+
+    first = cache.load(dso_file)
+    first.patch_global_strings({1: "foo"})
+    monkeypatch.setattr(DSO, "from_file", fail)
+    monkeypatch.setattr(DSO, "from_buffer", fail)
+    second = cache.load(dso_file)
+
+    assert_same_dso(second, expected)
+
+
+def test_memory_cache_eviction(tmp_path, make_dso, write_dso):
+    cache = DSOCache(max_entries=2)
+    for name in ("a.dso", "b.dso", "c.dso"):
+        write_dso(tmp_path / name, make_dso())
+        cache.load(tmp_path / name)
+
+    assert [os.path.basename(path) for path in cache.memory] == ["b.dso", "c.dso"]
+
+
+def test_disk_cache(tmp_path, monkeypatch, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    DSOCache(tmp_path / "cache").load(dso_file)
+    expected = make_dso()
+
+    monkeypatch.setattr(DSO, "from_file", fail)
+    monkeypatch.setattr(DSO, "from_buffer", fail)
+
+    assert_same_dso(DSOCache(tmp_path / "cache").load(dso_file), expected)
+
+
+def test_cache_invalidation(tmp_path, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    cache = DSOCache(tmp_path / "cache")
+    cache.load(dso_file)
+
+    patched = make_dso()
+    patched.patch_global_strings({1: "a much longer string"})
+    write_dso(dso_file, patched)
+
+    assert_same_dso(cache.load(dso_file), patched)
+    assert_same_dso(DSOCache(tmp_path / "cache").load(dso_file), patched)
+
+
+def test_cache_hash_verification(tmp_path, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    DSOCache(tmp_path / "cache", verify_hash=True).load(dso_file)
+    stat = os.stat(dso_file)
+
+    patched = make_dso()
+    patched.global_strings = [b"", b"SECOND", b"third", b""]
+    write_dso(dso_file, patched)
+    os.utime(dso_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert DSOCache(tmp_path / "cache").load(dso_file).global_strings == make_dso().global_strings
+    assert DSOCache(tmp_path / "cache", verify_hash=True).load(dso_file).global_strings == patched.global_strings
+
+
+def test_disk_cache_eviction(tmp_path, make_dso, write_dso):
+    entry_size = len(encode_cache_entry(make_dso(), (0, 0, NO_DIGEST)))
+    cache = DSOCache(tmp_path / "cache", max_disk_bytes=entry_size * 5 // 2)
+    for i, name in enumerate(("a.dso", "b.dso", "c.dso")):
+        write_dso(tmp_path / name, make_dso())
+        cache.load(tmp_path / name)
+        os.utime(cache.entry_path(tmp_path / name), ns=(i, i))
+
+    cache.store(tmp_path / "a.dso", make_dso())
+
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted(
+        os.path.basename(cache.entry_path(tmp_path / name)) for name in ("a.dso", "c.dso")
+    )
+
+
+def test_corrupted_disk_cache_entry(tmp_path, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    cache = DSOCache(tmp_path / "cache")
+    cache.load(dso_file)
+    entry_path = cache.entry_path(dso_file)
+    with open(entry_path, "r+b") as f:
+        f.truncate(os.path.getsize(entry_path) - 5)
+
+    assert_same_dso(DSOCache(tmp_path / "cache").load(dso_file), make_dso())
+
+
+def test_cli_uses_cache(tmp_path, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    patch_file = tmp_path / "patch.json"
+    patch_file.write_text('{"1": "foo"}')
+    cache_dir = tmp_path / "cache"
+
+    subprocess.check_call(
+        ["dso", "--cache-dir", cache_dir.as_posix(), "--patch-string-table", patch_file.as_posix(), dso_file.as_posix()]
+    )
+    result = subprocess.check_output(
+        ["dso", "--cache-dir", cache_dir.as_posix(), "--dump-string-table", dso_file.as_posix()], text=True
+    )
+
+    assert len(os.listdir(cache_dir)) == 1
+    assert '"1": "foo"' in result
+
+
+def test_cli_verify_hash(tmp_path, make_dso, write_dso):
+    dso_file = tmp_path / "a.dso"
+    write_dso(dso_file, make_dso())
+    cache_dir = tmp_path / "cache"
+    subprocess.check_call(["dso", "--cache-dir", cache_dir.as_posix(), "--dump-string-table", dso_file.as_posix()])
+    stat = os.stat(dso_file)
+
+    patched = make_dso()
+    patched.global_strings = [b"", b"SECOND", b"third", b""]
+    write_dso(dso_file, patched)
+    os.utime(dso_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    command = ["dso", "--cache-dir", cache_dir.as_posix(), "--dump-string-table", dso_file.as_posix()]
+    assert '"1": "second"' in subprocess.check_output(command, text=True)
+    assert '"1": "SECOND"' in subprocess.check_output(command + ["--verify-hash"], text=True)
@@ -0,0 +1,69 @@
+import pytest
+
+from dso_tools.code import Code, encode_instruction, decode_instruction
+
+
+def test_encode_instruction():
+    assert encode_instruction(0x2A, 1) == b"\x2a"
+    assert encode_instruction(0x2A, 4) == b"\x2a\x00\x00\x00"
+    assert encode_instruction(0x01020304, 4) == b"\x04\x03\x02\x01"
+
+
+def test_decode_instruction():
+    assert decode_instruction(b"\x2a") == (0x2A, 1)
+    assert decode_instruction(b"\x2a\x00\x00\x00") == (0x2A, 4)
+
+    with pytest.raises(ValueError, match="^provide one or four bytes$"):
+        decode_instruction(b"\x00\x00")
+
+
+def test_code_behaves_like_list_of_instructions():
+    instructions = [b"\x46", b"\x08\x00\x00\x00", b"\x01", b"\x01\x23\x45\x67"]
+    code = Code(instructions)
+
+    assert len(code) == 4
+    assert code == instructions
+    assert list(code) == instructions
+    assert code[0] == b"\x46"
+    assert code[-1] == b"\x01\x23\x45\x67"
+    assert code[1:3] == [b"\x08\x00\x00\x00", b"\x01"]
+    assert list(code.values) == [0x46, 0x08, 0x01, 0x67452301]
+    assert code.widths == bytearray([1, 4, 1, 4])
+
+
+def test_code_modifications():
+    code = Code([b"\x46", b"\x08"])
+
+    code[1] = b"\x0d\x00\x00\x00"
+    code.append(b"\x02")
+    code.insert(0, b"\x00\x00\x00\x00")
+    del code[1]
+
+    assert code == [b"\x00\x00\x00\x00", b"\x0d\x00\x00\x00", b"\x02"]
+
+
+def test_code_copy_is_independent():
+    code = Code([b"\x46", b"\x08"])
+    copy = code.copy()
+    copy[1] = b"\x09"
+
+    assert code == [b"\x46", b"\x08"]
+    assert copy == [b"\x46", b"\x09"]
+    assert Code(code) == code
+
+
+def test_code_is_opcode():
+    code = Code([b"\x00", b"\x5a", b"\x5b", b"\x00\x00\x00\x00"])
+
+    assert code.is_opcode(0) is True
+    assert code.is_opcode(1) is True
+    assert code.is_opcode(2) is False
+    assert code.is_opcode(3) is False
+
+
+def test_code_from_arrays():
+    code = Code([b"\x46", b"\x08\x00\x00\x00"])
+
+    assert Code.from_arrays(code.values, code.widths) == code
+    with pytest.raises(ValueError):
+        Code.from_arrays(code.values, bytearray())
@@ -0,0 +1,67 @@
+import functools
+
+import pytest
+
+from dso_tools.corpus import CorpusFile, DSOCorpus, StringPool
+from dso_tools.synthetic import generate_dso
+
+
+@pytest.fixture
+def write_dso(write_dso):
+    return functools.partial(write_dso, function_strings=[b""], code=[b"\x46", b"\x01"], string_references=[(1, [1])])
+
+
+def test_string_pool():
+    pool = StringPool()
+
+    assert pool.intern(b"a") == 0
+    assert pool.intern(b"b") == 1
+    assert pool.intern(b"a") == 0
+    assert len(pool) == 2
+    assert pool[1] == b"b"
+    assert b"a" in pool
+    assert pool.id_of(b"c") is None
+
+
+def test_corpus_file():
+    pool = StringPool()
+    dso = generate_dso(strings_count=50, instruction_count=500, seed=2)
+
+    corpus_file = CorpusFile("a.dso", pool, dso)
+
+    assert not hasattr(corpus_file, "__dict__")
+    with pytest.raises(AttributeError):
+        corpus_file.extra = 1
+    assert corpus_file.strings() == dso.global_strings
+    assert corpus_file.to_dso().encode() == dso.encode()
+
+    corpus_file.code[0] = b"\x00"
+    assert dso.code[0] != b"\x00"
+
+
+def test_load_corpus(tmp_path, write_dso):
+    write_dso(tmp_path / "ui/a.gui.dso", global_strings=[b"", b"GuiControl", b"1024 768", b""])
+    write_dso(
+        tmp_path / "ui/b.gui.dso",
+        global_strings=[b"", b"GuiControl", b"800 600", b""],
+        function_strings=[b"", b"GuiControl", b""],
+    )
+    (tmp_path / "ui/broken.dso").write_bytes(b"\x00")
+
+    corpus = DSOCorpus.load([(tmp_path / "ui").as_posix()], workers=2)
+
+    a, b = (tmp_path / "ui/a.gui.dso").as_posix(), (tmp_path / "ui/b.gui.dso").as_posix()
+    assert len(corpus) == 2
+    assert list(corpus.errors) == [(tmp_path / "ui/broken.dso").as_posix()]
+    assert sorted(corpus.pool.strings) == [b"", b"1024 768", b"800 600", b"GuiControl"]
+    assert corpus[b].strings("function_strings") == [b"", b"GuiControl", b""]
+    assert corpus[a].global_strings[1] == corpus[b].global_strings[1] == corpus[b].function_strings[1]
+    assert corpus.find("GuiControl") == [
+        (a, "global_strings", 1),
+        (b, "global_strings", 1),
+        (b, "function_strings", 1),
+    ]
+    assert corpus.find(b"GuiControl", section="function_strings") == [(b, "function_strings", 1)]
+    assert corpus.find("missing") == []
+    assert corpus.string_counts() == {b"": 2, b"GuiControl": 2, b"1024 768": 1, b"800 600": 1}
+    assert corpus[a].to_dso().encode() == (tmp_path / "ui/a.gui.dso").read_bytes()
@@ -0,0 +1,133 @@
+import functools
+import subprocess
+
+import pytest
+
+from dso_tools.code import Code
+from dso_tools.diff import Change, diff_code, diff_dsos, diff_files, format_change, parse_args
+from dso_tools.dso import DSO
+
+
+@pytest.fixture
+def make_dso(make_dso):
+    return functools.partial(
+        make_dso,
+        global_strings=[b"", b"second", b"third", b""],
+        function_strings=[b"", b"foo", b""],
+        global_floats=[1.5, 2.0],
+        function_floats=[42.1],
+        code=[b"\x46", b"\x08", b"\x01", b"\x02", b"\x03"],
+        string_references=[(1, [3])],
+    )
+
+
+def test_argument_parser():
+    parsed = parse_args(["a.dso", "b.dso"])
+    assert parsed.dso_file_a == "a.dso"
+    assert parsed.dso_file_b == "b.dso"
+
+
+def test_diff_identical_dsos(make_dso):
+    assert diff_dsos(make_dso(), make_dso()) == []
+
+
+def test_diff_dsos(make_dso):
+    a = make_dso()
+    b = make_dso()
+    b.global_strings = [b"", b"2nd", b"third", b"", b"new"]
+    b.global_floats = [1.5, 2.5]
+    b.code = [b"\x46", b"\x05", b"\x01", b"\x02", b"\x03", b"\x04"]
+    b.string_references = [(1, [3]), (5, [4])]
+
+    assert diff_dsos(a, b) == [
+        Change("global_strings", "modified", 1, b"second", b"2nd"),
+        Change("global_strings", "added", 4, None, b"new"),
+        Change("global_floats", "modified", 1, 2.0, 2.5),
+        Change("code", "modified", (1, 2), [b"\x08"], [b"\x05"]),
+        Change("code", "added", (5, 6), None, [b"\x04"]),
+        Change("string_references", "added", 1, None, (5, [4])),
+    ]
+
+
+def test_diff_code_over_many_chunks():
+    a = Code([b"\x01"] * 5000)
+    b = Code(a)
+    b[10] = b"\x02"
+    b[2047] = b"\x02"
+    b[2048] = b"\x02"
+    b[4999] = b"\x01\x00\x00\x00"
+
+    assert [(change.kind, change.key) for change in diff_code(a, b)] == [
+        ("modified", (10, 11)),
+        ("modified", (2047, 2049)),
+        ("modified", (4999, 5000)),
+    ]
+    assert diff_code(b, Code(b[:4000])) == [Change("code", "removed", (4000, 5000), b[4000:], None)]
+
+
+def test_format_change():
+    assert format_change(Change("global_strings", "modified", 1, b"second", b"2nd")) == (
+        'global_strings[1]: modified "second" -> "2nd"'
+    )
+    assert format_change(Change("function_strings", "removed", 2, b"\xff", None)) == (
+        'function_strings[2]: removed "\\\\xff"'
+    )
+    assert (
+        format_change(Change("global_floats", "modified", 0, 1.5, 1.0))
+        == "global_floats[0]: modified 1.5 -> 1.0 (-0.5)"
+    )
+    assert format_change(Change("code", "modified", (3, 5), Code([b"\x46", b"\x08"]), Code([b"\x46", b"\x0d"]))) == (
+        "code[3:5]: modified [0x46, 0x8] -> [0x46, 0xd]"
+    )
+    assert format_change(Change("code", "modified", (3, 4), Code([b"\x08"]), Code([b"\x08\x00\x00\x00"]))) == (
+        "code[3:4]: modified [0x8] -> [0x8] (encoding only)"
+    )
+    assert format_change(Change("code", "added", (3, 13), None, Code([b"\x08"] * 10))) == (
+        "code[3:13]: added (10 instructions)"
+    )
+    assert format_change(Change("version", "modified", None, 43, 44)) == "version: modified 43 -> 44"
+
+
+def test_diff_files_decodes_only_changed_sections(tmp_path, make_dso):
+    a = make_dso()
+    b = make_dso()
+    b.global_strings = [b"", b"2nd", b"third", b""]
+    (tmp_path / "a.dso").write_bytes(a.encode())
+    (tmp_path / "b.dso").write_bytes(b.encode())
+
+    with DSO.from_file(tmp_path / "a.dso", lazy=True) as lazy_a, DSO.from_file(tmp_path / "b.dso", lazy=True) as lazy_b:
+        assert diff_dsos(lazy_a, lazy_b) == [Change("global_strings", "modified", 1, b"second", b"2nd")]
+        assert "code" not in lazy_a.__dict__
+        assert "global_floats" not in lazy_b.__dict__
+
+    assert diff_files(tmp_path / "a.dso", tmp_path / "a.dso") == []
+
+
+def test_diff_lazy_dsos_changed_in_memory(tmp_path, make_dso):
+    (tmp_path / "a.dso").write_bytes(make_dso().encode())
+
+    with DSO.from_file(tmp_path / "a.dso", lazy=True) as a, DSO.from_file(tmp_path / "a.dso", lazy=True) as b:
+        b.patch_global_strings({1: "changed"})
+
+        assert Change("global_strings", "modified", 1, b"second", b"changed") in diff_dsos(a, b)
+
+
+def test_diff_command(tmp_path, make_dso):
+    a = make_dso()
+    b = make_dso()
+    b.function_floats = [40.0]
+    (tmp_path / "a.dso").write_bytes(a.encode())
+    (tmp_path / "b.dso").write_bytes(b.encode())
+
+    result = subprocess.run(
+        ["dso", "diff", (tmp_path / "a.dso").as_posix(), (tmp_path / "b.dso").as_posix()],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 1
+    assert result.stdout == "function_floats[0]: modified 42.1 -> 40.0 (-2.1)\n"
+
+    result = subprocess.run(["dso", "diff", (tmp_path / "a.dso").as_posix(), (tmp_path / "a.dso").as_posix()])
+
+    assert result.returncode == 0
@@ -1,4 +1,10 @@
+import asyncio
 import io
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import pytest
 from dso_tools.dso import (
@@ -21,8 +27,25 @@ from dso_tools.dso import (
     parse_string_references,
     encode_string_references,
     DSO,
+    SECTIONS,
     normalize_code,
+    get_string_offsets,
+    StringOffsetMap,
+    BufferReader,
+    parse_code_from_buffer,
+    parse_string_references_from_buffer,
+    iter_sections,
+    find_string_operands,
+    scan_string_operands,
+    LazyDSO,
+    find_function_bodies,
+    aload_files,
+    compact_string_table,
+    string_at_offset,
 )
+from dso_tools import dso as dso_module
+from dso_tools.code import Code
+from dso_tools.synthetic import generate_dso
 
 
 def test_get_raw_string_table():
@@ -65,6 +88,26 @@ def test_get_new_string_offset():
     assert get_new_string_offset(13, string_table, new_string_table) == 20
 
 
+def test_get_string_offsets():
+    assert get_string_offsets([]) == []
+    assert get_string_offsets([b""]) == [0]
+    assert get_string_offsets([b"", b"second", b"third", b""]) == [0, 1, 8, 14]
+
+
+def test_string_offset_map():
+    string_table = [b"", b"second", b"third", b""]
+    new_string_table = [b"", b"longer string", b"third", b""]
+
+    offset_map = StringOffsetMap(string_table, new_string_table)
+
+    assert offset_map[0] == 0
+    assert offset_map[1] == 1
+    assert offset_map[8] == 15
+    assert offset_map[13] == 20
+    for offset in range(len(get_raw_string_table(string_table)) + 2):
+        assert offset_map[offset] == get_new_string_offset(offset, string_table, new_string_table)
+
+
 def test_bytes_to_int():
     assert bytes_to_int(b"\x0a") == 10
     assert bytes_to_int(b"\x09\x00\x00\x00") == 9
@@ -192,6 +235,13 @@ def test_parse_float_table():
     assert stream.read() == b"\xab\xcd"
 
 
+def test_parse_truncated_float_table():
+    stream = io.BytesIO(b"\x02\x00\x00\x00" b"\x00\x00\x00\x00\x00\x00\xf8\x3f")
+
+    with pytest.raises(ValueError, match="^unexpected end of float table$"):
+        parse_float_table(stream)
+
+
 def test_encode_float_table():
     assert encode_float_table([]) == b"\x00\x00\x00\x00"
     assert encode_float_table([1.5, 42.1]) == (
@@ -296,6 +346,28 @@ def test_encode_dso():
     )
 
 
+def test_encode_dso_to_stream():
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.function_strings = [b"", b"foo", b""]
+    dso.global_floats = [1.5]
+    dso.function_floats = [42.1]
+    dso.code = [b"\x01\x00\x00\x00", b"\x4a", b"\x01\x23\x45\x67", b"\x89\xab\xcd\xef"]
+    dso.line_break_count = 2
+    dso.string_references = [(1, [3, 4])]
+    stream = io.BytesIO()
+
+    assert dso.encode_to(stream) == len(dso.encode())
+    assert stream.getvalue() == dso.encode()
+
+
+def test_encode_invalid_string_references():
+    with pytest.raises(ValueError):
+        encode_string_references([(-1, [])])
+    with pytest.raises(ValueError):
+        encode_string_references([(0, [int(1e10)])])
+
+
 def test_normalize_code():
     assert normalize_code([]) == []
     assert normalize_code([b"\x2a"]) == [b"\x2a\x00\x00\x00"]
@@ -353,3 +425,510 @@ def test_patch_global_strings():
         ]
     )
     assert dso.string_references == [(1, [13]), (13, [14])]
+
+
+def test_parse_code_from_buffer():
+    stream = io.BytesIO(
+        b"\x02\x00\x00\x00"
+        b"\x01\x00\x00\x00"
+        b"\xff\x01\x00\x00\x00"
+        b"\x4a"
+        b"\x01\x23\x45\x67"
+        b"\x89\xab\xcd\xef"
+        b"\xab\xcd"
+    )
+    reader = BufferReader(stream.getvalue())
+
+    assert parse_code_from_buffer(reader) == parse_code(stream)
+    assert reader.read(2) == b"\xab\xcd"
+
+
+def test_parse_code_from_buffer_matches_parse_code():
+    random.seed(0)
+    encoded = encode_code(
+        [
+            bytes([random.randrange(0xFF)]) if random.random() < 0.7 else random.getrandbits(32).to_bytes(4, "little")
+            for _ in range(2000)
+        ]
+        + [eu32(7)] * 4,
+        4,
+    )
+
+    code, line_break_count = parse_code_from_buffer(BufferReader(encoded))
+
+    assert (code, line_break_count) == parse_code(io.BytesIO(encoded))
+    assert code.values == parse_code(io.BytesIO(encoded))[0].values
+
+
+def test_parse_truncated_code_from_buffer():
+    with pytest.raises(ValueError, match="^unexpected end of code$"):
+        parse_code_from_buffer(BufferReader(b"\x02\x00\x00\x00" b"\x00\x00\x00\x00" b"\x01\xff\x01"))
+    with pytest.raises(ValueError, match="^unexpected end of code$"):
+        parse_code_from_buffer(BufferReader(b"\x01\x00\x00\x00" b"\x01\x00\x00\x00" b"\x01\x00\x00\x00\x00"))
+
+
+def test_parse_string_references_from_buffer():
+    reader = BufferReader(eu32(2) + eu32(0) + eu32(2) + eu32(4) + eu32(42) + eu32(32) + eu32(1) + eu32(7) + b"\xab\xcd")
+
+    assert parse_string_references_from_buffer(reader) == [
+        (0, [4, 42]),
+        (32, [7]),
+    ]
+    assert reader.read(2) == b"\xab\xcd"
+
+
+def test_create_dso_from_buffer_and_file(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.function_strings = [b"", b"foo", b""]
+    dso.global_floats = [1.5]
+    dso.function_floats = [42.1]
+    dso.code = [b"\x01\x00\x00\x00", b"\x4a", b"\xff\x00\x00\x00", b"\x01\x23\x45\x67", b"\x89\xab\xcd\xef"]
+    dso.line_break_count = 2
+    dso.string_references = [(1, [3, 4]), (8, [])]
+    encoded = dso.encode()
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(encoded)
+
+    expected = DSO.from_stream(io.BytesIO(encoded))
+    for parsed in (DSO.from_buffer(encoded), DSO.from_file(dso_file)):
+        assert parsed.protocol_version == expected.protocol_version
+        assert parsed.global_strings == expected.global_strings
+        assert parsed.function_strings == expected.function_strings
+        assert parsed.global_floats == expected.global_floats
+        assert parsed.function_floats == expected.function_floats
+        assert parsed.code == expected.code
+        assert parsed.line_break_count == expected.line_break_count
+        assert parsed.string_references == expected.string_references
+        assert parsed.encode() == encoded
+
+
+def make_test_dso():
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.function_strings = [b"", b"foo", b""]
+    dso.global_floats = [1.5]
+    dso.function_floats = [42.1, 0.5]
+    dso.code = [b"\x46", b"\x01\x00\x00\x00", b"\x4a", b"\x01\x23\x45\x67", b"\x89\xab\xcd\xef"]
+    dso.line_break_count = 2
+    dso.string_references = [(1, [3, 4]), (8, [])]
+
+    return dso
+
+
+def test_iter_sections():
+    encoded = make_test_dso().encode()
+
+    assert list(iter_sections(encoded)) == [
+        ("version", 0, 4, 1),
+        ("global_strings", 4, 22, 4),
+        ("function_strings", 22, 31, 3),
+        ("global_floats", 31, 43, 1),
+        ("function_floats", 43, 63, 2),
+        ("code", 63, 86, 5),
+        ("string_references", 86, 114, 2),
+    ]
+
+
+def test_iter_sections_of_truncated_dso():
+    encoded = make_test_dso().encode()
+
+    for end in (4, 20, 60, 70, 90, 113):
+        with pytest.raises(ValueError):
+            list(iter_sections(encoded[:end]))
+
+
+def test_dsos_have_own_sections():
+    first = DSO()
+    second = DSO()
+    first.global_strings.append(b"foo")
+    first.code.append(b"\x46")
+    first.string_references.append((0, [1]))
+
+    assert second.global_strings == second.code == second.string_references == []
+    assert DSO().encode() == second.encode()
+
+
+def test_lazy_dso(tmp_path):
+    dso = make_test_dso()
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+
+    with DSO.from_file(dso_file, lazy=True) as lazy_dso:
+        assert lazy_dso.protocol_version == 43
+        assert lazy_dso.global_strings == dso.global_strings
+        assert "code" not in lazy_dso.__dict__
+        assert list(lazy_dso.sections) == ["version", "global_strings"]
+
+        assert lazy_dso.line_break_count == 2
+        assert "code" not in lazy_dso.__dict__
+        assert lazy_dso.code == dso.code
+        assert lazy_dso.function_strings == dso.function_strings
+        assert lazy_dso.global_floats == dso.global_floats
+        assert lazy_dso.function_floats == dso.function_floats
+        assert lazy_dso.string_references == dso.string_references
+        assert lazy_dso.encode() == dso.encode()
+
+        lazy_dso.patch_global_strings({1: "foo"})
+        dso.patch_global_strings({1: "foo"})
+        assert lazy_dso.encode() == dso.encode()
+
+
+def test_find_string_operands():
+    code = [
+        b"\x46",  # OP_LOADIMMED_STR
+        b"\x08",  # offset
+        b"\x0d",  # OP_RETURN_VOID
+        b"\x54",  # OP_ASSERT
+        b"\x08\x00\x00\x00",  # offset
+        b"\x45",  # OP_TAG_TO_STR
+        b"\x01",  # offset
+        b"\x43",  # OP_LOADIMMED_UINT
+        b"\x46",  # immediate that looks like OP_LOADIMMED_STR
+        b"\x0d",  # OP_RETURN_VOID
+    ]
+
+    assert find_string_operands(code) == {8: [1, 4], 1: [6]}
+    assert scan_string_operands(code) == {8: [1, 4], 1: [6], 13: [9]}
+
+    # code that doesn't decode falls back to the scan
+    assert find_string_operands(code + [b"\xfe"]) == scan_string_operands(code + [b"\xfe"])
+
+
+def test_patch_global_strings_keeps_index_up_to_date():
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b"fourth", b""]
+    dso.code = [b"\x46", b"\x08", b"\x46", b"\x01", b"\x46", b"\x0e", b"\x47", b"\x0e", b"\x02"]
+    dso.string_references = [(1, [8])]
+
+    dso.patch_global_strings({3: "4th"}, validate=True)
+
+    assert dso.code == [b"\x46", b"\x08", b"\x46", b"\x01", b"\x46", b"\x0e", b"\x47", b"\x0e", b"\x02"]
+    assert dso.get_string_operands() == {8: [1], 1: [3], 14: [5, 7]}
+
+    dso.patch_global_strings({"1": "2nd"}, validate=True)
+
+    assert normalize_code(dso.code) == normalize_code(
+        [b"\x46", b"\x05", b"\x46", b"\x01", b"\x46", b"\x0b", b"\x47", b"\x0b", b"\x02"]
+    )
+    assert dso.code[1] == b"\x05\x00\x00\x00"
+    assert dso.code[3] == b"\x01"
+    assert dso.get_string_operands() == find_string_operands(dso.code)
+    assert dso.string_references == [(1, [8])]
+
+
+def test_patch_global_strings_validation():
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.code = Code([b"\x46", b"\x08", b"\x02", b"\x08"])
+    dso.get_string_operands()
+    dso.code[2] = b"\x46"  # in place modification isn't reflected in the index
+
+    with pytest.raises(ValueError, match="^patched code doesn't match the full code scan$"):
+        dso.patch_global_strings({1: "2nd"}, validate=True)
+
+
+def test_lazy_dso_encode_splices_untouched_sections():
+    encoded = make_test_dso().encode()
+    lazy = LazyDSO(encoded)
+
+    lazy.function_strings = [b"", b"bar", b""]
+
+    assert lazy.encode() == encoded[:22] + b"\x05\x00\x00\x00\x00bar\x00" + encoded[31:]
+    assert "global_floats" not in lazy.__dict__
+    assert "code" not in lazy.__dict__
+
+
+def test_lazy_dso_patch_reencodes_only_patched_sections():
+    dso = make_test_dso()
+    expected = dso.copy()
+    expected.patch_global_strings({1: "2nd"})
+    lazy = LazyDSO(dso.encode())
+
+    lazy.patch_global_strings({1: "2nd"})
+
+    assert lazy.encode() == expected.encode()
+    assert not {"function_strings", "global_floats", "function_floats"} & lazy.__dict__.keys()
+
+
+def test_encode_to_streams_sections():
+    dso = make_test_dso()
+    events = []
+    encode_section = dso.encode_section
+    dso.encode_section = lambda section: events.append(f"encode {section}") or encode_section(section)
+
+    class Stream:
+        def write(self, data):
+            events.append("write")
+
+    dso.encode_to(Stream())
+
+    assert events == [event for section in SECTIONS for event in (f"encode {section}", "write")]
+
+
+def test_save(tmp_path):
+    path = tmp_path / "file.dso"
+    path.write_bytes(b"original")
+    path.chmod(0o640)
+
+    make_test_dso().save(path.as_posix())
+
+    assert path.read_bytes() == make_test_dso().encode()
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ["file.dso"]
+
+
+def test_save_new_file_respects_umask(tmp_path):
+    umask = os.umask(0o027)
+    try:
+        make_test_dso().save((tmp_path / "new.dso").as_posix())
+    finally:
+        os.umask(umask)
+
+    assert (tmp_path / "new.dso").stat().st_mode & 0o777 == 0o640
+
+
+def test_save_failure_keeps_original(tmp_path, monkeypatch):
+    path = tmp_path / "file.dso"
+    path.write_bytes(b"original")
+    dso = make_test_dso()
+
+    def encode_to(stream):
+        stream.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(dso, "encode_to", encode_to)
+
+    with pytest.raises(OSError, match="disk full"):
+        dso.save(path.as_posix())
+
+    assert path.read_bytes() == b"original"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.dso"]
+
+
+def make_function_dso():
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.function_strings = [b"", b"foo", b"bar", b""]
+    dso.code = [
+        b"\x46",  # OP_LOADIMMED_STR
+        b"\x01",  # global offset for "second"
+        b"\x00",  # OP_FUNC_DECL
+        b"\x00",  # name, fixed up in runtime
+        b"\x00",  # namespace
+        b"\x00",  # package
+        b"\x01",  # has body
+        b"\x0d",  # end ip
+        b"\x01",  # argument count
+        b"\x00",  # argument name, fixed up in runtime
+        b"\x46",  # OP_LOADIMMED_STR
+        b"\x05",  # function offset for "bar"
+        b"\x0d",  # OP_RETURN_VOID
+        b"\x46",  # OP_LOADIMMED_STR
+        b"\x08",  # global offset for "third"
+    ]
+    dso.string_references = [(1, [3]), (8, [9])]
+
+    return dso
+
+
+def test_find_function_bodies():
+    dso = make_function_dso()
+
+    assert find_function_bodies(dso.code, dso.string_references) == [(10, 13)]
+    assert find_function_bodies(dso.code, []) == [(10, 13)]  # declarations are decoded, not guessed from fixups
+    assert find_function_bodies(dso.code + [b"\xfe"], [(1, [3])]) == []  # argument name isn't an identifier
+    assert dso.get_string_operands() == {1: [1], 8: [14]}
+    assert dso.get_function_string_operands() == {5: [11]}
+
+
+def test_find_function_bodies_ignores_zero_operands():
+    code = [
+        b"\x4a",  # OP_CALLFUNC
+        b"\x00",  # name
+        b"\x00",  # namespace, fixed up in runtime
+        b"\x00",  # call type
+        b"\x43",  # OP_LOADIMMED_UINT
+        b"\x05",
+        b"\x43",  # OP_LOADIMMED_UINT
+        b"\x00",
+        b"\x46",  # OP_LOADIMMED_STR
+        b"\x00",
+    ]
+    code += [b"\x0d"] * 60  # OP_RETURN_VOID
+    string_references = [(1, [1, 2])]
+
+    assert find_function_bodies(code, string_references) == []
+    assert find_function_bodies(code + [b"\xfe"], string_references) == [(8, 67)]  # what guessing finds
+
+
+def test_patch_function_strings():
+    dso = make_function_dso()
+
+    dso.patch_function_strings({"1": "x"}, validate=True)
+
+    assert dso.function_strings == [b"", b"x", b"bar", b""]
+    assert dso.global_strings == [b"", b"second", b"third", b""]
+    assert dso.code.values[11] == 3
+    assert dso.code.values[14] == 8
+    assert dso.string_references == [(1, [3]), (8, [9])]
+    assert dso.get_function_string_operands() == {3: [11]}
+
+
+def test_patch_strings_of_both_tables():
+    dso = make_function_dso()
+
+    dso.patch_strings({1: "2nd"}, {2: "baz!"}, validate=True)
+
+    assert dso.global_strings == [b"", b"2nd", b"third", b""]
+    assert dso.function_strings == [b"", b"foo", b"baz!", b""]
+    assert dso.code.values[1] == 1
+    assert dso.code.values[11] == 5  # not remapped as a global offset
+    assert dso.code.values[14] == 5
+    assert dso.string_references == [(1, [3]), (5, [9])]
+    assert dso.get_string_operands() == {1: [1], 5: [14]}
+    assert dso.get_function_string_operands() == {5: [11]}
+
+
+def test_aload_and_asave(tmp_path):
+    path = tmp_path / "file.dso"
+    path.write_bytes(make_test_dso().encode())
+
+    async def patch():
+        dso = await DSO.aload(path.as_posix())
+        dso.patch_global_strings({1: "2nd"})
+        await dso.asave(path.as_posix())
+
+    asyncio.run(patch())
+
+    assert DSO.from_file(path.as_posix()).global_strings == [b"", b"2nd", b"third", b""]
+
+
+def test_aload_in_process_executor(tmp_path):
+    path = tmp_path / "file.dso"
+    path.write_bytes(make_test_dso().encode())
+
+    async def load():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            dso = await DSO.aload(path.as_posix(), executor)
+            await dso.asave(path.as_posix(), executor)
+            return dso
+
+    assert asyncio.run(load()).encode() == make_test_dso().encode()
+    assert path.read_bytes() == make_test_dso().encode()
+
+
+def test_aload_files(tmp_path, monkeypatch):
+    paths = []
+    for i in range(6):
+        dso = make_test_dso()
+        dso.global_strings = [b"", b"file %d" % i, b""]
+        paths.append(tmp_path / f"{i}.dso")
+        paths[-1].write_bytes(dso.encode())
+    paths.insert(3, tmp_path / "missing.dso")
+
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def read_file(path):
+        with lock:
+            running.append(path)
+            max_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    monkeypatch.setattr(dso_module, "read_file", read_file)
+
+    dsos = asyncio.run(aload_files([p.as_posix() for p in paths], concurrency=2, return_exceptions=True))
+
+    assert max(max_running) <= 2
+    assert isinstance(dsos[3], FileNotFoundError)
+    assert [dso.global_strings[1] for dso in dsos[:3] + dsos[4:]] == [b"file %d" % i for i in range(6)]
+
+
+def test_compact_string_table():
+    table, offset_map = compact_string_table([b"", b"unused", b"bar", b"foobar", b"bar", b"x"], [0, 8, 12, 15, 19])
+
+    assert table == [b"foobar", b""]
+    assert offset_map == {0: 6, 8: 3, 12: 0, 15: 3, 19: 3}
+    assert string_at_offset(table, 3) == b"bar"
+
+    table, offset_map = compact_string_table([b"a", b"b"], [], keep_unreferenced=True)
+    assert table == [b"a", b"b", b""]
+    assert offset_map == {}
+    assert compact_string_table([b""], []) == ([b""], {})
+
+
+def test_compact_string_table_keeps_tagged_strings():
+    string_table = [b"", b"ab", b"", b"", b"", b"", b"ab", b"b", b""]
+
+    table, offset_map = compact_string_table(string_table, [1, 8, 11], tagged_offsets=[1])
+
+    assert table.blob == b"ab\x00ab\x00\x00\x00\x00\x00\x00"
+    assert offset_map == {1: 3, 8: 0, 11: 1}
+
+
+def test_compacted_keeps_tagged_strings():
+    dso = DSO()
+    dso.global_strings = [b"", b"ab", b"", b"", b"", b"", b"ab", b"b", b""]
+    dso.function_strings = [b""]
+    dso.code = [b"\x45", b"\x01", b"\x46", b"\x08", b"\x46", b"\x0b"]
+
+    compacted = dso.compacted()
+
+    assert get_raw_string_table(compacted.global_strings) == b"ab\x00ab\x00\x00\x00\x00\x00\x00"
+    assert list(compacted.code.values) == [0x45, 3, 0x46, 0, 0x46, 1]
+
+
+def test_compacted():
+    dso = make_function_dso()
+    dso.global_strings = [b"", b"second", b"third", b"unused", b"econd", b""]
+    dso.code[14] = b"\x15"  # "econd", a tail of "second"
+    dso.function_strings = [b"", b"foo", b"bar", b"foo", b""]
+    dso.code[11] = b"\x09"  # the second "foo"
+
+    compacted = dso.compacted()
+
+    assert compacted.global_strings == [b"second", b"third", b""]
+    assert compacted.function_strings == [b"foo", b"bar", b""]
+    assert compacted.code.values[1] == 0
+    assert compacted.code.values[11] == 0
+    assert compacted.code.values[14] == 1
+    assert compacted.string_references == [(0, [3]), (7, [9])]
+    assert dso.global_strings == [b"", b"second", b"third", b"unused", b"econd", b""]
+    assert DSO.from_buffer(dso.encode(compact=True)).encode() == compacted.encode()
+    assert len(dso.encode(compact=True)) < len(dso.encode())
+
+
+def test_compacted_operands_read_the_same_strings():
+    dso = generate_dso(strings_count=300, instruction_count=5000, seed=3)
+    dso.patch_global_strings({i: dso.global_strings[i + 1] for i in range(1, 100, 3)})
+
+    compacted = dso.compacted()
+
+    assert len(compacted.encode()) < len(dso.encode())
+    for operands, new_operands, table, new_table in (
+        (dso.get_string_operands(), compacted.get_string_operands(), dso.global_strings, compacted.global_strings),
+        (
+            dso.get_function_string_operands(),
+            compacted.get_function_string_operands(),
+            dso.function_strings,
+            compacted.function_strings,
+        ),
+    ):
+        for offset, ips in operands.items():
+            if offset < len(get_raw_string_table(table)):
+                for ip in ips:
+                    assert string_at_offset(new_table, compacted.code.values[ip]) == string_at_offset(table, offset)
+
+    references = {ip: offset for offset, ips in dso.string_references for ip in ips}
+    new_references = {ip: offset for offset, ips in compacted.string_references for ip in ips}
+    assert references.keys() == new_references.keys()
+    for ip, offset in references.items():
+        assert string_at_offset(compacted.global_strings, new_references[ip]) == string_at_offset(
+            dso.global_strings, offset
+        )
@@ -0,0 +1,94 @@
+import functools
+import io
+import json
+
+import pytest
+
+from dso_tools.dso import LazyDSO
+from dso_tools.dump import DumpError, dump_strings, iter_raw_strings, parse_range, read_binary
+
+
+@pytest.fixture
+def make_dso(make_dso):
+    return functools.partial(
+        make_dso, global_strings=[b"", b"second", b"th\xffird", b"fourth", b""], function_strings=[b"", b"foo", b""]
+    )
+
+
+def dump(dso, **kwargs):
+    stream = io.StringIO()
+    dump_strings(dso, stream, **kwargs)
+
+    return stream.getvalue()
+
+
+def test_parse_range():
+    assert parse_range("1:3") == (1, 3)
+    assert parse_range(":3") == (0, 3)
+    assert parse_range("2:") == (2, None)
+    assert parse_range("2") == (2, 3)
+
+    for text in ("a:b", "3:1", "-1:"):
+        with pytest.raises(ValueError):
+            parse_range(text)
+
+
+def test_iter_raw_strings_lazy(make_dso):
+    dso = make_dso()
+    lazy = LazyDSO(dso.encode())
+
+    assert list(iter_raw_strings(lazy)) == list(enumerate(dso.global_strings))
+    assert list(iter_raw_strings(lazy, "function_strings")) == list(enumerate(dso.function_strings))
+    assert list(iter_raw_strings(lazy, start=1, stop=3)) == [(1, b"second"), (2, b"th\xffird")]
+    assert list(iter_raw_strings(lazy, start=3, stop=100)) == [(3, b"fourth"), (4, b"")]
+    assert "global_strings" not in lazy.__dict__
+
+
+def test_dump_json_matches_json_dumps(make_dso):
+    dso = make_dso()
+    dso.global_strings[2] = 'quote " and \\ and ż'.encode()
+
+    expected = json.dumps({i: s.decode() for i, s in enumerate(dso.global_strings)}, indent=4) + "\n"
+    assert dump(dso) == expected
+    assert dump(LazyDSO(dso.encode())) == expected
+    assert dump(dso, pattern="^$nothing") == json.dumps({}, indent=4) + "\n"
+
+
+def test_dump_ndjson(make_dso):
+    result = dump(make_dso(), format="ndjson", string_range=(3, None))
+
+    assert result == '{"index": 3, "string": "fourth"}\n{"index": 4, "string": ""}\n'
+
+
+def test_dump_filter(make_dso):
+    result = dump(make_dso(), format="ndjson", pattern="^(s|f)", errors="skip")
+
+    assert [json.loads(line)["index"] for line in result.splitlines()] == [1, 3]
+
+
+def test_dump_error_policies(make_dso):
+    dso = make_dso()
+
+    with pytest.raises(DumpError, match="string 2 is not valid UTF-8"):
+        dump(dso)
+    assert json.loads(dump(dso, errors="replace"))["2"] == "th�ird"
+    assert json.loads(dump(dso, errors="backslashreplace"))["2"] == "th\\xffird"
+    assert "2" not in json.loads(dump(dso, errors="skip"))
+
+
+def test_dump_error_writes_nothing(make_dso):
+    for dso in (make_dso(), LazyDSO(make_dso().encode())):
+        for format in ("json", "ndjson"):
+            stream = io.StringIO()
+            with pytest.raises(DumpError):
+                dump_strings(dso, stream, format=format)
+            assert stream.getvalue() == ""
+
+
+def test_dump_binary(make_dso):
+    dso = make_dso()
+    stream = io.BytesIO()
+    dump_strings(dso, stream, format="binary", pattern="ird")
+
+    assert stream.getvalue() == b"\x02\x00\x00\x00\x06\x00\x00\x00th\xffird"
+    assert list(read_binary(io.BytesIO(stream.getvalue()))) == [(2, b"th\xffird")]
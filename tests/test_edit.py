@@ -0,0 +1,144 @@
+import functools
+import random
+
+import pytest
+
+from dso_tools.dso import find_function_bodies
+from dso_tools.edit import CodeEditor
+from dso_tools.instructions import JUMP_OPERAND_TABLE, assemble, decode, iter_instructions
+from dso_tools.synthetic import generate_dso
+
+
+@pytest.fixture
+def make_dso(make_dso):
+    code = assemble(
+        [
+            ("OP_LOADIMMED_STR", 1),  # 0
+            ("OP_FUNC_DECL", 0, 0, 0, 1, 15, 1, 0),  # 2, "second" with argument "scale"
+            ("OP_LOADIMMED_STR", 1),  # 10, "foo"
+            ("OP_JMPIFNOT", 15),  # 12
+            ("OP_RETURN_VOID",),  # 14
+            ("OP_SETCURVAR", 0),  # 15
+            ("OP_JMP", 0),  # 17
+        ]
+    )
+    code.values.extend([7, 12, 9, 17])  # two line breaks
+    code.widths.extend(b"\x04" * 4)
+
+    return functools.partial(
+        make_dso,
+        global_strings=[b"", b"second", b"scale", b""],
+        function_strings=[b"", b"foo", b""],
+        code=code,
+        line_break_count=4,
+        string_references=[(1, [3]), (8, [9, 16])],
+    )
+
+
+def test_insert_and_delete(make_dso):
+    dso = make_dso()
+    editor = CodeEditor(dso)
+    editor.insert(12, assemble([("OP_LOADIMMED_FLT", 0), ("OP_MUL",)]))
+    editor.insert(15, assemble([("OP_SETCURVAR", 0), ("OP_JMP", 12)]), string_references=[(8, [1])])
+    editor.delete(0, 2)
+
+    assert editor.apply() == 28
+
+    assert decode(dso.code, 24) == [
+        (0, "OP_FUNC_DECL", [0, 0, 0, 1, 16, 1, 0]),
+        (8, "OP_LOADIMMED_STR", [1]),
+        (10, "OP_LOADIMMED_FLT", [0]),
+        (12, "OP_MUL", []),
+        (13, "OP_JMPIFNOT", [16]),
+        (15, "OP_RETURN_VOID", []),
+        (16, "OP_SETCURVAR", [0]),
+        (18, "OP_JMP", [10]),
+        (20, "OP_SETCURVAR", [0]),
+        (22, "OP_JMP", [0]),
+    ]
+    assert dso.code.values[24:].tolist() == [7, 10, 9, 22]
+    assert dso.string_references == [(1, [1]), (8, [7, 21, 17])]
+    assert find_function_bodies(dso.code, dso.string_references, 24) == [(8, 16)]
+    assert dso.get_function_string_operands() == {1: [9]}
+    assert editor.insertions == editor.deletions == {}
+
+
+def test_replace_and_jump_into_deleted_code(make_dso):
+    dso = make_dso()
+    editor = CodeEditor(dso)
+    editor.delete(10, 12)
+    editor.insert(10, assemble([("OP_LOADIMMED_UINT", 1)]))
+    editor.delete(15, 17)
+    editor.apply()
+
+    instructions = decode(dso.code, len(dso.code) - dso.line_break_count)
+    assert instructions[2:] == [
+        (10, "OP_LOADIMMED_UINT", [1]),
+        (12, "OP_JMPIFNOT", [15]),
+        (14, "OP_RETURN_VOID", []),
+        (15, "OP_JMP", [0]),
+    ]
+    assert dso.string_references == [(1, [3]), (8, [9])]
+
+
+def test_invalid_edits(make_dso):
+    editor = CodeEditor(make_dso())
+    editor.insert(11, assemble([("OP_MUL",)]))
+    with pytest.raises(ValueError, match="ip 11 is not at the start of an instruction"):
+        editor.apply()
+
+    editor = CodeEditor(make_dso())
+    editor.delete(10, 14)
+    editor.insert(12, assemble([("OP_MUL",)]))
+    with pytest.raises(ValueError, match="can't insert at ip 12, it's deleted"):
+        editor.apply()
+
+    editor = CodeEditor(make_dso())
+    editor.delete(10, 14)
+    editor.delete(12, 15)
+    with pytest.raises(ValueError, match="deleted ranges overlap at ip 12"):
+        editor.apply()
+
+    with pytest.raises(ValueError):
+        CodeEditor(make_dso()).insert(0, [b"\x0b"])  # OP_JMP without its target
+
+
+def test_many_edits_keep_targets():
+    dso = generate_dso(strings_count=100, instruction_count=5000, seed=5)
+    instruction_count = len(dso.code) - dso.line_break_count
+    instructions = list(iter_instructions(dso.code, instruction_count))
+    old_code = dso.code.copy()
+    old_references = {ip for _, ips in dso.string_references for ip in ips}
+
+    rng = random.Random(5)
+    editor = CodeEditor(dso)
+    inserted = {}
+    deleted = set()
+    for i in rng.sample(range(len(instructions)), 300):
+        ip, _, size = instructions[i]
+        if len(inserted) < 150:
+            inserted[ip] = rng.randint(1, 3)
+            editor.insert(ip, assemble([("OP_PUSH",)] * inserted[ip]))
+        else:
+            editor.delete(ip, ip + size)
+            deleted.update(range(ip, ip + size))
+    editor.apply()
+
+    def expected_ip(ip):
+        inserted_before = sum(count for position, count in inserted.items() if position < ip)
+        return ip + inserted_before - sum(1 for position in deleted if position < ip)
+
+    for ip, opcode, size in instructions:
+        if ip in deleted:
+            continue
+
+        new_ip = expected_ip(ip) + inserted.get(ip, 0)
+        assert dso.code.values[new_ip] == opcode
+        for operand in range(size - 1):
+            old_value = old_code.values[ip + 1 + operand]
+            new_value = dso.code.values[new_ip + 1 + operand]
+            assert new_value == (expected_ip(old_value) if operand in JUMP_OPERAND_TABLE[opcode] else old_value)
+
+    new_references = sorted(ip for _, ips in dso.string_references for ip in ips)
+    expected_references = sorted(expected_ip(ip) for ip in old_references if ip not in deleted)
+    assert new_references == expected_references
@@ -0,0 +1,69 @@
+import pickle
+from array import array
+
+import pytest
+
+from dso_tools.floats import FloatTable
+
+
+def test_float_table_is_list_compatible():
+    table = FloatTable([1.5, 42.1, -3.0])
+
+    assert table == [1.5, 42.1, -3.0]
+    assert table != [1.5, 42.1]
+    assert table == array("d", [1.5, 42.1, -3.0])
+    assert table[1] == 42.1
+    assert table[1:] == [42.1, -3.0]
+    assert isinstance(table[1:], FloatTable)
+    assert list(table) == [1.5, 42.1, -3.0]
+    assert repr(table) == "FloatTable([1.5, 42.1, -3.0])"
+
+    table.append(2.0)
+    table[0] = 0.5
+    assert table == [0.5, 42.1, -3.0, 2.0]
+
+
+def test_float_table_operators_with_lists():
+    table = FloatTable([1.5, 42.1])
+
+    assert table + [1.0] == [1.5, 42.1, 1.0]
+    assert isinstance(table + [1.0], FloatTable)
+    assert [1.0] + table == [1.0, 1.5, 42.1]
+    assert isinstance([1.0] + table, FloatTable)
+    assert table + array("d", [1.0]) == [1.5, 42.1, 1.0]
+    assert table * 2 == [1.5, 42.1, 1.5, 42.1]
+    assert isinstance(2 * table, FloatTable)
+    assert [1.5, 42.1] == table
+    assert table != (1.5, 42.1)
+    assert FloatTable() != ""
+
+    with pytest.raises(TypeError):
+        table + (1.0,)
+    with pytest.raises(TypeError):
+        table + ["foo"]
+
+    table += [1.0]
+    assert table == [1.5, 42.1, 1.0]
+    assert isinstance(table, FloatTable)
+
+
+def test_float_table_bytes():
+    raw = b"\x00\x00\x00\x00\x00\x00\xf8\x3f" b"\xcd\xcc\xcc\xcc\xcc\x0c\x45\x40"
+
+    assert FloatTable.from_bytes(raw) == [1.5, 42.1]
+    assert FloatTable([1.5, 42.1]).to_bytes() == raw
+
+
+def test_float_table_copy_and_pickle():
+    table = FloatTable([1.5, 42.1])
+    copy = table.copy()
+    copy[0] = 2.0
+
+    assert table == [1.5, 42.1]
+    assert pickle.loads(pickle.dumps(table)) == table
+    assert type(pickle.loads(pickle.dumps(table))) is FloatTable
+
+
+def test_float_table_is_unhashable():
+    with pytest.raises(TypeError):
+        hash(FloatTable())
@@ -0,0 +1,89 @@
+import os
+import subprocess
+
+from dso_tools.index import StringIndex, extract_strings, parse_args
+
+
+def test_argument_parser():
+    parsed = parse_args(["--index", "strings.sqlite", "--workers", "2", "ui"])
+    assert parsed.index == "strings.sqlite"
+    assert parsed.workers == 2
+    assert parsed.paths == ["ui"]
+
+
+def test_extract_strings(tmp_path, write_dso):
+    write_dso(tmp_path / "a.dso", global_strings=[b"", b"1024 768", b"\xff"], function_strings=[b"foo"])
+
+    path, key, strings, error = extract_strings((tmp_path / "a.dso").as_posix())
+
+    assert error is None
+    assert key == (os.stat(path).st_mtime_ns, os.stat(path).st_size)
+    assert strings == [
+        ("global_strings", 0, ""),
+        ("global_strings", 1, "1024 768"),
+        ("global_strings", 2, "\\xff"),
+        ("function_strings", 0, "foo"),
+    ]
+    assert extract_strings((tmp_path / "missing.dso").as_posix())[3].startswith("FileNotFoundError")
+
+
+def test_string_index(tmp_path, write_dso):
+    write_dso(tmp_path / "ui/playGui.gui.dso", global_strings=[b"", b"1024 768", b"GuiControl", b""])
+    write_dso(
+        tmp_path / "ui/options.gui.dso",
+        global_strings=[b"", b"800 600", b""],
+        function_strings=[b"", b"setRes 1024 768", b""],
+    )
+    (tmp_path / "ui/broken.dso").write_bytes(b"\x00")
+    index_path = (tmp_path / "index.sqlite").as_posix()
+
+    with StringIndex(index_path) as index:
+        indexed, up_to_date, removed, errors = index.update([(tmp_path / "ui").as_posix()], workers=1)
+        assert len(indexed) == 2
+        assert (up_to_date, removed) == ([], [])
+        assert [os.path.basename(path) for path, _ in errors] == ["broken.dso"]
+
+        matches = [(os.path.basename(path), *match) for path, *match in index.search("1024 768")]
+        assert matches == [
+            ("options.gui.dso", "function_strings", 1, "setRes 1024 768"),
+            ("playGui.gui.dso", "global_strings", 1, "1024 768"),
+        ]
+        assert list(index.search("1024 768", section="global_strings"))[0][2:] == (1, "1024 768")
+        assert list(index.search("guicontrol")) == []
+        assert [match[3] for match in index.search("guicontrol", ignore_case=True)] == ["GuiControl"]
+        assert [match[3] for match in index.search("00")] == ["800 600"]
+        assert [match[3] for match in index.search(r"^\d+ \d+$", regex=True)] == ["800 600", "1024 768"]
+
+    (tmp_path / "ui/options.gui.dso").unlink()
+    write_dso(tmp_path / "ui/playGui.gui.dso", global_strings=[b"", b"1280 1024", b""])
+    os.utime(tmp_path / "ui/playGui.gui.dso", ns=(1, 1))
+    write_dso(tmp_path / "ui/new.gui.dso", global_strings=[b"", b"new"])
+
+    with StringIndex(index_path) as index:
+        indexed, up_to_date, removed, errors = index.update([(tmp_path / "ui").as_posix()], workers=1)
+        assert sorted(os.path.basename(path) for path in indexed) == ["new.gui.dso", "playGui.gui.dso"]
+        assert [os.path.basename(path) for path in removed] == ["options.gui.dso"]
+        assert list(index.search("1024 768")) == []
+        assert [match[3] for match in index.search("1024")] == ["1280 1024"]
+
+        indexed, up_to_date, removed, errors = index.update([(tmp_path / "ui").as_posix()], workers=1)
+        assert (indexed, removed) == ([], [])
+        assert len(up_to_date) == 2
+
+
+def test_index_and_grep_commands(tmp_path, write_dso):
+    write_dso(tmp_path / "ui/playGui.gui.dso", global_strings=[b"", b"1024 768", b""])
+    write_dso(tmp_path / "ui/other.gui.dso", global_strings=[b"", b"other", b""])
+    index_path = (tmp_path / "index.sqlite").as_posix()
+
+    result = subprocess.check_output(["dso", "index", "--index", index_path, (tmp_path / "ui").as_posix()], text=True)
+    assert result == "2 indexed, 0 up to date, 0 removed, 0 failed\n"
+
+    result = subprocess.check_output(["dso", "grep", "--index", index_path, "1024 768"], text=True, cwd=tmp_path)
+    assert result == "ui/playGui.gui.dso:global_strings:1:1024 768\n"
+
+    result = subprocess.check_output(["dso", "grep", "--index", index_path, "-l", "e"], text=True, cwd=tmp_path)
+    assert result == "ui/other.gui.dso\n"
+
+    assert subprocess.run(["dso", "grep", "--index", index_path, "missing"]).returncode == 1
+    assert subprocess.run(["dso", "grep", "--index", (tmp_path / "none").as_posix(), "missing"]).returncode == 2
@@ -0,0 +1,53 @@
+import subprocess
+
+from dso_tools.dso import DSO
+from dso_tools.info import format_info, parse_args
+
+
+def test_argument_parser():
+    parsed = parse_args(["a.dso", "b.dso"])
+    assert parsed.dso_files == ["a.dso", "b.dso"]
+
+
+def test_info(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.code = [b"\x46", b"\x01\x02\x03\x04"]
+    dso.string_references = [(1, [1])]
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+
+    result = subprocess.check_output(["dso", "info", dso_file.as_posix()], text=True)
+
+    assert result == (
+        f"{dso_file.as_posix()}: version 43\n"
+        "  section                 offset      size     count\n"
+        "  version                      0         4         1\n"
+        "  global_strings               4        18         4\n"
+        "  function_strings            22         4         1\n"
+        "  global_floats               26         4         0\n"
+        "  function_floats             30         4         0\n"
+        "  code                        34        14         2\n"
+        "  string_references           48        16         1\n"
+    )
+
+
+def test_info_doesnt_decode_sections(tmp_path):
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(DSO().encode())
+
+    with DSO.from_file(dso_file, lazy=True) as dso:
+        format_info("dso_file", dso)
+
+        assert "global_strings" not in dso.__dict__
+        assert "code" not in dso.__dict__
+
+
+def test_info_of_broken_file(tmp_path):
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(b"\x2b\x00\x00\x00\x05")
+
+    result = subprocess.run(["dso", "info", dso_file.as_posix()], capture_output=True, text=True)
+
+    assert result.returncode == 1
+    assert "unexpected end of dso" in result.stderr
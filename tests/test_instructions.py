@@ -0,0 +1,86 @@
+import pytest
+
+from dso_tools.code import Code
+from dso_tools.instructions import (
+    DecodeError,
+    assemble,
+    decode,
+    find_operands,
+    instruction_size,
+    iter_instructions,
+    jump_operand_ips,
+)
+from dso_tools.opcodes import JUMP_OPERANDS, OPCODES, OPERAND_COUNTS
+from dso_tools.synthetic import generate_dso
+
+
+def test_operand_tables_use_known_opcodes():
+    assert set(OPERAND_COUNTS) <= set(OPCODES)
+    assert set(JUMP_OPERANDS) <= set(OPERAND_COUNTS)
+    for name, positions in JUMP_OPERANDS.items():
+        assert all(position < OPERAND_COUNTS[name] for position in positions)
+
+
+def test_decode():
+    code = assemble(
+        [
+            ("OP_FUNC_DECL", 0, 0, 0, 1, 12, 2, 0, 0),
+            ("OP_LOADIMMED_STR", 5),
+            ("OP_RETURN_VOID",),
+            ("OP_JMP", 300),
+            ("OP_CALLFUNC", 0, 0, 1),
+        ]
+    )
+
+    assert decode(code) == [
+        (0, "OP_FUNC_DECL", [0, 0, 0, 1, 12, 2, 0, 0]),
+        (9, "OP_LOADIMMED_STR", [5]),
+        (11, "OP_RETURN_VOID", []),
+        (12, "OP_JMP", [300]),
+        (14, "OP_CALLFUNC", [0, 0, 1]),
+    ]
+    assert code[13] == b"\x2c\x01\x00\x00"
+    assert instruction_size(code, 0) == 9
+    assert jump_operand_ips(code) == [5, 13]
+
+
+def test_decode_errors():
+    with pytest.raises(DecodeError, match="invalid opcode 200 at ip 2"):
+        list(iter_instructions(Code([b"\x46", b"\x01", b"\xc8"])))
+    with pytest.raises(DecodeError, match="truncated instruction at ip 1"):
+        list(iter_instructions(Code([b"\x0d", b"\x46"])))
+    with pytest.raises(ValueError, match="OP_JMP takes 1 operands, got 0"):
+        assemble([("OP_JMP",)])
+
+
+def test_decode_synthetic_code():
+    dso = generate_dso(instruction_count=2000, seed=4)
+    instruction_count = len(dso.code) - dso.line_break_count
+
+    instructions = list(iter_instructions(dso.code, instruction_count))
+
+    assert sum(size for _, _, size in instructions) == instruction_count
+    fixups = {ip for _, ips in dso.string_references for ip in ips}
+    assert fixups and max(fixups) < instruction_count
+    assert not fixups & {ip for ip, _, _ in instructions}  # only operands are fixed up
+    declarations = [ip for ip, opcode, _ in instructions if opcode == OPCODES.index("OP_FUNC_DECL")]
+    assert declarations and {ip + 1 for ip in declarations} <= fixups
+
+
+def test_find_operands():
+    dso = generate_dso(instruction_count=2000, seed=4)
+    instruction_count = len(dso.code) - dso.line_break_count
+    opcodes = {OPCODES.index("OP_LOADIMMED_STR"), OPCODES.index("OP_ASSERT")}
+
+    expected = {}
+    for ip, opcode, _ in iter_instructions(dso.code, instruction_count):
+        if opcode in opcodes:
+            expected.setdefault(dso.code.values[ip + 1], []).append(ip + 1)
+
+    assert find_operands(dso.code, opcodes, instruction_count) == expected
+    assert list(find_operands(dso.code, opcodes, instruction_count)) == list(expected)
+
+    with pytest.raises(DecodeError, match="truncated instruction at ip 2"):
+        find_operands(assemble([("OP_ADD",), ("OP_RETURN_VOID",), ("OP_LOADIMMED_STR", 3)]), opcodes, 3)
+    with pytest.raises(DecodeError, match="invalid opcode"):
+        find_operands(dso.code, opcodes)  # line breaks aren't instructions
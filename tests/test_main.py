@@ -1,5 +1,6 @@
 import json
 import subprocess
+import sys
 
 import pytest
 
@@ -45,6 +46,9 @@ def test_argument_parser():
 
     with pytest.raises(SystemExit):
         parse_args(["--dump-string-table", "--patch-string-table", "/path/to/patch/file", "/path/to/dso"])
+    for dump_option in ("--dump-string-table", "--dump-function-string-table"):
+        with pytest.raises(SystemExit):
+            parse_args([dump_option, "--compact", "/path/to/dso"])
 
 
 def test_patch_string_table(tmp_path):
@@ -81,3 +85,71 @@ def test_patch_string_table(tmp_path):
         ]
     )
     assert new_dso.string_references == [(5, [4])]
+
+
+def test_dump_string_table_options(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"th\xffird", b""]
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+
+    result = subprocess.run(["dso", "--dump-string-table", dso_file.as_posix()], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "string 2 is not valid UTF-8" in result.stderr
+
+    result = subprocess.check_output(
+        ["dso", "--dump-string-table", "--format", "ndjson", "--range", "1:3", "--errors", "replace"]
+        + [dso_file.as_posix()],
+        text=True,
+    )
+    assert result == '{"index": 1, "string": "second"}\n{"index": 2, "string": "th\\ufffdird"}\n'
+
+
+def test_patch_both_string_tables(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b""]
+    dso.function_strings = [b"", b"foo", b""]
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+    global_patch_file = tmp_path / "global.json"
+    global_patch_file.write_text(json.dumps({1: "2nd"}))
+    function_patch_file = tmp_path / "function.json"
+    function_patch_file.write_text(json.dumps({1: "bar"}))
+
+    subprocess.check_call(
+        ["dso", "--patch-string-table", global_patch_file.as_posix()]
+        + ["--patch-function-string-table", function_patch_file.as_posix(), dso_file.as_posix()]
+    )
+    result = subprocess.check_output(
+        ["dso", "--dump-function-string-table", "--format", "ndjson", dso_file.as_posix()], text=True
+    )
+
+    assert DSO.from_file(dso_file.as_posix()).global_strings == [b"", b"2nd", b""]
+    assert result == '{"index": 0, "string": ""}\n{"index": 1, "string": "bar"}\n{"index": 2, "string": ""}\n'
+
+    with pytest.raises(SystemExit):
+        parse_args(["--dump-string-table", "--patch-function-string-table", "patch.json", "/path/to/dso"])
+
+
+def test_main_imports_lazily():
+    code = "import sys, dso_tools.main; print(sorted(m for m in sys.modules if m.startswith('dso_tools')))"
+
+    result = subprocess.check_output([sys.executable, "-c", code], text=True)
+
+    assert result.strip() == "['dso_tools', 'dso_tools.main']"
+
+
+def test_patch_and_compact(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"unused", b""]
+    dso.code = [b"\x46", b"\x01"]
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+    patch_file = tmp_path / "patch.json"
+    patch_file.write_text(json.dumps({1: "2nd"}))
+
+    subprocess.check_call(["dso", "--patch-string-table", patch_file.as_posix(), "--compact", dso_file.as_posix()])
+
+    patched = DSO.from_file(dso_file.as_posix())
+    assert patched.global_strings == [b"2nd", b""]
+    assert patched.code == [b"\x46", b"\x00\x00\x00\x00"]
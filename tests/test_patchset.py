@@ -0,0 +1,102 @@
+import json
+import subprocess
+
+import pytest
+
+from dso_tools.dso import DSO
+from dso_tools.patchset import PatchConflictError, compile_patch, load_patch_set, merge_patches
+
+
+def test_compile_patch():
+    assert compile_patch({"1": "foo", 2: b"bar"}) == {1: b"foo", 2: b"bar"}
+
+    for patch in ({"x": "foo"}, {"-1": "foo"}, {"1": 5}, {"1": None}):
+        with pytest.raises(ValueError):
+            compile_patch(patch)
+
+
+def test_merge_patches():
+    assert merge_patches([{"1": "foo"}, {"2": "bar", "1": "foo"}]) == {1: b"foo", 2: b"bar"}
+
+    with pytest.raises(PatchConflictError, match="string 1 is set to b'foo' by a.json and to b'baz' by b.json"):
+        merge_patches([{"1": "foo"}, {"1": "baz"}], ["a.json", "b.json"])
+
+
+def test_load_patch_set(tmp_path):
+    (tmp_path / "mods").mkdir()
+    (tmp_path / "mods" / "a.json").write_text(json.dumps({"1": "foo"}))
+    (tmp_path / "mods" / "b.json").write_text(json.dumps({"3": "bar"}))
+    (tmp_path / "mods" / "inner.json").write_text(json.dumps(["b.json"]))
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps(["mods/a.json", "mods/inner.json"]))
+
+    compiled = load_patch_set(manifest.as_posix())
+    assert compiled == {1: b"foo", 3: b"bar"}
+    assert load_patch_set(manifest.as_posix()) is compiled
+
+    (tmp_path / "mods" / "b.json").write_text(json.dumps({"3": "changed"}))
+    assert load_patch_set(manifest.as_posix()) == {1: b"foo", 3: b"changed"}
+
+    (tmp_path / "mods" / "b.json").write_text(json.dumps({"1": "conflict"}))
+    with pytest.raises(PatchConflictError):
+        load_patch_set(manifest.as_posix())
+
+
+def test_load_patch_set_recursive_manifest(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps(["manifest.json"]))
+
+    with pytest.raises(ValueError, match="includes itself"):
+        load_patch_set(manifest.as_posix())
+
+
+def test_patch_with_manifest(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b"third", b""]
+    dso.code = [b"\x54", b"\x08"]
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+    (tmp_path / "a.json").write_text(json.dumps({"1": "foo"}))
+    (tmp_path / "b.json").write_text(json.dumps({"2": "bar"}))
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps(["a.json", "b.json"]))
+
+    subprocess.check_call(["dso", "--patch-string-table", manifest.as_posix(), dso_file.as_posix()])
+
+    new_dso = DSO.from_file(dso_file.as_posix())
+    assert new_dso.global_strings == [b"", b"foo", b"bar", b""]
+    assert new_dso.code.values[1] == 5  # offset of "bar"
+
+    (tmp_path / "b.json").write_text(json.dumps({"1": "bar"}))
+    result = subprocess.run(
+        ["dso", "--patch-string-table", manifest.as_posix(), dso_file.as_posix()], capture_output=True, text=True
+    )
+    assert result.returncode == 1
+    assert "string 1 is set to" in result.stderr
+    assert DSO.from_file(dso_file.as_posix()).global_strings == [b"", b"foo", b"bar", b""]
+
+
+def test_patch_with_malformed_files(tmp_path):
+    dso = DSO()
+    dso.global_strings = [b"", b"second", b""]
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(dso.encode())
+    (tmp_path / "invalid.json").write_text("{")
+    (tmp_path / "number.json").write_text(json.dumps({"1": 5}))
+    (tmp_path / "scalar.json").write_text(json.dumps("foo"))
+
+    for name, message in (
+        ("invalid.json", "invalid.json is not valid JSON"),
+        ("number.json", "string 1 is set to 5, which is not a string"),
+        ("scalar.json", "scalar.json is neither a patch nor a list of patch files"),
+        ("missing.json", "No such file or directory"),
+    ):
+        result = subprocess.run(
+            ["dso", "--patch-string-table", (tmp_path / name).as_posix(), dso_file.as_posix()],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 1
+        assert result.stderr.startswith("dso: ") and message in result.stderr
+        assert "Traceback" not in result.stderr
+    assert DSO.from_file(dso_file.as_posix()).global_strings == [b"", b"second", b""]
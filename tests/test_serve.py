@@ -0,0 +1,91 @@
+import functools
+import json
+import subprocess
+
+import pytest
+
+from dso_tools.dso import DSO
+from dso_tools.serve import Server
+
+
+@pytest.fixture
+def write_dso(write_dso):
+    return functools.partial(
+        write_dso, global_strings=[b"", b"second", b"third", b""], code=[b"\x54", b"\x08"]  # OP_ASSERT "third"
+    )
+
+
+def test_dump_and_patch(tmp_path, write_dso):
+    path = write_dso(tmp_path / "a.dso").as_posix()
+    patch_file = tmp_path / "patch.json"
+    patch_file.write_text(json.dumps({"2": "3rd"}))
+    server = Server()
+
+    assert server.handle({"id": 1, "command": "dump", "path": path}) == {
+        "id": 1,
+        "ok": True,
+        "result": {"0": "", "1": "second", "2": "third", "3": ""},
+    }
+    assert server.handle({"id": 2, "command": "dump", "path": path, "range": [1, 3], "filter": "^s"})["result"] == {
+        "1": "second"
+    }
+
+    assert server.handle({"id": 3, "command": "patch", "path": path, "patch": {"1": "2nd"}})["ok"]
+    assert server.handle({"id": 4, "command": "patch", "path": path, "patch": patch_file.as_posix()})["ok"]
+    assert server.handle({"id": 5, "command": "dump", "path": path})["result"] == {
+        "0": "",
+        "1": "2nd",
+        "2": "3rd",
+        "3": "",
+    }
+
+    dso = DSO.from_file(path)
+    assert dso.global_strings == [b"", b"2nd", b"3rd", b""]
+    assert dso.code.values[1] == 5
+
+
+def test_info_and_verify(tmp_path, write_dso):
+    path = write_dso(tmp_path / "a.dso").as_posix()
+    server = Server()
+
+    info = server.handle({"command": "info", "path": path})["result"]
+    assert info["version"] == 43
+    assert info["sections"]["global_strings"] == {"offset": 4, "size": 18, "count": 4}
+
+    assert server.handle({"command": "verify", "path": path})["result"] == {"round_trip": True, "problems": []}
+
+
+def test_errors(tmp_path):
+    server = Server()
+
+    assert server.handle_line("not json")["error"].startswith("invalid JSON")
+    assert server.handle_line("[]") == {"id": None, "ok": False, "error": "RequestError: request must be a JSON object"}
+    assert server.handle({"id": 7, "command": "nope"}) == {
+        "id": 7,
+        "ok": False,
+        "error": "RequestError: unknown command 'nope'",
+    }
+    assert server.handle({"id": 8, "command": "dump"})["error"] == "RequestError: path is required"
+    assert server.handle({"command": "dump", "path": (tmp_path / "missing").as_posix()})["error"].startswith(
+        "FileNotFoundError"
+    )
+
+
+def test_serve_command(tmp_path, write_dso):
+    path = write_dso(tmp_path / "a.dso").as_posix()
+    requests = [
+        {"id": 1, "command": "patch", "path": path, "patch": {"1": "2nd"}},
+        {"id": 2, "command": "dump", "path": path},
+    ]
+
+    result = subprocess.run(
+        ["dso", "serve"],
+        input="".join(json.dumps(request) + "\n" for request in requests) + "\n",
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    responses = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [response["id"] for response in responses] == [1, 2]
+    assert responses[1]["result"]["1"] == "2nd"
@@ -0,0 +1,98 @@
+import pickle
+import random
+
+import pytest
+
+from dso_tools.dso import offset_to_string_index, string_index_to_offset
+from dso_tools.strings import StringTable
+
+
+def test_string_table_is_list_compatible():
+    table = StringTable([b"abc", b"", b"de"])
+
+    assert table == [b"abc", b"", b"de"]
+    assert table != [b"abc", b""]
+    assert len(table) == 3
+    assert table[0] == b"abc"
+    assert table[-1] == b"de"
+    assert table[1:] == [b"", b"de"]
+    assert isinstance(table[1:], StringTable)
+    assert list(table) == [b"abc", b"", b"de"]
+    assert repr(table) == "StringTable([b'abc', b'', b'de'])"
+    assert table.decode(0) == "abc"
+    with pytest.raises(IndexError):
+        table[3]
+
+    table[1] = b"xyz"
+    table.append(b"f")
+    del table[0]
+    table.insert(0, b"g")
+    assert table == [b"g", b"xyz", b"de", b"f"]
+    assert table.blob == b"g\x00xyz\x00de\x00f"
+    assert list(table.offsets) == [0, 2, 6, 9]
+
+
+def test_string_table_from_raw():
+    raw = b"abc\x00\x00de\x00"
+
+    assert StringTable.from_raw(raw) == raw.split(b"\x00")
+    assert StringTable.from_raw(b"") == [b""]
+    assert StringTable() == []
+    assert list(StringTable()) == []
+
+
+def test_string_table_from_raw_finds_offsets_on_demand():
+    raw = b"abc\x00\x00de\x00"
+    table = StringTable.from_raw(raw)
+
+    assert len(table) == 4
+    assert list(table) == [b"abc", b"", b"de", b""]
+    assert table == StringTable.from_raw(raw)
+    assert table._offsets is None
+
+    assert table[2] == b"de"
+    assert list(table.offsets) == [0, 4, 5, 8]
+    assert list(StringTable(raw.split(b"\x00")).offsets) == list(table.offsets)
+    assert list(StringTable.from_raw(b"").offsets) == [0]
+
+
+def test_string_table_offsets_match_list_functions():
+    strings = [b"first", b"", b"second", b"x", b"last"]
+    table = StringTable(strings)
+
+    for index in range(len(strings)):
+        assert table.index_to_offset(index) == string_index_to_offset(index, strings)
+    for offset in range(len(table.blob)):
+        assert table.offset_to_index(offset) == offset_to_string_index(offset, strings)
+
+
+def test_string_table_patched():
+    rng = random.Random(7)
+    strings = [b"s%d" % i * rng.randint(0, 3) for i in range(50)]
+    table = StringTable(strings)
+
+    for _ in range(20):
+        patches = {rng.randrange(len(strings)): b"p" * rng.randint(0, 10) for _ in range(rng.randint(1, 5))}
+        expected = list(strings)
+        for index, string in patches.items():
+            expected[index] = string
+
+        patched = table.patched(patches)
+        assert patched == expected
+        assert patched == StringTable(expected)
+        assert table == strings
+
+    assert table.patched({len(strings) - 1: b"end", 0: b"start"}) == [b"start"] + strings[1:-1] + [b"end"]
+    with pytest.raises(IndexError):
+        table.patched({len(strings): b""})
+
+
+def test_string_table_copy_and_pickle():
+    table = StringTable([b"a", b"b"])
+    copy = table.copy()
+    copy[0] = b"c"
+
+    assert table == [b"a", b"b"]
+    assert copy == [b"c", b"b"]
+    assert pickle.loads(pickle.dumps(table)) == table
+    assert type(pickle.loads(pickle.dumps(table))) is StringTable
@@ -0,0 +1,62 @@
+import io
+
+from dso_tools.dso import DSO, find_function_bodies, get_string_offsets
+from dso_tools.synthetic import generate_dso
+
+
+def test_generate_dso_sizes():
+    dso = generate_dso(
+        strings_count=50, function_strings_count=10, instruction_count=500, floats_count=8, line_break_pair_count=7
+    )
+
+    assert len(dso.global_strings) == 50
+    assert len(dso.function_strings) == 10
+    assert len(dso.global_floats) == 8
+    assert len(dso.function_floats) == 4
+    assert len(dso.code) == 500 + 14
+    assert dso.line_break_count == 14
+
+
+def test_generate_dso_is_deterministic():
+    assert generate_dso(seed=1).encode() == generate_dso(seed=1).encode()
+    assert generate_dso(seed=1).encode() != generate_dso(seed=2).encode()
+
+
+def test_generated_dso_round_trips():
+    encoded = generate_dso(strings_count=300, instruction_count=5000).encode()
+
+    assert DSO.from_stream(io.BytesIO(encoded)).encode() == encoded
+    assert DSO.from_buffer(encoded).encode() == encoded
+
+
+def test_generated_dso_references():
+    dso = generate_dso(strings_count=100, instruction_count=2000, reference_density=0.2)
+    offsets = set(get_string_offsets(dso.global_strings))
+
+    assert dso.string_references
+    for offset, ips in dso.string_references:
+        assert offset in offsets
+        for ip in ips:
+            assert dso.code.values[ip] == 0
+
+
+def test_generated_dso_can_be_patched():
+    dso = generate_dso(strings_count=100, instruction_count=2000)
+
+    dso.patch_global_strings({i: "patched" for i in range(1, 99, 3)}, validate=True)
+
+
+def test_generated_dso_has_function_bodies():
+    dso = generate_dso(strings_count=100, instruction_count=5000)
+    bodies = find_function_bodies(dso.code, dso.string_references, len(dso.code) - dso.line_break_count)
+
+    offsets = set(get_string_offsets(dso.global_strings))
+    function_offsets = set(get_string_offsets(dso.function_strings))
+
+    assert bodies
+    assert dso.get_function_string_operands()
+    assert set(dso.get_function_string_operands()) <= function_offsets
+    assert set(dso.get_string_operands()) <= offsets
+    assert DSO.from_buffer(dso.encode()).encode() == dso.encode()
+
+    dso.patch_function_strings({i: "patched" for i in range(1, 24, 3)}, validate=True)
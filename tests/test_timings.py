@@ -0,0 +1,117 @@
+import pstats
+import subprocess
+
+import pytest
+
+from dso_tools.dso import DSO, SECTIONS
+from dso_tools.main import parse_args
+from dso_tools.synthetic import generate_dso
+from dso_tools.timings import Phase, Timings, add_hook, instrumented, remove_hook
+
+
+def test_phase_reports_to_hooks():
+    reported = []
+
+    def hook(*args):
+        reported.append(args)
+
+    add_hook(hook)
+    try:
+        with Phase("first") as phase:
+            phase.count = 3
+        with pytest.raises(ValueError):
+            with Phase("failing"):
+                raise ValueError
+    finally:
+        remove_hook(hook)
+
+    with Phase("unobserved"):
+        pass
+
+    assert [(name, count) for name, _, _, count in reported] == [("first", 3)]
+    assert reported[0][1] >= 0
+    assert reported[0][2] is None
+
+
+def test_hook_added_during_phase():
+    reported = []
+
+    def hook(*args):
+        reported.append(args)
+
+    try:
+        with Phase("outer"):
+            add_hook(hook)
+            with Phase("inner"):
+                pass
+    finally:
+        remove_hook(hook)
+
+    assert [name for name, _, _, _ in reported] == ["inner"]
+
+
+def test_timings():
+    encoded = generate_dso(strings_count=50, instruction_count=500).encode()
+
+    with Timings() as timings:
+        dso = DSO.from_buffer(encoded)
+        dso.patch_global_strings({1: "patched"})
+        dso.encode()
+
+    parsed = {phase[len("parse ") :]: totals for phase, totals in timings.phases.items() if phase.startswith("parse")}
+    assert list(parsed) == list(SECTIONS)
+    assert sum(bytes for _, _, bytes, _ in parsed.values()) == len(encoded)
+    assert parsed["global_strings"][3] == 50
+    assert parsed["code"][3] == len(DSO.from_buffer(encoded).code)
+    assert timings.phases["patch index"][0] == 1
+    assert timings.phases["patch remap"][0] == 1
+    assert [phase for phase in timings.phases if phase.startswith("encode")] == [f"encode {s}" for s in SECTIONS]
+
+    total = Timings()
+    total.update(timings)
+    total.update(timings)
+    assert total.phases["parse code"][0] == 2
+    assert total.phases["parse code"][2] == 2 * timings.phases["parse code"][2]
+    assert "parse global_strings" in total.format()
+
+
+def test_lazy_timings(tmp_path):
+    (tmp_path / "a.dso").write_bytes(generate_dso(strings_count=10, instruction_count=100).encode())
+
+    with Timings() as timings, DSO.from_file(tmp_path / "a.dso", lazy=True) as dso:
+        dso.patch_global_strings({1: "patched"})
+
+    assert timings.phases["parse code"][0] == 1
+
+
+def test_instrumented_profile(tmp_path):
+    profile = tmp_path / "profile"
+    timings = Timings()
+
+    with instrumented(timings, profile.as_posix()):
+        DSO.from_buffer(generate_dso(strings_count=10, instruction_count=100).encode())
+
+    assert "parse code" in timings.phases
+    assert any(function == "from_buffer" for _, _, function in pstats.Stats(profile.as_posix()).stats)
+
+
+def test_timings_option(tmp_path):
+    dso_file = tmp_path / "dso_file"
+    dso_file.write_bytes(generate_dso(strings_count=10, instruction_count=100).encode())
+    patch_file = tmp_path / "patch.json"
+    patch_file.write_text('{"1": "patched"}')
+    profile = tmp_path / "profile"
+
+    result = subprocess.run(
+        ["dso", "--timings", "--profile", profile.as_posix(), "--patch-string-table", patch_file.as_posix()]
+        + [dso_file.as_posix()],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stderr.startswith("phase ")
+    assert "patch remap" in result.stderr
+    assert "encode code" in result.stderr
+    assert profile.stat().st_size > 0
+    assert parse_args(["--timings", "a.dso"]).timings is True
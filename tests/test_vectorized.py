@@ -0,0 +1,65 @@
+import pytest
+
+from dso_tools import vectorized
+from dso_tools.dso import DSO, StringOffsetMap, scan_string_operands
+from dso_tools.synthetic import generate_dso
+
+
+def make_patch(dso):
+    return {i: f"patched {i}" * (i % 3) for i in range(1, len(dso.global_strings) - 1, 5)}
+
+
+def test_pure_python_path_by_default(monkeypatch):
+    dso = generate_dso(strings_count=100, instruction_count=2000, seed=1)
+    expected = dso.copy()
+    expected.patch_global_strings(make_patch(dso), validate=True, use_numpy=False)
+    monkeypatch.setattr(vectorized, "available", lambda: pytest.fail("NumPy used by default"))
+
+    dso.patch_global_strings(make_patch(dso), validate=True)
+    scan_string_operands(dso.code)
+
+    assert dso.encode() == expected.encode()
+
+
+@pytest.mark.skipif(vectorized.available(), reason="NumPy is installed")
+def test_numpy_required_when_forced():
+    with pytest.raises(RuntimeError, match="NumPy is not installed"):
+        scan_string_operands(generate_dso().code, use_numpy=True)
+
+
+@pytest.mark.skipif(not vectorized.available(), reason="NumPy is not installed")
+@pytest.mark.parametrize("seed", range(3))
+def test_numpy_and_pure_python_paths_match(seed):
+    dso = generate_dso(strings_count=300, instruction_count=5000, seed=seed)
+    patch = make_patch(dso)
+    old_strings = dso.global_strings
+    with_numpy = dso.copy()
+    without_numpy = dso.copy()
+
+    assert scan_string_operands(dso.code, use_numpy=True) == scan_string_operands(dso.code, use_numpy=False)
+
+    with_numpy.patch_global_strings(patch, use_numpy=True)
+    without_numpy.patch_global_strings(patch, use_numpy=False)
+
+    assert with_numpy.encode() == without_numpy.encode()
+    assert with_numpy.get_string_operands() == without_numpy.get_string_operands()
+
+    offset_map = StringOffsetMap(old_strings, with_numpy.global_strings)
+    offsets = list(range(0, offset_map.old_last_offset + 10))
+    assert offset_map.remap(offsets, use_numpy=True) == offset_map.remap(offsets, use_numpy=False)
+
+
+@pytest.mark.skipif(not vectorized.available(), reason="NumPy is not installed")
+def test_numpy_and_pure_python_paths_match_for_empty_tables():
+    dso = DSO()
+    dso.code = [b"\x46", b"\x00", b"\x54", b"\x03"]
+    with_numpy = dso.copy()
+    without_numpy = dso.copy()
+
+    with_numpy.patch_global_strings({}, use_numpy=True)
+    without_numpy.patch_global_strings({}, use_numpy=False)
+    assert with_numpy.encode() == without_numpy.encode() == dso.encode()
+
+    for old_strings, new_strings in (([], []), ([], [b"foo", b""])):
+        offset_map = StringOffsetMap(old_strings, new_strings)
+        assert offset_map.remap([0, 3], use_numpy=True) == offset_map.remap([0, 3], use_numpy=False)
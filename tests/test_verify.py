@@ -0,0 +1,81 @@
+import functools
+import subprocess
+
+import pytest
+
+from dso_tools.synthetic import generate_dso
+from dso_tools.verify import HashWriter, buffer_digest, check_invariants, parse_args, verify_buffer, verify_files
+
+
+@pytest.fixture
+def make_dso(make_dso):
+    return functools.partial(
+        make_dso,
+        global_strings=[b"", b"second", b"third", b""],
+        function_strings=[b"", b"foo", b""],
+        code=[b"\x46", b"\x01", b"\x4a", b"\x00", b"\x01\x00\x00\x00", b"\x02\x00\x00\x00"],
+        line_break_count=2,
+        string_references=[(8, [3])],
+    )
+
+
+def test_argument_parser():
+    parsed = parse_args(["--workers", "2", "a.dso", "ui"])
+    assert parsed.workers == 2
+    assert parsed.paths == ["a.dso", "ui"]
+
+
+def test_hash_writer():
+    writer = HashWriter()
+    writer.write(b"abc")
+    writer.write(b"def")
+
+    assert writer.digest() == buffer_digest(b"abcdef")
+
+
+def test_verify_buffer(make_dso):
+    assert verify_buffer(make_dso().encode()) == []
+    assert verify_buffer(generate_dso(seed=1).encode()) == []
+
+    encoded = make_dso().encode()
+    assert verify_buffer(encoded + b"\x00") == [f"encodes to {len(encoded)} bytes instead of {len(encoded) + 1}"]
+
+
+def test_check_invariants(make_dso):
+    dso = make_dso()
+    dso.string_references = [(8, [3]), (3, [1]), (1, [4, 9])]
+    dso.code[1] = b"\x30"
+
+    assert check_invariants(dso) == [
+        "string reference offset 3 is not at the start of a global string",
+        "string reference offset 1 refers to ips past the end of code: 4, 9",
+        "string operands at ips 1 point past the end of global_strings (offset 48, size 14)",
+    ]
+
+    dso = make_dso()
+    dso.line_break_count = 3
+    assert check_invariants(dso)[0] == "3 line break words don't fit 6 code words in pairs"
+
+
+def test_verify_files(tmp_path, make_dso):
+    good = tmp_path / "good.dso"
+    good.write_bytes(make_dso().encode())
+    truncated = tmp_path / "truncated.dso"
+    truncated.write_bytes(make_dso().encode()[:-3])
+
+    results = verify_files([good.as_posix(), truncated.as_posix(), (tmp_path / "missing.dso").as_posix()], workers=2)
+
+    assert results[0] == (good.as_posix(), [])
+    assert len(results[1][1]) == 1
+    assert results[2][1][0].startswith("FileNotFoundError")
+
+
+def test_verify_command(tmp_path, make_dso):
+    (tmp_path / "a.dso").write_bytes(make_dso().encode())
+    (tmp_path / "b.dso").write_bytes(b"\x2b\x00\x00\x00")
+
+    result = subprocess.run(["dso", "verify", tmp_path.as_posix()], capture_output=True, text=True)
+
+    assert result.returncode == 1
+    assert result.stdout == f"ok {(tmp_path / 'a.dso').as_posix()}\n1 ok, 1 failed\n"
+    assert result.stderr.startswith(f"failed {(tmp_path / 'b.dso').as_posix()}: ")